@@ -9,6 +9,8 @@ from .models import (
     RouteStatus,
     Ticket,
     Map,
+    Stop,
+    Trip,
 )
 
 # --------------------
@@ -249,6 +251,24 @@ class RouteStatusAdmin(admin.ModelAdmin):
     )
 
 
+# --------------------
+# Timetables
+# --------------------
+
+@admin.register(Stop)
+class StopAdmin(admin.ModelAdmin):
+    list_display = ("name", "code", "latitude", "longitude")
+    search_fields = ("name", "code")
+
+
+@admin.register(Trip)
+class TripAdmin(admin.ModelAdmin):
+    list_display = ("code", "route", "calendar", "headsign")
+    list_filter = ("route__operator",)
+    search_fields = ("code", "route__service")
+    raw_id_fields = ("route", "calendar")
+
+
 # --------------------
 # Maps
 # --------------------
@@ -0,0 +1,479 @@
+"""
+Read-only JSON API, version 1, mounted at /api/v1/.
+
+Endpoints read rows with values() and encode plain dicts, never model
+instances, so a response costs one query per list regardless of size.
+
+- Lists are cursor-paginated (?limit=, ?cursor=) on a unique ordering,
+  so pages stay stable while routes are added or removed.
+- ?fields=a,b picks the fields to return; only those columns (and
+  their joins/subqueries) are selected.
+- Bodies are encoded with orjson when installed and compressed with
+  brotli or gzip when the client accepts it.
+
+Route geometry (/api/v1/geometry/) is served from siteui.geometry's
+in-memory index rather than the database.
+"""
+
+import base64
+import gzip
+import json
+import math
+from functools import wraps
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from . import geometry, incidents, status_engine
+from .models import NetworkStatusSnapshot, Operator, Route, RouteStatus, Ticket
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+COMPRESS_MIN_BYTES = 512
+
+ROUTE_FIELDS = {
+    "uuid": "uuid",
+    "service": "service",
+    "mode": "mode__slug",
+    "operator": "operator__bustimes_slug",
+    "operator_name": "operator__operator_name",
+    "origin": "origin",
+    "destination": "destination",
+    "via": "via",
+    "colour": Coalesce(NullIf("route_hex", Value("")), "operator__primary_hex"),
+    "status": "worst_status_name",
+    "status_colour": "worst_status_colour_hex",
+    "status_severity": "worst_status_severity",
+    "status_summary": "worst_status_summary",
+    "updated_at": "updated_at",
+}
+ROUTE_ORDERING = ("display_order", "service", "id")
+
+OPERATOR_FIELDS = {
+    "slug": "bustimes_slug",
+    "name": "operator_name",
+    "website": "website",
+    "telephone": "telephone",
+    "email": "email",
+    "colour": "primary_hex",
+    "secondary_colour": "secondary_hex",
+    "updated_at": "updated_at",
+}
+OPERATOR_ORDERING = ("operator_name", "uuid")
+
+TICKET_FIELDS = {
+    "uuid": "uuid",
+    "name": "name",
+    "price": "price",
+    "duration": "duration",
+    "description": "description",
+    "operator": "operator__bustimes_slug",
+    "operator_name": "operator__operator_name",
+    "updated_at": "updated_at",
+}
+TICKET_ORDERING = ("operator__operator_name", "price", "uuid")
+
+STATUS_FIELDS = {
+    "route": "route_uuid",
+    "service": "service",
+    "colour": "colour_hex",
+    "status": "status_name",
+    "status_colour": "status_colour_hex",
+    "severity": "severity",
+    "summary": "summary",
+    "updated_at": "updated_at",
+}
+
+ROUTE_STATUS_FIELDS = {
+    "status": "status_type__name",
+    "status_colour": "status_type__colour_hex",
+    "severity": "status_type__severity",
+    "summary": "summary",
+    "detail": "detail",
+    "affected_section": "affected_section",
+    "is_planned": "is_planned",
+    "valid_from": "valid_from",
+    "valid_to": "valid_to",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+# --------------------
+# Encoding
+# --------------------
+
+def encode(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+
+
+def _accepts(request, coding):
+    accepted = request.headers.get("Accept-Encoding", "")
+    return any(
+        part.split(";")[0].strip() == coding for part in accepted.split(",")
+    )
+
+
+def api_response(request, data, status=200):
+    body = encode(data)
+    encoding = None
+    if len(body) >= COMPRESS_MIN_BYTES:
+        if brotli is not None and _accepts(request, "br"):
+            body, encoding = brotli.compress(body), "br"
+        elif _accepts(request, "gzip"):
+            body, encoding = gzip.compress(body, compresslevel=6), "gzip"
+
+    response = HttpResponse(body, content_type="application/json", status=status)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+def api_view(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            response = api_response(request, {"error": "Method not allowed"}, status=405)
+            response["Allow"] = "GET, HEAD"
+            return response
+        try:
+            return api_response(request, view(request, *args, **kwargs))
+        except ApiError as error:
+            return api_response(request, {"error": error.message}, status=error.status)
+        except (ValidationError, ValueError):
+            # Malformed filter or cursor values rejected by the model fields
+            return api_response(request, {"error": "Invalid parameter"}, status=400)
+
+    return wrapper
+
+
+# --------------------
+# Fields and pagination
+# --------------------
+
+def select_fields(request, available):
+    """
+    The public -> ORM mapping for ?fields=, or every field if absent.
+    """
+    requested = request.GET.get("fields")
+    if not requested:
+        return dict(available)
+
+    names = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(
+            f"Unknown field(s): {', '.join(unknown)}. "
+            f"Available: {', '.join(available)}"
+        )
+    return {name: available[name] for name in names}
+
+
+def select_values(queryset, fields, extra=()):
+    """
+    values() for `fields` plus `extra` ORM paths; returns the queryset
+    and a function turning each row into its public dict.
+    """
+    paths = set(extra)
+    expressions = {}
+    keys = {}
+    for name, source in fields.items():
+        if isinstance(source, str):
+            paths.add(source)
+            keys[name] = source
+        else:
+            expressions[f"_{name}"] = source
+            keys[name] = f"_{name}"
+
+    queryset = queryset.values(*paths, **expressions)
+    return queryset, lambda row: {name: row[key] for name, key in keys.items()}
+
+
+def _encode_cursor(values):
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor, size):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise ApiError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ApiError("Invalid cursor")
+    return values
+
+
+def _after(ordering, values):
+    """
+    Keyset filter for rows strictly after `values` in `ordering`.
+    """
+    condition = Q()
+    for i in range(len(ordering)):
+        step = Q(**{f"{ordering[i]}__gt": values[i]})
+        for field, value in zip(ordering[:i], values[:i]):
+            step &= Q(**{field: value})
+        condition |= step
+    return condition
+
+
+def paginate(request, queryset, ordering, fields):
+    limit = request.GET.get("limit", "")
+    if limit:
+        if not limit.isdigit() or not 0 < int(limit) <= MAX_LIMIT:
+            raise ApiError(f"limit must be between 1 and {MAX_LIMIT}")
+        limit = int(limit)
+    else:
+        limit = DEFAULT_LIMIT
+
+    cursor = request.GET.get("cursor")
+    if cursor:
+        queryset = queryset.filter(
+            _after(ordering, _decode_cursor(cursor, len(ordering)))
+        )
+
+    queryset, to_public = select_values(
+        queryset.order_by(*ordering), fields, extra=ordering
+    )
+    rows = list(queryset[:limit + 1])
+
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        params = request.GET.copy()
+        params["cursor"] = _encode_cursor([rows[-1][field] for field in ordering])
+        next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+    return {
+        "results": [to_public(row) for row in rows],
+        "next": next_url,
+    }
+
+
+def _bbox(value):
+    """
+    (south, west, north, east) of a `west,south,east,north` parameter,
+    clamped to the globe.
+    """
+    try:
+        west, south, east, north = (float(part) for part in value.split(","))
+    except (AttributeError, ValueError):
+        raise ApiError("bbox must be west,south,east,north in degrees")
+    if not all(math.isfinite(part) for part in (west, south, east, north)):
+        raise ApiError("bbox must be west,south,east,north in degrees")
+    west, east = (min(max(lon, -180.0), 180.0) for lon in (west, east))
+    south, north = (min(max(lat, -90.0), 90.0) for lat in (south, north))
+    if west > east or south > north:
+        raise ApiError("bbox must be west,south,east,north in degrees")
+    return south, west, north, east
+
+
+# --------------------
+# Endpoints
+# --------------------
+
+@api_view
+def status(request):
+    """
+    Disrupted routes grouped by mode and operator, plus active incidents.
+    Routes not listed have a good service.
+    """
+    status_engine.refresh_if_due()
+
+    fields = select_fields(request, STATUS_FIELDS)
+    snapshot = NetworkStatusSnapshot.objects.all()
+    if request.GET.get("mode"):
+        snapshot = snapshot.filter(mode_slug=request.GET["mode"])
+    if request.GET.get("operator"):
+        snapshot = snapshot.filter(operator_slug=request.GET["operator"])
+    if request.GET.get("route"):
+        snapshot = snapshot.filter(route_uuid=request.GET["route"])
+
+    snapshot, to_public = select_values(
+        snapshot, fields, extra=("mode_name", "mode_slug", "operator_name", "operator_slug")
+    )
+
+    modes = []
+    for row in snapshot:
+        if not modes or modes[-1]["slug"] != row["mode_slug"]:
+            modes.append({"mode": row["mode_name"], "slug": row["mode_slug"], "operators": []})
+        operators = modes[-1]["operators"]
+        if not operators or operators[-1]["name"] != row["operator_name"]:
+            operators.append({"name": row["operator_name"], "slug": row["operator_slug"], "routes": []})
+        operators[-1]["routes"].append(to_public(row))
+
+    return {
+        "modes": modes,
+        "incidents": [
+            {
+                "title": incident.title,
+                "description": incident.description,
+                "status": incident.status_type.name,
+                "status_colour": incident.status_type.colour_hex,
+                "start_time": incident.start_time,
+                "expected_end_time": incident.expected_end_time,
+                "modes": sorted(incident.mode_slugs),
+            }
+            for incident in incidents.get_banner().incidents
+        ],
+    }
+
+
+@api_view
+def routes(request):
+    queryset = Route.objects.in_service().annotate_worst_status()
+    if request.GET.get("mode"):
+        queryset = queryset.filter(mode__slug=request.GET["mode"])
+    if request.GET.get("operator"):
+        queryset = queryset.filter(operator__bustimes_slug=request.GET["operator"])
+
+    return paginate(
+        request,
+        queryset,
+        ROUTE_ORDERING,
+        select_fields(request, ROUTE_FIELDS),
+    )
+
+
+@api_view
+def route_detail(request, uuid):
+    fields = select_fields(request, {**ROUTE_FIELDS, "statuses": None})
+    with_statuses = fields.pop("statuses", False) is None
+
+    queryset, to_public = select_values(
+        Route.objects.filter(uuid=uuid).annotate_worst_status(), fields
+    )
+    row = queryset.first()
+    if row is None:
+        raise ApiError("Route not found", status=404)
+    route = to_public(row)
+
+    if with_statuses:
+        statuses, status_public = select_values(
+            RouteStatus.objects
+            .current()
+            .filter(route__uuid=uuid)
+            .order_by("-status_type__severity", "-valid_from"),
+            ROUTE_STATUS_FIELDS,
+        )
+        route["statuses"] = [status_public(status) for status in statuses]
+
+    return route
+
+
+@api_view
+def operators(request):
+    return paginate(
+        request,
+        Operator.objects.all(),
+        OPERATOR_ORDERING,
+        select_fields(request, OPERATOR_FIELDS),
+    )
+
+
+@api_view
+def operator_detail(request, slug):
+    fields = select_fields(
+        request, {**OPERATOR_FIELDS, "routes": None, "tickets": None}
+    )
+    with_routes = fields.pop("routes", False) is None
+    with_tickets = fields.pop("tickets", False) is None
+
+    queryset, to_public = select_values(
+        Operator.objects.filter(bustimes_slug=slug), fields, extra=("uuid",)
+    )
+    row = queryset.first()
+    if row is None:
+        raise ApiError("Operator not found", status=404)
+    operator = to_public(row)
+
+    if with_routes:
+        routes, route_public = select_values(
+            Route.objects
+            .in_service()
+            .filter(operator_id=row["uuid"])
+            .annotate_worst_status()
+            .order_by(*ROUTE_ORDERING),
+            {
+                name: ROUTE_FIELDS[name]
+                for name in ("uuid", "service", "mode", "origin", "destination", "colour", "status")
+            },
+        )
+        operator["routes"] = [route_public(route) for route in routes]
+
+    if with_tickets:
+        tickets, ticket_public = select_values(
+            Ticket.objects.filter(operator_id=row["uuid"]).order_by("price"),
+            {
+                name: TICKET_FIELDS[name]
+                for name in ("uuid", "name", "price", "duration", "description")
+            },
+        )
+        operator["tickets"] = [ticket_public(ticket) for ticket in tickets]
+
+    return operator
+
+
+@api_view
+def tickets(request):
+    queryset = Ticket.objects.all()
+    if request.GET.get("operator"):
+        queryset = queryset.filter(operator__bustimes_slug=request.GET["operator"])
+
+    return paginate(
+        request,
+        queryset,
+        TICKET_ORDERING,
+        select_fields(request, TICKET_FIELDS),
+    )
+
+
+@api_view
+def route_geometry(request):
+    """
+    Routes crossing ?bbox=west,south,east,north, with their lines
+    simplified for map zoom ?zoom= (default 12) as encoded polylines.
+    """
+    bbox = _bbox(request.GET.get("bbox"))
+    zoom = min(max(int(request.GET.get("zoom", 12)), 0), geometry.MAX_ZOOM)
+    return {
+        "precision": geometry.PRECISION,
+        "routes": geometry.in_bbox(bbox, zoom),
+    }
+
+
+@api_view
+def route_geometry_tile(request, z, x, y):
+    """
+    Routes in web mercator tile z/x/y, their lines clipped to the tile.
+    """
+    if z > geometry.MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        raise ApiError("No such tile", status=404)
+    return {
+        "precision": geometry.PRECISION,
+        "routes": geometry.tile(z, x, y),
+    }
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class SiteuiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'siteui'
+
+    def ready(self):
+        from . import checks, metrics, signals  # noqa: F401
+
+        metrics.instrument_templates()
@@ -0,0 +1,186 @@
+"""
+Bundled, minified, content-hashed static assets.
+
+BUNDLES names the stylesheets and scripts templates load through
+{% bundle %} (templatetags/assets.py). collectstatic, via AssetStorage:
+
+- concatenates and minifies each bundle's sources;
+- names every file after a hash of its content (Django's
+  ManifestStaticFilesStorage), so a changed file gets a new URL;
+- writes gzip and, when the brotli package is installed, brotli copies
+  of text assets next to them.
+
+serve() hands those files out with a year-long immutable Cache-Control
+for hashed names, picking the precompressed copy the client accepts.
+Put a web server in front for production if there is one; it wants the
+same headers.
+
+Until collectstatic has run (in development and tests), {% bundle %}
+links each source file and {% static %} returns unhashed names.
+"""
+
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+# Bundle -> sources, in order. Bundles sit beside their sources so
+# relative url()s in stylesheets still resolve.
+BUNDLES = {
+    "css/site.min.css": ["css/main.css", "css/status.css"],
+    "css/home.min.css": ["css/home.css"],
+    "js/site.min.js": [
+        "js/toggles.js",
+        "js/live-status.js",
+        "js/route-search.js",
+        "js/stop-search.js",
+    ],
+    "js/map.min.js": ["js/map-viewer.js"],
+}
+
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt")
+COMPRESS_MIN_BYTES = 512
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+SHORT_LIVED = "public, max-age=300"
+
+# Encoding -> suffix of the precompressed copy, preferred first
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+def minify_css(text):
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    # Only after ":", not before: "a :hover" is not "a:hover"
+    text = re.sub(r":\s+", ":", text)
+    return text.replace(";}", "}").strip() + "\n"
+
+
+def minify_js(text):
+    # Whitespace and whole-line comments only: newlines stay, so
+    # automatic semicolon insertion behaves as in the source
+    lines = (line.strip() for line in text.splitlines())
+    return "\n".join(
+        line for line in lines if line and not line.startswith("//")
+    ) + "\n"
+
+
+def build_bundle(name, read):
+    """
+    Minified contents of bundle `name`; `read(path)` returns a source.
+    """
+    sources = [read(path) for path in BUNDLES[name]]
+    if name.endswith(".css"):
+        return minify_css("\n".join(sources))
+    return minify_js(";\n".join(sources))
+
+
+def compress(data):
+    """
+    {suffix: compressed bytes} for the encodings worth serving.
+    """
+    copies = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        copies[".br"] = brotli.compress(data, quality=11)
+    return {suffix: body for suffix, body in copies.items() if len(body) < len(data)}
+
+
+class AssetStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            for name in BUNDLES:
+                content = build_bundle(name, self._read_text)
+                if self.exists(name):
+                    self.delete(name)
+                self._save(name, ContentFile(content.encode()))
+                paths[name] = (self, name)
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        if not dry_run:
+            for name in self.hashed_files.values():
+                if name.endswith(COMPRESSIBLE):
+                    self._precompress(name)
+
+    def _read_text(self, name):
+        with self.open(name) as file:
+            return file.read().decode()
+
+    def _precompress(self, name):
+        with self.open(name) as file:
+            data = file.read()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return
+        for suffix, body in compress(data).items():
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(body))
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected yet: development and tests use the sources
+            return name
+
+
+def is_built(name):
+    """
+    Whether collectstatic has written bundle or file `name`.
+    """
+    return not settings.DEBUG and name in getattr(staticfiles_storage, "hashed_files", {})
+
+
+def _accepts(request, encoding):
+    return encoding in request.headers.get("Accept-Encoding", "")
+
+
+@require_safe
+def serve(request, path):
+    """
+    A file from STATIC_ROOT, precompressed when the client accepts it.
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    available = [
+        (encoding, suffix)
+        for encoding, suffix in ENCODINGS.items()
+        if os.path.isfile(full_path + suffix)
+    ]
+    encoding, suffix = next(
+        ((e, s) for e, s in available if _accepts(request, e)), (None, "")
+    )
+
+    response = FileResponse(
+        open(full_path + suffix, "rb"),
+        content_type=content_type or "application/octet-stream",
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if available:
+        patch_vary_headers(response, ["Accept-Encoding"])
+
+    hashed = path in getattr(staticfiles_storage, "hashed_files", {}).values()
+    response.headers["Cache-Control"] = IMMUTABLE if hashed else SHORT_LIVED
+    return response
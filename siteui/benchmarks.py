@@ -0,0 +1,1031 @@
+"""
+Benchmarks for siteui, run with ``python manage.py benchmark``.
+
+Each suite seeds a throwaway test database with synthetic data, times
+the code paths it cares about and returns a JSON-serialisable dict.
+Suites are registered with @suite and selected by name on the command
+line.
+"""
+
+import asyncio
+import gc
+import gzip
+import math
+import random
+import resource
+import re
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.views import serve as serve_source
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.template import Context, Template
+from django.test import AsyncClient, Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import api, assets, geometry, pagecache, querybudget, rows, snapshot, status_engine, urls
+from .journey import JourneyPlanner
+from .models import (
+    Map,
+    Mode,
+    NetworkIncident,
+    NetworkStatusSnapshot,
+    Operator,
+    Route,
+    RouteGeometry,
+    RouteStatus,
+    ServiceCalendar,
+    ServiceStatusType,
+    Stop,
+    StopTime,
+    Ticket,
+    Trip,
+)
+from .search import RouteSearchIndex
+from .timetable_index import TimetableIndex
+
+SUITES = {}
+
+
+def suite(name):
+    def register(func):
+        SUITES[name] = func
+        return func
+    return register
+
+
+@contextmanager
+def test_database():
+    """
+    Run the body against a fresh test database, never the real one.
+    """
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        # An in-memory SQLite database lives on, rows and all, into the
+        # next suite while any connection to it is open, and Django
+        # ignores close() on one. With the real name restored, close the
+        # connection async views leave in asgiref's long-lived sync
+        # thread, and collect those of finished threads.
+        asyncio.run(sync_to_async(connections.close_all)())
+        gc.collect()
+
+
+def measure(func, repeat):
+    """
+    Call `func` `repeat` times; latency summary in microseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return summarise(samples)
+
+
+def summarise(samples):
+    """
+    Latency summary in microseconds of a list of samples.
+    """
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_us": round(statistics.fmean(samples), 1),
+        "p50_us": round(samples[len(samples) // 2], 1),
+        "p95_us": round(samples[int(len(samples) * 0.95) - 1], 1),
+        "p99_us": round(samples[int(len(samples) * 0.99) - 1], 1),
+        "max_us": round(samples[-1], 1),
+    }
+
+
+# --------------------
+# Seeding
+# --------------------
+
+def seed_network(operators=2, routes=20):
+    bus, _ = Mode.objects.get_or_create(name="Bus", defaults={"slug": "bus"})
+    created = []
+    for o in range(operators):
+        operator = Operator.objects.create(
+            operator_name=f"Operator {o}",
+            bustimes_slug=f"op{o}",
+            primary_hex="#0019A8",
+        )
+        created += Route.objects.bulk_create(
+            Route(
+                service=str(r),
+                mode=bus,
+                operator=operator,
+                origin=f"Origin {r}",
+                destination=f"Destination {r}",
+                bustimes_id=o * 100000 + r,
+                display_order=r,
+            )
+            for r in range(routes // operators)
+        )
+    return created
+
+
+def seed_timetable(routes, stops=500, trips_per_route=40, calls_per_trip=20, seed=1):
+    rng = random.Random(seed)
+    stop_objs = Stop.objects.bulk_create(
+        Stop(
+            code=f"STOP{s}",
+            name=f"Stop {s}",
+            latitude=50.78 + rng.random() * 0.1,
+            longitude=-1.15 + rng.random() * 0.15,
+        )
+        for s in range(stops)
+    )
+    stop_ids = [stop.pk for stop in stop_objs]
+
+    weekdays = ServiceCalendar.objects.create(
+        code="bench-weekdays", days=31, start_date=date(2020, 1, 1)
+    )
+    everyday = ServiceCalendar.objects.create(code="bench-everyday", days=127)
+
+    for route in routes:
+        pattern = rng.sample(stop_ids, calls_per_trip)
+        trips = Trip.objects.bulk_create(
+            Trip(
+                code=f"{route.pk}-{t}",
+                route=route,
+                calendar=weekdays if t % 3 else everyday,
+            )
+            for t in range(trips_per_route)
+        )
+        StopTime.objects.bulk_create(
+            StopTime(
+                trip=trip,
+                stop_id=stop_id,
+                sequence=sequence,
+                arrival_time=start + sequence * 120,
+                departure_time=start + sequence * 120,
+            )
+            for trip, start in zip(
+                trips,
+                range(5 * 3600, 24 * 3600, (19 * 3600) // trips_per_route),
+            )
+            for sequence, stop_id in enumerate(pattern)
+        )
+    return stop_ids
+
+
+def seed_statuses(routes, share=0.2, seed=5):
+    """
+    Give a `share` of `routes` a current non-good status.
+    """
+    rng = random.Random(seed)
+    types = list(ServiceStatusType.objects.filter(severity__gt=0))
+    RouteStatus.objects.bulk_create(
+        RouteStatus(
+            route=route,
+            status_type=rng.choice(types),
+            summary=f"Disruption on {route.service}",
+            valid_from=timezone.now() - timedelta(hours=1),
+        )
+        for route in rng.sample(routes, int(len(routes) * share))
+    )
+
+
+def client():
+    return Client(HTTP_HOST="localhost")
+
+
+def seed_scale(scale=1.0, seed=7):
+    """
+    Synthetic network for the view benchmarks. At scale 1.0: 50
+    operators, 5,000 routes over three modes, 50,000 route statuses (ten
+    per route, about one route in five disrupted now), 200 tickets, 20
+    maps, 3 active incidents and timetables (and so route geometry) for
+    50 routes.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    modes = [
+        Mode.objects.get_or_create(slug=slug, defaults={"name": name})[0]
+        for slug, name in (("bus", "Bus"), ("ferry", "Ferry"), ("train", "Train"))
+    ]
+
+    operators = Operator.objects.bulk_create(
+        Operator(
+            operator_name=f"Operator {o}",
+            bustimes_slug=f"op{o}",
+            primary_hex="#0019A8",
+        )
+        for o in range(max(int(50 * scale), 2))
+    )
+    routes = Route.objects.bulk_create(
+        (
+            Route(
+                service=f"{r % 900 + 1}{'ABCDEFGH'[r // 900 % 8] if r >= 900 else ''}",
+                mode=modes[0] if r % 10 else modes[r // 10 % 2 + 1],
+                operator=operators[r % len(operators)],
+                origin=f"Origin {r % 97}",
+                destination=f"Destination {r % 89}",
+                via=f"Via {r % 13}" if r % 3 else "",
+                bustimes_id=r,
+                display_order=r,
+            )
+            for r in range(max(int(5000 * scale), 4))
+        ),
+        batch_size=1000,
+    )
+
+    types = list(ServiceStatusType.objects.filter(severity__gt=0))
+    statuses = []
+    for route in routes:
+        disrupted = rng.random() < 0.2
+        for i in range(10):
+            start = now - timedelta(days=rng.randint(1, 365), hours=rng.random() * 24)
+            current = disrupted and i == 0
+            statuses.append(RouteStatus(
+                route=route,
+                status_type=rng.choice(types),
+                summary=f"Disruption {i} on {route.service}",
+                valid_from=now - timedelta(hours=1) if current else start,
+                valid_to=None if current else start + timedelta(hours=rng.randint(1, 48)),
+                is_planned=bool(i % 2),
+            ))
+    RouteStatus.objects.bulk_create(statuses, batch_size=5000)
+
+    Ticket.objects.bulk_create(
+        Ticket(
+            operator=operator,
+            name=name,
+            price=price,
+            duration=duration,
+            description=f"{name} on {operator.operator_name} buses",
+        )
+        for operator in operators
+        for name, price, duration in (
+            ("Single", "2.00", "Single journey"),
+            ("Dayrider", "5.50", "1 day"),
+            ("Weekly", "19.00", "7 days"),
+            ("Monthly", "65.00", "28 days"),
+        )
+    )
+    maps = Map.objects.bulk_create(
+        Map(
+            title=f"Network map {m}",
+            path=f"/media/maps/map-{m}.pdf",
+            hex_colour="#0019A8",
+            slug=f"map-{m}",
+        )
+        for m in range(20)
+    )
+    for i in range(3):
+        incident = NetworkIncident.objects.create(
+            title=f"Incident {i}",
+            description=f"Incident {i} description",
+            status_type=rng.choice(types),
+            start_time=now - timedelta(hours=i),
+        )
+        incident.affects_modes.set(modes[i:i + 1])
+
+    timetabled = routes[:max(int(50 * scale), 2)]
+    seed_timetable(timetabled, stops=max(int(500 * scale), 40))
+    geometry.rebuild(route.pk for route in timetabled)
+    snapshot.rebuild_all()
+    status_engine.reschedule()
+
+    # Two stops along a timetabled route, so the journey planner finds a
+    # journey between them
+    calls = list(
+        StopTime.objects
+        .filter(trip__route=timetabled[0])
+        .order_by("trip_id", "sequence")
+        .values_list("stop__code", flat=True)[:6]
+    )
+
+    return {
+        "routes": routes,
+        "operators": operators,
+        "maps": maps,
+        "stop_codes": [calls[0], calls[-1]],
+    }
+
+
+def clear_caches():
+    cache.clear()
+    pagecache.get_cache().clear()
+
+
+def query_count(url):
+    recorder = querybudget.QueryRecorder()
+    with querybudget.active(recorder):
+        client().get(url)
+    return len(recorder)
+
+
+def peak_memory_kb(url):
+    tracemalloc.start()
+    try:
+        client().get(url)
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def load_test_wsgi(url, requests, concurrency):
+    """
+    `requests` GETs of `url` through the WSGI handler from `concurrency`
+    threads; per-request latency plus overall throughput.
+
+    Each thread closes its database connections when done: left open,
+    they would outlive the suite's test database (and keep an in-memory
+    SQLite one, with its rows, alive for the next suite).
+    """
+    pending = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        http = client()
+        samples = []
+        try:
+            while True:
+                with lock:
+                    if next(pending, None) is None:
+                        return samples
+                started = time.perf_counter()
+                response = http.get(url)
+                assert response.status_code == 200, (url, response.status_code)
+                samples.append((time.perf_counter() - started) * 1e6)
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        workers = [pool.submit(worker) for _ in range(concurrency)]
+        samples = [sample for future in workers for sample in future.result()]
+    elapsed = time.perf_counter() - started
+
+    return {**summarise(samples), "rps": round(requests / elapsed, 1)}
+
+
+def load_test_asgi(url, requests, concurrency):
+    """
+    The same load through the ASGI handler, `concurrency` requests in
+    flight on one event loop. AsyncClient always sends its requests to
+    "testserver".
+
+    Each ASGI request runs its sync code in a thread of its own, so
+    connections are not persistent here (CONN_MAX_AGE 0, as under a
+    real ASGI server): the threads would exit with them still open.
+    """
+    async def run():
+        http = AsyncClient()
+        slots = asyncio.Semaphore(concurrency)
+        samples = []
+
+        async def get():
+            async with slots:
+                started = time.perf_counter()
+                response = await http.get(url)
+                assert response.status_code == 200, (url, response.status_code)
+                samples.append((time.perf_counter() - started) * 1e6)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(get() for _ in range(requests)))
+        finally:
+            # And asgiref's shared sync thread (see test_database)
+            await sync_to_async(connections.close_all)()
+        return samples, time.perf_counter() - started
+
+    max_ages = {alias: config.get("CONN_MAX_AGE", 0) for alias, config in connections.settings.items()}
+    try:
+        for config in connections.settings.values():
+            config["CONN_MAX_AGE"] = 0
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            samples, elapsed = asyncio.run(run())
+    finally:
+        for alias, max_age in max_ages.items():
+            connections.settings[alias]["CONN_MAX_AGE"] = max_age
+    return {**summarise(samples), "rps": round(requests / elapsed, 1)}
+
+
+# --------------------
+# Suites
+# --------------------
+
+@suite("timetable")
+def bench_timetable(scale=1.0, repeat=200):
+    """
+    Next-departure lookups: TimetableIndex against the equivalent ORM query.
+    """
+    routes = seed_network(routes=max(int(50 * scale), 2))
+    stop_ids = seed_timetable(routes)
+
+    started = time.perf_counter()
+    index = TimetableIndex.from_db()
+    build_ms = (time.perf_counter() - started) * 1e3
+
+    rng = random.Random(2)
+    after = timezone.make_aware(datetime(2026, 3, 4, 12, 0))
+    weekday_bit = 1 << after.weekday()
+    seconds = 12 * 3600
+
+    def index_lookup():
+        index.next_departures(rng.choice(stop_ids), after, limit=5)
+
+    def orm_lookup():
+        list(
+            StopTime.objects
+            .filter(stop_id=rng.choice(stop_ids), departure_time__gte=seconds)
+            .alias(runs=F("trip__calendar__days").bitand(weekday_bit))
+            .filter(runs__gt=0)
+            .select_related("trip")
+            .order_by("departure_time")[:5]
+        )
+
+    index_stats = measure(index_lookup, repeat)
+    orm_stats = measure(orm_lookup, repeat)
+
+    return {
+        "stop_times": len(index),
+        "index_build_ms": round(build_ms, 1),
+        "index": index_stats,
+        "orm": orm_stats,
+        "speedup_p50": round(orm_stats["p50_us"] / index_stats["p50_us"], 1),
+    }
+
+
+@suite("journey")
+def bench_journey(scale=1.0, repeat=200):
+    """
+    Earliest-arrival queries between random stops with JourneyPlanner.
+    """
+    routes = seed_network(routes=max(int(50 * scale), 2))
+    seed_timetable(routes)
+
+    started = time.perf_counter()
+    planner = JourneyPlanner.from_db()
+    build_ms = (time.perf_counter() - started) * 1e3
+
+    rng = random.Random(3)
+    depart = timezone.make_aware(datetime(2026, 3, 4, 8, 0))
+    codes = planner.stop_codes
+    found = 0
+
+    def plan():
+        nonlocal found
+        if planner.plan(rng.choice(codes), rng.choice(codes), depart):
+            found += 1
+
+    stats = measure(plan, repeat)
+
+    return {
+        "stops": len(codes),
+        "patterns": len(planner.pattern_route),
+        "trips": len(planner.trip_ids),
+        "footpaths": len(planner.transfer_to),
+        "planner_build_ms": round(build_ms, 1),
+        "plan": stats,
+        "journeys_found": found,
+    }
+
+
+@suite("search")
+def bench_search(scale=1.0, repeat=200):
+    """
+    Route search: RouteSearchIndex against icontains filters.
+    """
+    routes = seed_network(routes=max(int(2000 * scale), 2))
+    places = ["Southsea", "Cosham", "Fareham", "Havant", "Gosport", "Hilsea"]
+    rng = random.Random(4)
+    for route in routes:
+        route.origin, route.destination = rng.sample(places, 2)
+    Route.objects.bulk_update(routes, ["origin", "destination"])
+
+    started = time.perf_counter()
+    index = RouteSearchIndex.from_db()
+    build_ms = (time.perf_counter() - started) * 1e3
+
+    queries = ["1", "42", "fareham", "hav", "gosprt", "southsea cosham"]
+
+    def index_lookup():
+        index.search(rng.choice(queries), limit=10)
+
+    def orm_lookup():
+        q = rng.choice(queries)
+        list(
+            Route.objects
+            .in_service()
+            .filter(
+                Q(service__icontains=q)
+                | Q(origin__icontains=q)
+                | Q(destination__icontains=q)
+                | Q(via__icontains=q)
+                | Q(operator__operator_name__icontains=q)
+            )
+            .select_related("operator", "mode")[:10]
+        )
+
+    index_stats = measure(index_lookup, repeat)
+    orm_stats = measure(orm_lookup, repeat)
+
+    return {
+        "routes": len(index),
+        "terms": len(index.terms),
+        "index_build_ms": round(build_ms, 1),
+        "index": index_stats,
+        "orm": orm_stats,
+        "speedup_p50": round(orm_stats["p50_us"] / index_stats["p50_us"], 1),
+    }
+
+
+@suite("api")
+def bench_api(scale=1.0, repeat=50):
+    """
+    JSON API responses against the HTML pages they replace for scrapers.
+
+    HTML pages are timed with the page cache emptied before each request,
+    so both sides build their response from the database.
+    """
+    routes = seed_network(operators=4, routes=max(int(400 * scale), 4))
+    seed_statuses(routes)
+    snapshot.rebuild_all()
+
+    http = client()
+    pages = pagecache.get_cache()
+
+    def timed(url, uncached=False, **headers):
+        def request():
+            if uncached:
+                pages.clear()
+            response = http.get(url, **headers)
+            assert response.status_code == 200, (url, response.status_code)
+            sizes[url, bool(headers)] = len(response.content)
+        return request
+
+    sizes = {}
+    pairs = {
+        "routes": (
+            reverse("siteui:routes"),
+            reverse("siteui:api_routes") + "?limit=200",
+        ),
+        "status": (
+            reverse("siteui:status"),
+            reverse("siteui:api_status"),
+        ),
+    }
+
+    results = {"routes": len(routes)}
+    for name, (html_url, api_url) in pairs.items():
+        html = measure(timed(html_url, uncached=True), repeat)
+        api = measure(timed(api_url), repeat)
+        measure(timed(api_url, HTTP_ACCEPT_ENCODING="gzip"), 1)
+        results[name] = {
+            "html": html,
+            "api": api,
+            "html_bytes": sizes[html_url, False],
+            "api_bytes": sizes[api_url, False],
+            "api_gzip_bytes": sizes[api_url, True],
+            "speedup_p50": round(html["p50_us"] / api["p50_us"], 1),
+        }
+    return results
+
+
+def seed_shapes(routes, points=600, step=0.0002, seed=9):
+    """
+    {route pk: [line]}: a wandering line of `points` points (about 20 m
+    apart) per route, around Portsmouth.
+    """
+    rng = random.Random(seed)
+    shapes = {}
+    for route in routes:
+        lat, lon = 50.78 + rng.random() * 0.1, -1.15 + rng.random() * 0.15
+        heading = rng.random() * math.tau
+        line = []
+        for _ in range(points):
+            heading += rng.gauss(0, 0.15)
+            lat += step * math.sin(heading)
+            lon += step * 1.6 * math.cos(heading)
+            line.append((lat, lon))
+        shapes[route.pk] = [line]
+    return shapes
+
+
+@suite("geometry")
+def bench_geometry(scale=1.0, repeat=200):
+    """
+    Route geometry: points and bytes per level against the raw shapes
+    as GeoJSON, and bounding-box lookups through GeometryIndex against
+    the equivalent ORM filter on RouteGeometry.
+    """
+    routes = seed_network(operators=4, routes=max(int(500 * scale), 4))
+    shapes = seed_shapes(routes)
+
+    started = time.perf_counter()
+    geometry.rebuild(shapes, shapes)
+    build_ms = (time.perf_counter() - started) * 1e3
+
+    raw_points = sum(len(line) for lines in shapes.values() for line in lines)
+    geojson_bytes = len(api.encode([
+        {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in line]}
+        for lines in shapes.values()
+        for line in lines
+    ]))
+    levels = {}
+    for level, (min_zoom, tolerance) in enumerate(geometry.LEVELS):
+        rows = RouteGeometry.objects.filter(level=level).values_list("points", "lines")
+        levels[f"zoom {min_zoom}+ ({tolerance} m)"] = {
+            "points": sum(points for points, _ in rows),
+            "bytes": len(api.encode([lines for _, lines in rows])),
+        }
+
+    started = time.perf_counter()
+    geometry.get_index()
+    index_build_ms = (time.perf_counter() - started) * 1e3
+
+    rng = random.Random(3)
+
+    def random_bbox():
+        lat, lon = 50.78 + rng.random() * 0.08, -1.15 + rng.random() * 0.12
+        return lat, lon, lat + 0.02, lon + 0.03
+
+    def index_lookup():
+        geometry.in_bbox(random_bbox(), 13)
+
+    def orm_lookup():
+        min_lat, min_lon, max_lat, max_lon = random_bbox()
+        list(
+            RouteGeometry.objects
+            .filter(
+                level=geometry.level_for_zoom(13),
+                min_lat__lte=max_lat,
+                max_lat__gte=min_lat,
+                min_lon__lte=max_lon,
+                max_lon__gte=min_lon,
+            )
+            .values_list("route__uuid", "route__service", "lines")
+        )
+
+    def tile_lookup():
+        lat, lon, *_ = random_bbox()
+        geometry.tile(14, *geometry.tile_at(lat, lon, 14))
+
+    index_stats = measure(index_lookup, repeat)
+    orm_stats = measure(orm_lookup, repeat)
+
+    return {
+        "routes": len(shapes),
+        "raw_points": raw_points,
+        "geojson_bytes": geojson_bytes,
+        "levels": levels,
+        "build_ms": round(build_ms, 1),
+        "index_build_ms": round(index_build_ms, 1),
+        "index": index_stats,
+        "orm": orm_stats,
+        "tile": measure(tile_lookup, repeat),
+        "speedup_p50": round(orm_stats["p50_us"] / index_stats["p50_us"], 1),
+    }
+
+
+# The routes list as routes.html rendered it before rows were grouped in
+# the view and pre-rendered (siteui.rows): every route visited once per
+# mode
+NESTED_ROUTES_LIST = """
+{% for mode in modes %}<h2>{{ mode.name }}</h2><ul>
+{% for route in routes %}{% if route.mode == mode %}
+<li class="route-row">
+  <button class="route-toggle" type="button" aria-expanded="false">
+    <span class="status-bar" style="background-color: {{ route.route_hex|default:route.operator.primary_hex }}" aria-hidden="true"></span>
+    <span class="route-main">
+      <a href="{% url 'siteui:route_detail' route.uuid %}" class="route-service">{{ route.service }}</a>
+      <span class="route-operator">{{ route.operator.operator_name }}</span>
+    </span>
+    <span class="route-chevron" aria-hidden="true">▾</span>
+  </button>
+  <div class="route-dropdown" hidden>
+    <div class="route-detail"><strong>Route:</strong> {{ route.origin }} → {{ route.destination }}</div>
+    {% if route.via %}<div class="route-detail"><strong>Via:</strong> {{ route.via }}</div>{% endif %}
+    {% with vehicles=route.vehicles_used.all %}{% if vehicles %}
+      <div class="route-detail"><strong>Vehicles:</strong>
+        {% for vehicle in vehicles %}{{ vehicle.name }}{% if not forloop.last %}, {% endif %}{% endfor %}
+      </div>
+    {% endif %}{% endwith %}
+  </div>
+</li>
+{% endif %}{% endfor %}
+</ul>{% endfor %}
+"""
+
+GROUPED_ROUTES_LIST = """
+{% for mode, rows in groups %}<h2>{{ mode.name }}</h2><ul>
+{% for row in rows %}{{ row }}{% endfor %}
+</ul>{% endfor %}
+"""
+
+
+@suite("rendering")
+def bench_rendering(scale=1.0, repeat=200):
+    """
+    The routes list at growing sizes: the nested per-mode template loop
+    against rows grouped in the view, rendered cold (every row rendered)
+    and warm (rows reused, as across search result pages); then 5,000
+    routes over more modes.
+    """
+    largest = max(int(5000 * scale), 8)
+    seed_network(operators=4, routes=largest)
+    modes = [Mode.objects.get(slug="bus")] + [
+        Mode.objects.create(name=f"Mode {m}", slug=f"mode-{m}") for m in range(11)
+    ]
+    routes = list(
+        Route.objects
+        .select_related("mode", "operator")
+        .prefetch_related("vehicles_used")
+        .order_by("display_order", "pk")
+    )
+
+    nested = Template(NESTED_ROUTES_LIST)
+    grouped = Template(GROUPED_ROUTES_LIST)
+    repeat = max(repeat // 20, 3)
+
+    def timings(routes, modes):
+        def render_nested():
+            nested.render(Context({"routes": routes, "modes": modes}))
+
+        def render_grouped(cold):
+            def render():
+                if cold:
+                    rows._local["routes"].clear()
+                grouped.render(Context({"groups": rows.route_groups(routes, modes)}))
+            return render
+
+        return {
+            "nested": measure(render_nested, repeat)["p50_us"],
+            "grouped_cold": measure(render_grouped(cold=True), repeat)["p50_us"],
+            "grouped_warm": measure(render_grouped(cold=False), repeat)["p50_us"],
+        }
+
+    def assign_modes(count):
+        for i, route in enumerate(routes):
+            route.mode = modes[i % count]
+        Route.objects.bulk_update(routes, ["mode"], batch_size=1000)
+        return sorted(modes[:count], key=lambda mode: mode.name)
+
+    results = {"by_routes": {}, "by_modes": {}}
+    three = assign_modes(3)
+    for size in sorted({largest // 8, largest // 4, largest // 2, largest}):
+        results["by_routes"][size] = timings(routes[:size], three)
+    for count in (3, 6, 12):
+        results["by_modes"][count] = timings(routes, assign_modes(count))
+
+    by_routes = results["by_routes"]
+    smallest, largest = min(by_routes), max(by_routes)
+    results["growth"] = {
+        kind: round(by_routes[largest][kind] / by_routes[smallest][kind], 1)
+        for kind in ("nested", "grouped_cold", "grouped_warm")
+    }
+    results["growth"]["routes"] = round(largest / smallest, 1)
+    return results
+
+
+@suite("assets")
+def bench_assets(scale=1.0, repeat=1):
+    """
+    Bytes a browser downloads per page view, with the stylesheets and
+    scripts as source files and as built bundles (collectstatic). All
+    responses gzip-compressed, as a browser would be sent them.
+
+    A first view downloads the page and its assets; a repeat view only
+    the page and any asset not served as immutable.
+    """
+    seed_scale(scale / 10)
+    http = client()
+    factory = RequestFactory(HTTP_ACCEPT_ENCODING="gzip")
+    pages = {
+        "home": reverse("siteui:home"),
+        "status": reverse("siteui:status"),
+        "operators": reverse("siteui:operators"),
+    }
+
+    def asset_bytes(url, built):
+        # Called directly: the static URL is only routed with DEBUG off
+        # at import, and sources are served from the finders
+        path = url[len(settings.STATIC_URL):]
+        if built:
+            response = assets.serve(factory.get(url), path)
+        else:
+            response = serve_source(factory.get(url), path, insecure=True)
+        body = b"".join(response.streaming_content)
+        if response.get("Content-Encoding") != "gzip":
+            body = gzip.compress(body)
+        return len(body), response.get("Cache-Control") == assets.IMMUTABLE
+
+    def page_bytes(url, built):
+        html = http.get(url).content
+        first = repeat_view = len(gzip.compress(html))
+        for asset in re.findall(rb'(?:href|src)="(/static/[^"]+\.(?:css|js))"', html):
+            size, immutable = asset_bytes(asset.decode(), built)
+            first += size
+            if not immutable:
+                repeat_view += size
+        return {"first_view_bytes": first, "repeat_view_bytes": repeat_view}
+
+    results = {}
+    with (
+        tempfile.TemporaryDirectory() as root,
+        override_settings(STATIC_ROOT=root, DEBUG=False),
+    ):
+        results["sources"] = {name: page_bytes(url, False) for name, url in pages.items()}
+        call_command("collectstatic", interactive=False, verbosity=0)
+        # Cached pages link the sources
+        clear_caches()
+        results["built"] = {name: page_bytes(url, True) for name, url in pages.items()}
+    return results
+
+
+@suite("asgi")
+def bench_asgi(scale=1.0, repeat=200, concurrency=20):
+    """
+    The async status, route and operator pages served through the ASGI
+    handler against the WSGI handler, under concurrent load.
+
+    Caches are warm, as in steady state: status answers from the
+    snapshot, operator pages from the page cache and route pages
+    render from the database each time.
+    """
+    routes = seed_network(operators=4, routes=max(int(400 * scale), 4))
+    seed_statuses(routes)
+    snapshot.rebuild_all()
+
+    urls = {
+        "status": reverse("siteui:status"),
+        "route_detail": reverse("siteui:route_detail", args=[routes[0].uuid]),
+        "operator_detail": reverse(
+            "siteui:operator_detail", args=[routes[0].operator.bustimes_slug]
+        ),
+    }
+
+    results = {"routes": len(routes), "concurrency": concurrency}
+    for name, url in urls.items():
+        client().get(url)
+        wsgi = load_test_wsgi(url, repeat, concurrency)
+        asgi = load_test_asgi(url, repeat, concurrency)
+        results[name] = {
+            "wsgi": wsgi,
+            "asgi": asgi,
+            "asgi_throughput_ratio": round(asgi["rps"] / wsgi["rps"], 2),
+        }
+    return results
+
+
+# URL names the views suite does not request, and why
+UNBENCHMARKED = {
+    "status_stream": "held open for the life of the client",
+    "metrics": "404 unless SITEUI_METRICS_ENABLED",
+    "map_document": "file streaming; seeded maps have no documents",
+    "map_tile": "file streaming; seeded maps have no documents",
+}
+
+
+def view_urls(seeded):
+    """
+    {url name: (url, expected status)} covering every siteui URL.
+    """
+    route = seeded["routes"][len(seeded["routes"]) // 2]
+    operator = seeded["operators"][0]
+    origin, destination = seeded["stop_codes"]
+    journey_query = f"?from={origin}&to={destination}&date=2026-03-04&depart=08:00"
+
+    found = {
+        "home": (reverse("siteui:home"), 200),
+        "status": (reverse("siteui:status"), 200),
+        "maps": (reverse("siteui:maps"), 200),
+        "map_detail": (reverse("siteui:map_detail", args=[seeded["maps"][0].slug]), 302),
+        "fares": (reverse("siteui:fares"), 200),
+        "operators": (reverse("siteui:operators"), 200),
+        "operator_stagecoach": (reverse("siteui:operator_stagecoach"), 200),
+        "operator_first": (reverse("siteui:operator_first"), 200),
+        "operator_detail": (reverse("siteui:operator_detail", args=[operator.bustimes_slug]), 200),
+        "routes": (reverse("siteui:routes"), 200),
+        "route_search": (reverse("siteui:route_search") + "?q=12", 200),
+        "route_detail": (reverse("siteui:route_detail", args=[route.uuid]), 200),
+        "journey": (reverse("siteui:journey") + journey_query, 200),
+        "journey_api": (reverse("siteui:journey_api") + journey_query, 200),
+        "journey_stops": (reverse("siteui:journey_stops") + "?q=stop", 200),
+        "api_status": (reverse("siteui:api_status"), 200),
+        "api_routes": (reverse("siteui:api_routes"), 200),
+        "api_route_detail": (
+            reverse("siteui:api_route_detail", args=[route.uuid]) + "?fields=uuid,service,statuses",
+            200,
+        ),
+        "api_operators": (reverse("siteui:api_operators"), 200),
+        "api_operator_detail": (
+            reverse("siteui:api_operator_detail", args=[operator.bustimes_slug]),
+            200,
+        ),
+        "api_tickets": (reverse("siteui:api_tickets"), 200),
+        "api_route_geometry": (
+            reverse("siteui:api_route_geometry") + "?bbox=-1.15,50.78,-1.0,50.88&zoom=13",
+            200,
+        ),
+        "api_route_geometry_tile": (
+            reverse("siteui:api_route_geometry_tile", args=[13, *geometry.tile_at(50.83, -1.07, 13)]),
+            200,
+        ),
+    }
+
+    names = {pattern.name for pattern in urls.urlpatterns if pattern.name}
+    missing = names - set(found) - set(UNBENCHMARKED)
+    if missing:
+        raise RuntimeError(
+            f"No benchmark URL for {', '.join(sorted(missing))}: add to view_urls()"
+        )
+    return found
+
+
+@suite("views")
+def bench_views(scale=1.0, repeat=200, concurrency=10):
+    """
+    Every siteui URL against a seeded network (see seed_scale):
+
+    - cold: shared caches cleared before each request (repeat / 20 times);
+    - warm: steady state, `repeat` sequential requests;
+    - wsgi / asgi: `repeat` warm requests through each handler with
+      `concurrency` in flight;
+
+    with queries per cold and warm request and the peak memory Python
+    allocated for one cold request.
+    """
+    started = time.perf_counter()
+    seeded = seed_scale(scale)
+    results = {
+        "seed": {
+            "operators": len(seeded["operators"]),
+            "routes": len(seeded["routes"]),
+            "route_statuses": RouteStatus.objects.count(),
+            "snapshot_rows": NetworkStatusSnapshot.objects.count(),
+            "tickets": Ticket.objects.count(),
+            "maps": len(seeded["maps"]),
+            "seed_seconds": round(time.perf_counter() - started, 1),
+        },
+        "urls": {},
+    }
+    cold_repeat = max(math.ceil(repeat / 20), 1)
+    http = client()
+
+    for name, (url, expected) in view_urls(seeded).items():
+        def get():
+            response = http.get(url)
+            if expected is not None:
+                assert response.status_code == expected, (url, response.status_code)
+
+        def cold():
+            clear_caches()
+            get()
+
+        clear_caches()
+        entry = {"url": url, "queries_cold": query_count(url)}
+        entry["queries_warm"] = query_count(url)
+        clear_caches()
+        entry["peak_memory_kb_cold"] = peak_memory_kb(url)
+        entry["cold"] = measure(cold, cold_repeat)
+        entry["warm"] = measure(get, repeat)
+        if expected == 200:
+            entry["wsgi"] = load_test_wsgi(url, repeat, concurrency)
+            entry["asgi"] = load_test_asgi(url, repeat, concurrency)
+        results["urls"][name] = entry
+
+    results["max_rss_mb"] = round(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+    )
+    results["unbenchmarked"] = UNBENCHMARKED
+    return results
+
+
+def compare(old, new, threshold=0.1, path=""):
+    """
+    Numbers that moved by more than `threshold` (a fraction) between two
+    result trees, as (path, old, new) tuples.
+    """
+    changes = []
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in sorted(old.keys() & new.keys()):
+            changes += compare(old[key], new[key], threshold, f"{path}.{key}" if path else key)
+    elif (
+        isinstance(old, (int, float)) and isinstance(new, (int, float))
+        and not isinstance(old, bool)
+        and old != new
+        and (old == 0 or abs(new - old) / abs(old) > threshold)
+    ):
+        changes.append((path, old, new))
+    return changes
@@ -0,0 +1,308 @@
+"""
+Bustimes.org services API client and route sync.
+
+Pages for many operators are fetched concurrently over one pooled
+session, then written per operator with a diff against the existing
+routes: one SELECT, one bulk_create and one bulk_update.
+
+Syncs are incremental: the first page of each operator is requested
+conditionally with the validators from the last run, and services whose
+payload hash has not changed are skipped before touching the database.
+"""
+
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import geometry, pagecache, search, snapshot
+from .models import Route
+
+BUSTIMES_URL = "https://bustimes.org/api/services/"
+
+PAGE_SIZE = 100
+TIMEOUT = 20
+
+ROUTE_FIELDS = (
+    "service",
+    "origin",
+    "destination",
+    "via",
+    "operator_id",
+    "mode_id",
+    "is_retired",
+)
+
+
+def make_session(pool_size=8):
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+        ),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class OperatorFeed:
+    """
+    Services fetched for one operator, with the validators to send next
+    time. `services` is None when the API answered 304 Not Modified.
+    """
+
+    def __init__(self, services, etag="", last_modified=""):
+        self.services = services
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def not_modified(self):
+        return self.services is None
+
+
+def _get(session, url, params=None, headers=None):
+    response = session.get(url, params=params, headers=headers, timeout=TIMEOUT)
+    response.raise_for_status()
+    return response
+
+
+def _get_page(session, url):
+    return _get(session, url).json()
+
+
+def _get_first_page(session, url, code, page_size, validators):
+    etag, last_modified = validators.get(code, ("", ""))
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    response = _get(
+        session,
+        url,
+        params={"operator": code, "limit": page_size},
+        headers=headers,
+    )
+    if response.status_code == 304:
+        return None, etag, last_modified
+
+    return (
+        response.json(),
+        response.headers.get("ETag", ""),
+        response.headers.get("Last-Modified", ""),
+    )
+
+
+def _remaining_page_urls(page):
+    """
+    URLs of every page after the first, when the API uses limit/offset
+    pagination and reports a total count; None otherwise.
+    """
+    next_url = page.get("next")
+    count = page.get("count")
+    if not next_url or count is None:
+        return None
+
+    parts = urlsplit(next_url)
+    query = parse_qs(parts.query)
+    if "offset" not in query or "limit" not in query:
+        return None
+
+    limit = int(query["limit"][0])
+    first_offset = int(query["offset"][0])
+
+    urls = []
+    for offset in range(first_offset, count, limit):
+        query["offset"] = [str(offset)]
+        urls.append(urlunsplit(parts._replace(query=urlencode(query, doseq=True))))
+    return urls
+
+
+def fetch_services(operator_codes, base_url=BUSTIMES_URL, workers=8,
+                   page_size=PAGE_SIZE, validators=None, session=None):
+    """
+    Fetch every service for each operator code.
+
+    Returns {operator_code: OperatorFeed}. First pages are fetched in
+    parallel, conditionally when `validators` holds an (etag,
+    last_modified) pair for the operator; the remaining pages of each
+    operator are then fanned out across the same pool, falling back to
+    following `next` links when the page URLs cannot be computed up front.
+    """
+    session = session or make_session(workers)
+    validators = validators or {}
+    feeds = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        first_pages = dict(zip(
+            operator_codes,
+            pool.map(
+                lambda code: _get_first_page(
+                    session, base_url, code, page_size, validators,
+                ),
+                operator_codes,
+            ),
+        ))
+
+        pending = []
+        for code, (page, etag, last_modified) in first_pages.items():
+            if page is None:
+                feeds[code] = OperatorFeed(None, etag, last_modified)
+                continue
+
+            services = list(page.get("results", []))
+            if page.get("next"):
+                # Validators only cover the first page, so they cannot
+                # vouch for a listing that spans several
+                etag = last_modified = ""
+            feeds[code] = OperatorFeed(services, etag, last_modified)
+
+            urls = _remaining_page_urls(page)
+            if urls is None:
+                next_url = page.get("next")
+                while next_url:
+                    page = _get_page(session, next_url)
+                    services.extend(page.get("results", []))
+                    next_url = page.get("next")
+            else:
+                pending.extend(
+                    (services, pool.submit(_get_page, session, url))
+                    for url in urls
+                )
+
+        for services, future in pending:
+            services.extend(future.result().get("results", []))
+
+    return feeds
+
+
+def service_hash(item):
+    """
+    Stable content hash of one service payload.
+    """
+    payload = json.dumps(item, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def parse_description(description):
+    """
+    Split a Bustimes description into origin, destination and via.
+    """
+    parts = [p.strip() for p in description.split(" - ")]
+
+    origin = parts[0]
+    destination = parts[-1]
+    via = " - ".join(parts[1:-1]) if len(parts) > 2 else ""
+    return origin, destination, via
+
+
+class SyncResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.retired = 0
+        self.hashes = {}
+
+
+def sync_routes(operator, mode, services, known_hashes=None,
+                retire_missing=False):
+    """
+    Create or update routes for `operator` from Bustimes services.
+
+    Services whose payload hash matches `known_hashes` (as stored from the
+    previous run) are skipped without touching the database. With
+    `retire_missing`, in-service routes of the operator that are no longer
+    listed upstream are marked retired.
+    """
+    known_hashes = known_hashes or {}
+    result = SyncResult()
+    now = timezone.now()
+
+    incoming = {}
+    for item in services:
+        digest = service_hash(item)
+        result.hashes[str(item["id"])] = digest
+        if known_hashes.get(str(item["id"])) == digest:
+            result.skipped += 1
+            continue
+
+        origin, destination, via = parse_description(item["description"])
+        incoming[item["id"]] = {
+            "service": item["line_name"],
+            "origin": origin,
+            "destination": destination,
+            "via": via,
+            "operator_id": operator.pk,
+            "mode_id": mode.pk,
+            "is_retired": False,
+        }
+
+    existing = (
+        Route.objects.in_bulk(incoming.keys(), field_name="bustimes_id")
+        if incoming else {}
+    )
+
+    to_create = []
+    to_update = []
+    for bustimes_id, values in incoming.items():
+        route = existing.get(bustimes_id)
+        if route is None:
+            to_create.append(Route(bustimes_id=bustimes_id, **values))
+            continue
+
+        if any(getattr(route, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(route, field, value)
+            route.updated_at = now
+            to_update.append(route)
+
+    with transaction.atomic():
+        if to_create or to_update:
+            Route.objects.bulk_create(to_create)
+            Route.objects.bulk_update(to_update, ROUTE_FIELDS + ("updated_at",))
+
+        retired = []
+        if retire_missing:
+            retired = list(
+                Route.objects
+                .in_service()
+                .filter(operator=operator)
+                .exclude(bustimes_id__in=[item["id"] for item in services])
+                .values_list("pk", flat=True)
+            )
+            result.retired = (
+                Route.objects
+                .filter(pk__in=retired)
+                .update(is_retired=True, updated_at=now)
+            )
+
+        # Bulk writes skip signals; keep the status snapshot (which drops
+        # retired routes), search and geometry indexes and page cache in
+        # step, as siteui.signals does for single saves
+        snapshot.rebuild_routes([*(route.pk for route in to_update), *retired])
+        if to_create or to_update or retired:
+            for invalidate in (search.invalidate, geometry.invalidate):
+                invalidate()
+                transaction.on_commit(invalidate)
+            pagecache.invalidate_on_commit(Route)
+
+    result.created = len(to_create)
+    result.updated = len(to_update)
+    result.unchanged = len(incoming) - result.created - result.updated
+    return result
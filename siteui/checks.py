@@ -0,0 +1,50 @@
+"""
+System checks for settings siteui relies on between processes.
+
+Version counters (siteui.versions), the incident banner and the status
+scheduler's state live in the "default" cache. Every web process and
+management command has to share it, or changes made by one are never
+seen by the others.
+"""
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+PER_PROCESS_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def _per_process(alias):
+    return settings.CACHES.get(alias, {}).get("BACKEND") in PER_PROCESS_BACKENDS
+
+
+@register()
+def page_cache_counters(app_configs, **kwargs):
+    """
+    A shared page cache is keyed by version counters, so it needs shared
+    counters too.
+    """
+    alias = getattr(settings, "SITEUI_PAGE_CACHE_ALIAS", "pages")
+    if _per_process("default") and not _per_process(alias):
+        return [Warning(
+            f"The {alias!r} cache is shared between processes but the "
+            "default cache, which holds its version counters, is not.",
+            hint="Set TFP_CACHE_URL as well as TFP_PAGE_CACHE_URL.",
+            id="siteui.W001",
+        )]
+    return []
+
+
+@register(deploy=True)
+def shared_default_cache(app_configs, **kwargs):
+    if _per_process("default"):
+        return [Warning(
+            "The default cache is per process, so changes made in one web "
+            "process or management command are not seen by the others.",
+            hint="Set TFP_CACHE_URL to a Redis or file:// cache, or run a "
+                 "single web process.",
+            id="siteui.W002",
+        )]
+    return []
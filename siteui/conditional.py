@@ -0,0 +1,183 @@
+"""
+ETag / Last-Modified validators for siteui pages.
+
+A page's validators come from the models it is built from, the same
+dependency lists siteui.pagecache uses:
+
+- the ETag hashes the dependencies' version counters (plus the incident
+  banner's, which base.html renders) and the request path, so checking
+  If-None-Match costs cache reads only;
+- Last-Modified is the latest updated_at / last_updated across the
+  dependencies and active incidents. It is remembered against the
+  version counters, so it is only queried again after a change; if a
+  change moved no timestamp (a delete, a status window opening) the time
+  of the recomputation is used instead, so it never goes backwards.
+
+Both need the counters to be shared between processes
+(versions.shared()). Where they are not, one process would keep
+answering 304 for a change made in another, so the validators are read
+from the data on each request instead: per dependency, the latest
+timestamp, the latest validity window boundary passed and the row count
+(which catches deletes), one query each.
+
+Either validator lets Django answer with 304 before the view renders.
+"""
+
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from . import incidents, pagecache, versions
+from .models import NetworkIncident
+
+LAST_CHANGED_KEY = "siteui:conditional:last-changed:{labels}"
+LAST_CHANGED_TIMEOUT = 60 * 60 * 24 * 30
+
+TIMESTAMP_FIELDS = ("updated_at", "last_updated")
+WINDOW_FIELDS = ("valid_from", "valid_to")
+
+
+def _timestamp_field(model):
+    for field in model._meta.get_fields():
+        if field.name in TIMESTAMP_FIELDS:
+            return field.name
+    return None
+
+
+def _data_state(models):
+    """
+    [{"rows", "latest", window field...}, ...] for `models` and
+    NetworkIncident, straight from the database.
+    """
+    now = timezone.now()
+    state = []
+    for model in (*models, NetworkIncident):
+        aggregates = {"rows": Count("pk")}
+        field = _timestamp_field(model)
+        if field is not None:
+            aggregates["latest"] = Max(field)
+        names = {field.name for field in model._meta.get_fields()}
+        for window in WINDOW_FIELDS:
+            if window in names:
+                aggregates[window] = Max(window, filter=Q(**{f"{window}__lte": now}))
+        state.append(model._default_manager.aggregate(**aggregates))
+    return state
+
+
+def _hash(parts):
+    return hashlib.md5(
+        "\x1f".join(str(part) for part in parts).encode()
+    ).hexdigest()
+
+
+def _versions(labels):
+    return (
+        *versions.get_many([pagecache.version_name(label) for label in labels]),
+        incidents.current_version(),
+    )
+
+
+def etag(labels, path):
+    return _hash([*_versions(labels), path])
+
+
+def last_changed(models):
+    """
+    When anything behind `models` (or the incident banner) last changed.
+    """
+    labels = sorted(pagecache.label(model) for model in models)
+    key = LAST_CHANGED_KEY.format(labels=",".join(labels))
+    current = _versions(labels)
+
+    remembered = cache.get(key)
+    if remembered is not None and remembered[0] == current:
+        return remembered[1]
+
+    latest = None
+    for model in (*models, NetworkIncident):
+        field = _timestamp_field(model)
+        if field is None:
+            continue
+        value = model._default_manager.aggregate(latest=Max(field))["latest"]
+        if value is not None and (latest is None or value > latest):
+            latest = value
+
+    if remembered is not None and (latest is None or latest <= remembered[1]):
+        latest = timezone.now()
+
+    latest = latest or timezone.now()
+    cache.set(key, (current, latest), timeout=LAST_CHANGED_TIMEOUT)
+    return latest
+
+
+def validators(models, path):
+    """
+    (ETag, Last-Modified) for the page at `path` built from `models`.
+    """
+    if versions.shared():
+        labels = sorted(pagecache.label(model) for model in models)
+        return etag(labels, path), last_changed(models)
+
+    state = _data_state(models)
+    latest = max(
+        (value for row in state for key, value in row.items() if key != "rows" and value),
+        default=None,
+    )
+    return _hash([*(sorted(row.items()) for row in state), path]), latest
+
+
+def conditional(depends_on, before=None):
+    """
+    Answer conditional GET/HEAD requests for a view built from the
+    `depends_on` models with 304 Not Modified when nothing has changed.
+
+    `before` is called first, for data that changes with time rather
+    than with a save (see status_engine.refresh_if_due). For async views
+    it and both validators are computed in a single thread hop.
+    """
+    def current(request):
+        if before is not None:
+            before()
+        return validators(depends_on, request.get_full_path())
+
+    def respond(view, tag, modified, request, *args, **kwargs):
+        return condition(
+            etag_func=lambda request, *args, **kwargs: tag,
+            last_modified_func=lambda request, *args, **kwargs: modified,
+        )(view)(request, *args, **kwargs)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                tag, modified = await sync_to_async(current)(request)
+                return await respond(view, tag, modified, request, *args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            tag, modified = current(request)
+            return respond(view, tag, modified, request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def cached_page(name, depends_on, before=None):
+    """
+    pagecache.cache_page behind conditional(): unchanged pages get a 304,
+    changed ones are served from the page cache when possible.
+    """
+    def decorator(view):
+        return conditional(depends_on, before=before)(
+            pagecache.cache_page(name, depends_on)(view)
+        )
+
+    return decorator
@@ -1,15 +1,22 @@
-from .models import NetworkIncident
+from . import incidents, metrics
 
 
 def network_incident(request):
-    incident = (
-        NetworkIncident.objects
-        .filter(active=True)
-        .select_related("status_type")
-        .order_by("-start_time")
-        .first()
-    )
+    """
+    Active incident banner, served from siteui.incidents' cache.
+
+    `network_incidents_by_mode` scopes the banner to a mode in templates,
+    e.g. ``network_incidents_by_mode.ferry``, without further queries.
+
+    Async views fetch the banner up front (incidents.aget_banner) since
+    templates render synchronously inside the event loop.
+    """
+    with metrics.timed("context_processor"):
+        banner = getattr(request, "network_banner", None)
+        if banner is None:
+            banner = incidents.get_banner()
 
     return {
-        "active_network_incident": incident
+        "active_network_incident": banner.latest,
+        "network_incidents_by_mode": banner.by_mode,
     }
@@ -0,0 +1,174 @@
+"""
+EXPLAIN plans for the hot siteui querysets.
+
+HOT_QUERIES lists the querysets behind the busiest pages and endpoints,
+built the way the views build them. plans() runs EXPLAIN on each and
+reports the tables read with a full scan rather than an index, less the
+ones a query reads in full by design (the status page reads the whole
+snapshot, the routes page every route). Used by the explain_queries
+command.
+"""
+
+import re
+from dataclasses import dataclass
+
+from django.db import connection
+
+from . import api, snapshot
+from .models import NetworkIncident, NetworkStatusSnapshot, Operator, Route, RouteStatus, Ticket
+
+# SQLite: "SCAN siteui_route" without "USING [COVERING] INDEX";
+# PostgreSQL: "Seq Scan on siteui_route"
+_SQLITE_SCAN = re.compile(r"\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)(?:\s|$)")
+_POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+@dataclass
+class HotQuery:
+    name: str
+    build: object
+    full_scans_ok: tuple = ()
+
+
+def _sample():
+    route = Route.objects.in_service().order_by("pk").first()
+    operator = Operator.objects.order_by("pk").first()
+    return route, operator
+
+
+HOT_QUERIES = [
+    HotQuery(
+        "status page",
+        lambda route, operator: NetworkStatusSnapshot.objects.all(),
+        full_scans_ok=("siteui_networkstatussnapshot",),
+    ),
+    HotQuery(
+        "snapshot rebuild (network)",
+        lambda route, operator: snapshot.disruption_statuses(),
+        full_scans_ok=("siteui_servicestatustype",),
+    ),
+    HotQuery(
+        "snapshot rebuild (one route)",
+        lambda route, operator: snapshot.disruption_statuses([route.pk]),
+        full_scans_ok=("siteui_servicestatustype",),
+    ),
+    HotQuery(
+        "status timeline",
+        lambda route, operator: (
+            RouteStatus.objects
+            .filter(is_active=True)
+            .values_list("pk", "route_id", "valid_from", "valid_to")
+        ),
+    ),
+    HotQuery(
+        "incident banner",
+        lambda route, operator: (
+            NetworkIncident.objects
+            .filter(active=True)
+            .select_related("status_type")
+            .order_by("-start_time")
+        ),
+    ),
+    HotQuery(
+        "routes page",
+        lambda route, operator: (
+            Route.objects
+            .in_service()
+            .select_related("mode", "operator")
+            .order_by("mode__name", "display_order", "service")
+        ),
+        full_scans_ok=("siteui_route", "siteui_mode", "siteui_operator"),
+    ),
+    HotQuery(
+        "operator page routes",
+        lambda route, operator: (
+            Route.objects
+            .in_service()
+            .filter(operator=operator)
+            .select_related("mode")
+            .annotate_worst_status()
+            .order_by("mode__name", "display_order", "service")
+        ),
+        full_scans_ok=("siteui_mode", "siteui_servicestatustype"),
+    ),
+    HotQuery(
+        "operator tickets",
+        lambda route, operator: Ticket.objects.filter(operator=operator).order_by("price"),
+    ),
+    HotQuery(
+        "route page",
+        lambda route, operator: (
+            Route.objects
+            .select_related("operator")
+            .annotate_worst_status()
+            .filter(uuid=route.uuid)
+        ),
+        full_scans_ok=("siteui_servicestatustype",),
+    ),
+    HotQuery(
+        "API routes page",
+        lambda route, operator: api.select_values(
+            Route.objects
+            .in_service()
+            .annotate_worst_status()
+            .filter(api._after(api.ROUTE_ORDERING, [route.display_order, route.service, route.pk]))
+            .order_by(*api.ROUTE_ORDERING),
+            api.ROUTE_FIELDS,
+            extra=api.ROUTE_ORDERING,
+        )[0][:api.DEFAULT_LIMIT + 1],
+        full_scans_ok=("siteui_mode", "siteui_operator", "siteui_servicestatustype"),
+    ),
+    HotQuery(
+        "API route statuses",
+        lambda route, operator: (
+            RouteStatus.objects
+            .current()
+            .filter(route__uuid=route.uuid)
+            .order_by("-status_type__severity", "-valid_from")
+        ),
+        full_scans_ok=("siteui_servicestatustype",),
+    ),
+]
+
+
+def full_scans(plan):
+    """
+    Tables `plan` (EXPLAIN output) reads with a full scan. Scans of
+    subquery results and CTEs are not counted.
+    """
+    pattern = _POSTGRES_SCAN if connection.vendor == "postgresql" else _SQLITE_SCAN
+    tables = set(connection.introspection.table_names())
+    return sorted(set(pattern.findall(plan)) & tables)
+
+
+def explain(queryset):
+    """
+    EXPLAIN output for `queryset`, one plan step per line.
+
+    Runs the statement itself rather than QuerySet.explain(), which
+    produces invalid SQL on SQLite for querysets filtering on a window
+    function (worst_per_route()).
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+        return "\n".join(str(row[-1]) for row in cursor.fetchall())
+
+
+def plans():
+    """
+    (name, plan, flagged tables) for every hot query.
+    """
+    route, operator = _sample()
+    if route is None or operator is None:
+        raise ValueError("No routes or operators to explain queries against")
+
+    results = []
+    for query in HOT_QUERIES:
+        plan = explain(query.build(route, operator))
+        flagged = [
+            table for table in full_scans(plan)
+            if table not in query.full_scans_ok
+        ]
+        results.append((query.name, plan, flagged))
+    return results
@@ -0,0 +1,452 @@
+"""
+Route geometry for an interactive network map.
+
+Each route's lines are simplified with Douglas–Peucker at the tolerance
+of every level in LEVELS, and stored as Google encoded polylines in
+RouteGeometry (one row per route and level, with its bounding box). This
+happens when timetables are imported. The lines come from the feed's
+GTFS shapes where there are any, and otherwise from the stop sequences
+of the route's trips, drawn stop to stop.
+
+Requests pick the level for their map zoom:
+
+- in_bbox() returns the whole lines of the routes crossing a box;
+- tile() clips them to a web mercator tile (z/x/y), so a tiled map
+  client fetches only what each tile shows.
+
+Both read a per-process index that files routes into a grid of cells by
+bounding box, so a request only looks at the routes near it. It is
+rebuilt when the "geometry" version counter moves on.
+"""
+
+import math
+from collections import namedtuple
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce, NullIf
+
+from . import versions
+from .models import Route, RouteGeometry, StopTime
+
+VERSION_NAME = "geometry"
+
+# (lowest map zoom, tolerance in metres), least detailed first
+LEVELS = (
+    (0, 250),
+    (12, 50),
+    (15, 8),
+)
+
+PRECISION = 5
+MAX_ZOOM = 20
+
+# Grid cells of the index, in degrees (about 5.5 km north to south)
+CELL_DEGREES = 0.05
+# Above this many cells a box is answered by scanning every route
+MAX_CELLS = 2500
+# Tiles take lines this far past their edges, as a fraction of the
+# tile, so strokes meet across tile boundaries
+TILE_BUFFER = 1 / 16
+
+METRES_PER_DEGREE = 111_320
+
+Geometry = namedtuple("Geometry", "route_id uuid service colour bbox levels")
+
+_local = {"version": None, "index": None}
+
+
+# --------------------
+# Lines
+# --------------------
+
+def simplify(points, tolerance):
+    """
+    Douglas–Peucker: the points of a (lat, lon) line needed to keep it
+    within `tolerance` metres of the original. Iterative, so long shapes
+    cannot run out of stack.
+    """
+    if len(points) < 3:
+        return list(points)
+
+    # Local equirectangular projection, in metres
+    mid_lat = math.radians(sum(lat for lat, _ in points) / len(points))
+    x_scale = METRES_PER_DEGREE * math.cos(mid_lat)
+    xy = [(lon * x_scale, lat * METRES_PER_DEGREE) for lat, lon in points]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    limit = tolerance * tolerance
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (ax, ay), (bx, by) = xy[first], xy[last]
+        dx, dy = bx - ax, by - ay
+        length = dx * dx + dy * dy
+
+        farthest, farthest_distance = None, limit
+        for i in range(first + 1, last):
+            px, py = xy[i]
+            t = 0.0
+            if length:
+                t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length))
+            ex, ey = ax + t * dx - px, ay + t * dy - py
+            distance = ex * ex + ey * ey
+            if distance > farthest_distance:
+                farthest, farthest_distance = i, distance
+
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def encode_polyline(points, precision=PRECISION):
+    """
+    Google encoded polyline of (lat, lon) points.
+    """
+    factor = 10 ** precision
+    output = []
+    previous_lat = previous_lon = 0
+    for lat, lon in points:
+        lat, lon = round(lat * factor), round(lon * factor)
+        for delta in (lat - previous_lat, lon - previous_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                output.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            output.append(chr(value + 63))
+        previous_lat, previous_lon = lat, lon
+    return "".join(output)
+
+
+def decode_polyline(text, precision=PRECISION):
+    factor = 10 ** precision
+    points = []
+    coordinates = [0, 0]
+    index = 0
+    while index < len(text):
+        for axis in (0, 1):
+            shift = result = 0
+            while True:
+                byte = ord(text[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            coordinates[axis] += ~(result >> 1) if result & 1 else result >> 1
+        points.append((coordinates[0] / factor, coordinates[1] / factor))
+    return points
+
+
+def bounding_box(lines):
+    """
+    (min_lat, min_lon, max_lat, max_lon) of (lat, lon) lines.
+    """
+    lats = [lat for line in lines for lat, _ in line]
+    lons = [lon for line in lines for _, lon in line]
+    return min(lats), min(lons), max(lats), max(lons)
+
+
+def _clip_segment(start, end, bbox):
+    # Liang–Barsky, on (lat, lon) points against (min_lat, min_lon,
+    # max_lat, max_lon)
+    (lat0, lon0), (lat1, lon1) = start, end
+    min_lat, min_lon, max_lat, max_lon = bbox
+    d_lat, d_lon = lat1 - lat0, lon1 - lon0
+    t0, t1 = 0.0, 1.0
+    for p, q in (
+        (-d_lon, lon0 - min_lon),
+        (d_lon, max_lon - lon0),
+        (-d_lat, lat0 - min_lat),
+        (d_lat, max_lat - lat0),
+    ):
+        if p == 0:
+            if q < 0:
+                return None
+            continue
+        t = q / p
+        if p < 0:
+            if t > t1:
+                return None
+            t0 = max(t0, t)
+        else:
+            if t < t0:
+                return None
+            t1 = min(t1, t)
+
+    return (
+        start if t0 == 0 else (lat0 + t0 * d_lat, lon0 + t0 * d_lon),
+        end if t1 == 1 else (lat0 + t1 * d_lat, lon0 + t1 * d_lon),
+    )
+
+
+def clip(points, bbox):
+    """
+    The pieces of a (lat, lon) line inside `bbox`.
+    """
+    pieces = []
+    current = []
+    for start, end in zip(points, points[1:]):
+        segment = _clip_segment(start, end, bbox)
+        if segment is None:
+            if current:
+                pieces.append(current)
+                current = []
+        elif current and current[-1] == segment[0]:
+            current.append(segment[1])
+        else:
+            if current:
+                pieces.append(current)
+            current = list(segment)
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+# --------------------
+# Building (on import)
+# --------------------
+
+def lines_from_stops(route_ids):
+    """
+    {route id: [line, ...]}: the distinct stop sequences of each route's
+    trips as (lat, lon) lines, a sequence and its reverse counted once.
+    """
+    rows = (
+        StopTime.objects
+        .filter(
+            trip__route_id__in=route_ids,
+            stop__latitude__isnull=False,
+            stop__longitude__isnull=False,
+        )
+        .order_by("trip__route_id", "trip_id", "sequence")
+        .values_list("trip__route_id", "trip_id", "stop__latitude", "stop__longitude")
+    )
+
+    patterns = {}
+    for (route_id, _), calls in groupby(rows.iterator(chunk_size=5000), key=lambda row: row[:2]):
+        line = tuple((lat, lon) for _, _, lat, lon in calls)
+        seen = patterns.setdefault(route_id, {})
+        if len(line) >= 2 and line[::-1] not in seen:
+            seen[line] = None
+
+    return {
+        route_id: [list(line) for line in seen]
+        for route_id, seen in patterns.items()
+    }
+
+
+def rebuild(route_ids, shapes=None):
+    """
+    Replace the stored geometry of `route_ids` with their `shapes`
+    ({route id: [line, ...]}) where given, their trips' stop sequences
+    otherwise. Returns the number of RouteGeometry rows written.
+    """
+    shapes = shapes or {}
+    route_ids = set(route_ids)
+    lines = lines_from_stops(route_ids - set(shapes))
+    lines.update(
+        (route_id, route_lines)
+        for route_id, route_lines in shapes.items()
+        if route_id in route_ids and route_lines
+    )
+
+    geometries = []
+    for route_id, route_lines in lines.items():
+        min_lat, min_lon, max_lat, max_lon = bounding_box(route_lines)
+        for level, (_, tolerance) in enumerate(LEVELS):
+            simplified = [simplify(line, tolerance) for line in route_lines]
+            geometries.append(
+                RouteGeometry(
+                    route_id=route_id,
+                    level=level,
+                    lines=[encode_polyline(line) for line in simplified],
+                    points=sum(len(line) for line in simplified),
+                    min_lat=min_lat,
+                    min_lon=min_lon,
+                    max_lat=max_lat,
+                    max_lon=max_lon,
+                )
+            )
+
+    RouteGeometry.objects.filter(route_id__in=route_ids).delete()
+    RouteGeometry.objects.bulk_create(geometries, batch_size=1000)
+    invalidate()
+    transaction.on_commit(invalidate)
+    return len(geometries)
+
+
+def invalidate():
+    versions.bump(VERSION_NAME)
+
+
+# --------------------
+# Lookups
+# --------------------
+
+def level_for_zoom(zoom):
+    return max(
+        level for level, (min_zoom, _) in enumerate(LEVELS) if zoom >= min_zoom
+    )
+
+
+def tile_bounds(z, x, y):
+    """
+    (min_lat, min_lon, max_lat, max_lon) of web mercator tile z/x/y.
+    """
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat(y + 1), x / n * 360 - 180, lat(y), (x + 1) / n * 360 - 180
+
+
+def tile_at(lat, lon, z):
+    """
+    (x, y) of the zoom `z` tile holding a point.
+    """
+    n = 2 ** z
+    lat = math.radians(lat)
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _cells(bbox):
+    min_lat, min_lon, max_lat, max_lon = bbox
+    rows = range(math.floor(min_lat / CELL_DEGREES), math.floor(max_lat / CELL_DEGREES) + 1)
+    columns = range(math.floor(min_lon / CELL_DEGREES), math.floor(max_lon / CELL_DEGREES) + 1)
+    if len(rows) * len(columns) > MAX_CELLS:
+        return None
+    return [(row, column) for row in rows for column in columns]
+
+
+def _overlaps(a, b):
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
+
+
+class GeometryIndex:
+    def __init__(self, rows):
+        """
+        `rows`: (route id, uuid, service, colour, level, lines, min_lat,
+        min_lon, max_lat, max_lon) for every stored level.
+        """
+        self.geometries = {}
+        for route_id, uuid, service, colour, level, lines, *bbox in rows:
+            geometry = self.geometries.get(route_id)
+            if geometry is None:
+                geometry = self.geometries[route_id] = Geometry(
+                    route_id, str(uuid), service, colour, tuple(bbox), {}
+                )
+            geometry.levels[level] = lines
+
+        self.cells = {}
+        for geometry in self.geometries.values():
+            for cell in _cells(geometry.bbox) or ():
+                self.cells.setdefault(cell, []).append(geometry.route_id)
+        # Decoded lines by (route id, level), for clipping
+        self._decoded = {}
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def crossing(self, bbox):
+        """
+        Geometries whose bounding box overlaps `bbox`, in route order.
+        """
+        cells = _cells(bbox)
+        if cells is None:
+            candidates = self.geometries
+        else:
+            candidates = {
+                route_id
+                for cell in cells
+                for route_id in self.cells.get(cell, ())
+            }
+        return [
+            self.geometries[route_id]
+            for route_id in sorted(candidates)
+            if _overlaps(self.geometries[route_id].bbox, bbox)
+        ]
+
+    def decoded(self, geometry, level):
+        key = geometry.route_id, level
+        if key not in self._decoded:
+            self._decoded[key] = [decode_polyline(line) for line in geometry.levels.get(level, ())]
+        return self._decoded[key]
+
+
+def get_index():
+    version = versions.get(VERSION_NAME)
+    if _local["version"] != version:
+        rows = (
+            RouteGeometry.objects
+            .filter(route__in=Route.objects.in_service())
+            .order_by("route_id", "level")
+            .values_list(
+                "route_id",
+                "route__uuid",
+                "route__service",
+                Coalesce(NullIf("route__route_hex", Value("")), "route__operator__primary_hex"),
+                "level",
+                "lines",
+                "min_lat",
+                "min_lon",
+                "max_lat",
+                "max_lon",
+            )
+        )
+        _local["index"] = GeometryIndex(rows)
+        _local["version"] = version
+    return _local["index"]
+
+
+def _feature(geometry, lines):
+    return {
+        "uuid": geometry.uuid,
+        "service": geometry.service,
+        "colour": geometry.colour,
+        "lines": lines,
+    }
+
+
+def in_bbox(bbox, zoom):
+    """
+    Routes crossing `bbox` (min_lat, min_lon, max_lat, max_lon), with
+    their whole lines at the level for `zoom`.
+    """
+    level = level_for_zoom(zoom)
+    return [
+        _feature(geometry, geometry.levels.get(level, []))
+        for geometry in get_index().crossing(bbox)
+    ]
+
+
+def tile(z, x, y):
+    """
+    Routes in tile z/x/y, with their lines at the level for `z` clipped
+    to the tile (plus TILE_BUFFER).
+    """
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y)
+    lat_buffer = (max_lat - min_lat) * TILE_BUFFER
+    lon_buffer = (max_lon - min_lon) * TILE_BUFFER
+    bbox = (min_lat - lat_buffer, min_lon - lon_buffer, max_lat + lat_buffer, max_lon + lon_buffer)
+
+    index = get_index()
+    level = level_for_zoom(z)
+    features = []
+    for geometry in index.crossing(bbox):
+        pieces = [
+            piece
+            for line in index.decoded(geometry, level)
+            for piece in clip(line, bbox)
+        ]
+        if pieces:
+            features.append(_feature(geometry, [encode_polyline(piece) for piece in pieces]))
+    return features
@@ -0,0 +1,321 @@
+"""
+Resized WebP/AVIF derivatives of operator logos and map previews.
+
+When an Operator or Map is saved with a new image, the original is
+hashed and resized to the field's BREAKPOINTS in every supported format
+(AVIF needs a Pillow built with it). Resizing runs in a process pool,
+off the request path, after the save commits. Until it finishes, pages
+show the original.
+
+Derivatives are stored by content hash, under
+derivatives/<sha256[:2]>/<sha256>/<width>.<format>, and recorded in
+ImageDerivatives. The row is created when the original is uploaded,
+before anything is rendered, so an upload identical to an earlier one
+reuses the earlier original rather than storing another copy, even while
+the first is still being resized. An image used by fields with different
+breakpoints gets the widths of all of them.
+
+{% picture %} (templatetags/images.py) renders a <picture> with a
+srcset per format. Its lookups come from a per-process index, rebuilt
+when the "images" version counter moves on. The
+generate_image_derivatives command backfills existing media.
+"""
+
+import hashlib
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+
+from . import versions
+from .models import ImageDerivatives, Map, Operator
+
+logger = logging.getLogger(__name__)
+
+VERSION_NAME = "images"
+
+# (model, field) -> widths in pixels. Widths larger than the original
+# are skipped; an original narrower than all of them gets one variant at
+# its own width.
+BREAKPOINTS = {
+    (Operator, "logo_circular"): (64, 128, 256),
+    (Operator, "logo_banner"): (480, 960, 1600),
+    (Map, "preview_image"): (320, 640, 1280),
+}
+
+# Best first: browsers take the first <source> they support
+FORMATS = {
+    "avif": {"format": "AVIF", "quality": 60},
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+}
+
+DEFAULT_WORKERS = 2
+
+_local = {"version": None, "index": None, "executor": None}
+
+
+def supported_formats():
+    return [name for name in FORMATS if features.check(name)]
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def variant_name(sha256, width, image_format):
+    return f"derivatives/{sha256[:2]}/{sha256}/{width}.{image_format}"
+
+
+def target_widths(widths, original_width):
+    return [width for width in widths if width <= original_width] or [original_width]
+
+
+# --------------------
+# Resizing (worker processes)
+# --------------------
+
+def render(data, widths, formats):
+    """
+    Resize image bytes to `widths` in each of `formats`.
+
+    Returns (width, height, [(format, width, bytes), ...]). Needs only
+    Pillow, so it can run in a pool worker.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    targets = target_widths(widths, image.width)
+
+    variants = []
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize(
+            (width, height), Image.Resampling.LANCZOS
+        )
+        for image_format in formats:
+            options = dict(FORMATS[image_format])
+            output = io.BytesIO()
+            resized.save(output, options.pop("format"), **options)
+            variants.append((image_format, width, output.getvalue()))
+
+    return image.width, image.height, variants
+
+
+def pool():
+    """
+    The worker process pool, shared with map rendering (siteui.mapdocs).
+    """
+    if _local["executor"] is None:
+        # Spawned rather than forked: the parent may be running threads
+        # (ASGI, the live status publisher) that a fork would not copy
+        _local["executor"] = ProcessPoolExecutor(
+            max_workers=workers(),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+    return _local["executor"]
+
+
+def workers():
+    return getattr(settings, "SITEUI_IMAGE_WORKERS", DEFAULT_WORKERS)
+
+
+def render_all(jobs):
+    """
+    Yield (key, result) for (key, data, widths) jobs as they finish, in
+    the process pool unless SITEUI_IMAGE_WORKERS is 0.
+    """
+    formats = supported_formats()
+    if not workers():
+        for key, data, widths in jobs:
+            yield key, render(data, widths, formats)
+        return
+
+    futures = {
+        pool().submit(render, data, widths, formats): key
+        for key, data, widths in jobs
+    }
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+
+# --------------------
+# Storing
+# --------------------
+
+def store(sha256, original, result):
+    """
+    Save rendered variants and add them to the record for `sha256`,
+    alongside any made for other widths. `original` is recorded only if
+    the hash has no record yet.
+    """
+    width, height, rendered = result
+    variants = []
+    for image_format, variant_width, data in rendered:
+        name = variant_name(sha256, variant_width, image_format)
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(data))
+        variants.append({"format": image_format, "width": variant_width, "name": name})
+
+    with transaction.atomic():
+        derivatives, _ = (
+            ImageDerivatives.objects
+            .select_for_update()
+            .get_or_create(
+                sha256=sha256,
+                defaults={"original": original, "width": width, "height": height},
+            )
+        )
+        merged = {(v["format"], v["width"]): v for v in derivatives.variants}
+        merged.update({(v["format"], v["width"]): v for v in variants})
+        derivatives.width = width
+        derivatives.height = height
+        derivatives.variants = sorted(merged.values(), key=lambda v: (v["format"], v["width"]))
+        derivatives.save()
+    versions.bump(VERSION_NAME)
+
+
+def has_variants(derivatives, widths):
+    """
+    Whether `derivatives` has every variant `widths` calls for.
+    """
+    if not derivatives.width:
+        return False
+    have = {(v["format"], v["width"]) for v in derivatives.variants}
+    return all(
+        (image_format, width) in have
+        for width in target_widths(widths, derivatives.width)
+        for image_format in supported_formats()
+    )
+
+
+def read(name):
+    with default_storage.open(name, "rb") as file:
+        data = file.read()
+    return hashlib.sha256(data).hexdigest(), data
+
+
+def schedule(name, widths):
+    """
+    Make derivatives of the stored image `name`, in the process pool
+    unless SITEUI_IMAGE_WORKERS is 0. Does nothing if it already has them
+    at `widths`.
+    """
+    derivatives = ImageDerivatives.objects.filter(original=name).first()
+    if derivatives is not None and has_variants(derivatives, widths):
+        return
+
+    sha256, data = read(name)
+    if not workers():
+        try:
+            store(sha256, name, render(data, widths, supported_formats()))
+        except OSError:
+            logger.exception("Could not make derivatives of %s", name)
+        return
+
+    def done(future):
+        # Runs on the pool's management thread
+        try:
+            store(sha256, name, future.result())
+        except Exception:
+            logger.exception("Could not make derivatives of %s", name)
+        finally:
+            close_old_connections()
+
+    pool().submit(render, data, widths, supported_formats()).add_done_callback(done)
+
+
+# --------------------
+# Uploads
+# --------------------
+
+def dedupe_upload(instance, field_name):
+    """
+    Point a new upload at an identical stored original, if there is one,
+    so it is not saved again. Otherwise store it and record its hash
+    straight away, ahead of its derivatives. Call before the instance is
+    saved.
+    """
+    file = getattr(instance, field_name)
+    if not file or file._committed:
+        return
+
+    sha256 = content_hash(file)
+    existing = ImageDerivatives.objects.filter(sha256=sha256).first()
+    if existing is not None and default_storage.exists(existing.original):
+        file.name = existing.original
+        file._committed = True
+        return
+
+    file.save(file.name, file.file, save=False)
+    ImageDerivatives.objects.update_or_create(
+        sha256=sha256,
+        defaults={"original": file.name, "width": 0, "height": 0, "variants": []},
+    )
+
+
+def uploaded(instance, field_name):
+    """
+    Schedule derivatives for `field_name` of a saved instance.
+    """
+    file = getattr(instance, field_name)
+    if file:
+        schedule(file.name, BREAKPOINTS[type(instance), field_name])
+
+
+# --------------------
+# Lookups
+# --------------------
+
+def get_index():
+    """
+    Original storage path -> ImageDerivatives values.
+    """
+    version = versions.get(VERSION_NAME)
+    if _local["version"] != version:
+        _local["index"] = {
+            row["original"]: row
+            for row in ImageDerivatives.objects.values("original", "width", "height", "variants")
+        }
+        _local["version"] = version
+    return _local["index"]
+
+
+def srcsets(name):
+    """
+    [(format, srcset), ...] for the image stored at `name`, best format
+    first; None if it has no derivatives yet.
+    """
+    derivatives = get_index().get(name)
+    if derivatives is None or not derivatives["variants"]:
+        return None
+
+    by_format = {}
+    for variant in derivatives["variants"]:
+        by_format.setdefault(variant["format"], []).append(variant)
+
+    sources = [
+        (
+            image_format,
+            ", ".join(
+                f"{default_storage.url(variant['name'])} {variant['width']}w"
+                for variant in sorted(by_format[image_format], key=lambda v: v["width"])
+            ),
+        )
+        for image_format in FORMATS
+        if image_format in by_format
+    ]
+    return sources
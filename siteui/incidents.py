@@ -0,0 +1,98 @@
+"""
+Cached network incident banner.
+
+The active incidents change a few times a day but are shown on every
+page, so they are cached in two layers:
+
+- the shared cache holds the built banner under a key that includes a
+  version counter, bumped by siteui.signals whenever an incident, its
+  modes or its status type changes;
+- each process keeps the last banner it saw alongside that version, so
+  a steady-state render costs one cache read and no queries.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from . import versions
+from .models import Mode, NetworkIncident
+
+VERSION_NAME = "incidents"
+BANNER_KEY = "siteui:incidents:banner:{version}"
+BANNER_TIMEOUT = 60 * 60 * 24
+
+_local = {"version": None, "banner": None}
+
+
+class IncidentBanner:
+    """
+    Active incidents, newest first, with a per-mode lookup.
+
+    `by_mode` maps each mode slug to the newest incident affecting it;
+    incidents with no modes affect the whole network.
+    """
+
+    def __init__(self, incidents, mode_slugs):
+        self.incidents = incidents
+        self.latest = incidents[0] if incidents else None
+
+        self.by_mode = {}
+        for slug in mode_slugs:
+            for incident in incidents:
+                if not incident.mode_slugs or slug in incident.mode_slugs:
+                    self.by_mode[slug] = incident
+                    break
+
+    def for_mode(self, slug):
+        return self.by_mode.get(slug)
+
+
+def build_banner():
+    incidents = list(
+        NetworkIncident.objects
+        .filter(active=True)
+        .select_related("status_type")
+        .prefetch_related("affects_modes")
+        .order_by("-start_time")
+    )
+    for incident in incidents:
+        incident.mode_slugs = frozenset(
+            mode.slug for mode in incident.affects_modes.all()
+        )
+
+    return IncidentBanner(
+        incidents,
+        Mode.objects.values_list("slug", flat=True),
+    )
+
+
+def current_version():
+    return versions.get(VERSION_NAME)
+
+
+def bump_version():
+    versions.bump(VERSION_NAME)
+
+
+def get_banner():
+    version = current_version()
+    if _local["version"] == version:
+        return _local["banner"]
+
+    key = BANNER_KEY.format(version=version)
+    banner = cache.get(key)
+    if banner is None:
+        banner = build_banner()
+        cache.set(key, banner, timeout=BANNER_TIMEOUT)
+
+    _local["version"] = version
+    _local["banner"] = banner
+    return banner
+
+
+async def aget_banner():
+    """
+    get_banner() for async views, which hand it to the context processor
+    as request.network_banner; a miss queries the database.
+    """
+    return await sync_to_async(get_banner)()
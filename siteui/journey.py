@@ -0,0 +1,413 @@
+"""
+Journey planner: round-based public transit routing (RAPTOR).
+
+The timetable is preprocessed into contiguous arrays:
+
+- trips with an identical stop sequence form a *pattern*; each pattern's
+  trips are sorted by departure and their times stored row by row in
+  flat arrival/departure arrays;
+- each stop lists the (pattern, position) pairs serving it;
+- short footpaths between nearby stops are precomputed from coordinates.
+
+Round k of a query finds the earliest arrival at every stop using at
+most k vehicles, scanning only patterns that serve a stop improved in
+the previous round. Patterns are assumed FIFO (trips do not overtake),
+which lets boarding use a binary search down a time column.
+"""
+
+import math
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from . import timetable_index, versions
+from .models import ServiceCalendar, Stop, StopTime, Trip
+
+INFINITY = 2 ** 31 - 1
+
+MAX_ROUNDS = 5
+WALK_RADIUS_M = 400
+WALK_SPEED_MS = 1.2
+
+Leg = namedtuple(
+    "Leg",
+    "kind from_stop to_stop depart arrive route_id trip_id",
+)
+
+_local = {"version": None, "planner": None}
+
+
+def _distance_m(lat1, lon1, lat2, lon2):
+    # Equirectangular approximation; accurate to well under 1% at 400 m
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371000 * math.hypot(x, y)
+
+
+class JourneyPlanner:
+    def __init__(self, stop_times, trips, calendars, stops):
+        """
+        `stop_times`: (trip_id, sequence, stop_id, arrival, departure) rows
+        sorted by trip then sequence; `trips`: (pk, route_id, calendar_id);
+        `calendars`: (pk, days, start, end); `stops`: (pk, code, name,
+        latitude, longitude).
+        """
+        self.calendars = timetable_index.CalendarTable(calendars)
+        trip_info = {
+            pk: (route_id, self.calendars.positions[calendar_id])
+            for pk, route_id, calendar_id in trips
+        }
+
+        # Stops, addressed by position
+        self.stop_ids = array("q")
+        self.stop_codes = []
+        self.stop_names = []
+        self.stop_pos = {}
+        coordinates = []
+        for pk, code, name, latitude, longitude in stops:
+            self.stop_pos[pk] = len(self.stop_ids)
+            self.stop_ids.append(pk)
+            self.stop_codes.append(code)
+            self.stop_names.append(name)
+            coordinates.append((latitude, longitude))
+        self.code_pos = {code: pos for pos, code in enumerate(self.stop_codes)}
+        self.folded_names = [name.casefold() for name in self.stop_names]
+
+        # Group trips into patterns by their stop sequence
+        by_pattern = {}
+        current, calls = None, []
+
+        def close_trip():
+            if current is not None and len(calls) > 1:
+                key = tuple(self.stop_pos[stop_id] for stop_id, _, _ in calls)
+                by_pattern.setdefault(key, []).append((
+                    current,
+                    [arrival for _, arrival, _ in calls],
+                    [departure for _, _, departure in calls],
+                ))
+
+        for trip_id, _, stop_id, arrival, departure in stop_times:
+            if trip_id != current:
+                close_trip()
+                current, calls = trip_id, []
+            calls.append((stop_id, arrival, departure))
+        close_trip()
+
+        # Flatten patterns into contiguous arrays
+        self.pattern_stop_offset = array("l", [0])
+        self.pattern_stops = array("l")
+        self.pattern_trip_offset = array("l", [0])
+        self.pattern_time_offset = array("l", [0])
+        self.pattern_route = array("q")
+        self.trip_ids = array("q")
+        self.trip_calendars = array("l")
+        self.arrivals = array("l")
+        self.departures = array("l")
+        self.stop_patterns = [[] for _ in self.stop_ids]
+
+        for key, pattern_trips in by_pattern.items():
+            pattern = len(self.pattern_route)
+            pattern_trips.sort(key=lambda trip: trip[2][0])
+
+            for position, stop in enumerate(key):
+                self.stop_patterns[stop].append((pattern, position))
+            self.pattern_stops.extend(key)
+            self.pattern_stop_offset.append(len(self.pattern_stops))
+
+            self.pattern_route.append(trip_info[pattern_trips[0][0]][0])
+            for trip_id, arrivals, departures in pattern_trips:
+                self.trip_ids.append(trip_id)
+                self.trip_calendars.append(trip_info[trip_id][1])
+                self.arrivals.extend(arrivals)
+                self.departures.extend(departures)
+            self.pattern_trip_offset.append(len(self.trip_ids))
+            self.pattern_time_offset.append(len(self.departures))
+
+        # Footpaths between stops within walking distance, via a grid
+        self.transfer_offset = array("l", [0])
+        self.transfer_to = array("l")
+        self.transfer_secs = array("l")
+
+        cell = WALK_RADIUS_M / 111000
+        grid = {}
+        for pos, (latitude, longitude) in enumerate(coordinates):
+            if latitude is not None and longitude is not None:
+                grid.setdefault(
+                    (int(latitude // cell), int(longitude // cell)), []
+                ).append(pos)
+
+        for pos, (latitude, longitude) in enumerate(coordinates):
+            if latitude is not None and longitude is not None:
+                row, col = int(latitude // cell), int(longitude // cell)
+                for dr in (-1, 0, 1):
+                    for dc in (-1, 0, 1):
+                        for other in grid.get((row + dr, col + dc), ()):
+                            if other == pos:
+                                continue
+                            distance = _distance_m(
+                                latitude, longitude, *coordinates[other]
+                            )
+                            if distance <= WALK_RADIUS_M:
+                                self.transfer_to.append(other)
+                                self.transfer_secs.append(
+                                    int(distance / WALK_SPEED_MS) + 60
+                                )
+            self.transfer_offset.append(len(self.transfer_to))
+
+        self._running = {}
+
+    @classmethod
+    def from_db(cls):
+        return cls(
+            StopTime.objects
+            .order_by("trip_id", "sequence")
+            .values_list("trip_id", "sequence", "stop_id", "arrival_time", "departure_time")
+            .iterator(chunk_size=10000),
+            Trip.objects.values_list("pk", "route_id", "calendar_id"),
+            ServiceCalendar.objects.values_list("pk", "days", "start_date", "end_date"),
+            Stop.objects.values_list("pk", "code", "name", "latitude", "longitude"),
+        )
+
+    def running_on(self, day):
+        """
+        Bytearray flagging, per trip position, whether it runs on `day`.
+        """
+        running = self._running.get(day)
+        if running is None:
+            running = bytearray(
+                self.calendars.runs_on(calendar, day)
+                for calendar in self.trip_calendars
+            )
+            if len(self._running) > 7:
+                self._running.clear()
+            self._running[day] = running
+        return running
+
+    def _earliest_trip(self, pattern, position, after, running):
+        """
+        First trip of `pattern` leaving stop `position` at or after `after`
+        that runs on the service day, as an index into the pattern's trips.
+        """
+        first = self.pattern_trip_offset[pattern]
+        count = self.pattern_trip_offset[pattern + 1] - first
+        width = self.pattern_stop_offset[pattern + 1] - self.pattern_stop_offset[pattern]
+        base = self.pattern_time_offset[pattern] + position
+        departures = self.departures
+
+        lo = bisect_left(
+            range(count), after, key=lambda trip: departures[base + trip * width]
+        )
+        for trip in range(lo, count):
+            if running[first + trip]:
+                return trip
+        return None
+
+    def plan(self, origin, destination, depart):
+        """
+        Earliest-arrival journey between stop codes `origin` and
+        `destination` leaving at or after the aware datetime `depart`.
+
+        Returns a list of Legs, or None if no journey is found on the
+        service day. Trips past midnight from the previous day are not
+        considered.
+        """
+        source = self.code_pos.get(origin)
+        target = self.code_pos.get(destination)
+        if source is None or target is None:
+            return None
+
+        depart = timezone.localtime(depart)
+        day = depart.date()
+        midnight = timezone.make_aware(datetime.combine(day, time()), depart.tzinfo)
+        start = depart.hour * 3600 + depart.minute * 60 + depart.second
+        running = self.running_on(day)
+
+        stops = len(self.stop_ids)
+        best = [INFINITY] * stops
+        labels = [[INFINITY] * stops]
+        parents = [{}]
+
+        labels[0][source] = best[source] = start
+        parents[0][source] = None
+        marked = {source}
+        self._walk(marked, labels[0], best, parents[0])
+
+        for _ in range(MAX_ROUNDS):
+            previous = labels[-1]
+            current = list(previous)
+            parent = {}
+
+            # Earliest marked position on each pattern
+            queue = {}
+            for stop in marked:
+                for pattern, position in self.stop_patterns[stop]:
+                    if position < queue.get(pattern, INFINITY):
+                        queue[pattern] = position
+
+            marked = set()
+            for pattern, first_position in queue.items():
+                stop_base = self.pattern_stop_offset[pattern]
+                width = self.pattern_stop_offset[pattern + 1] - stop_base
+                time_base = self.pattern_time_offset[pattern]
+                trip = None
+                board = None
+
+                for position in range(first_position, width):
+                    stop = self.pattern_stops[stop_base + position]
+
+                    if trip is not None:
+                        arrival = self.arrivals[time_base + trip * width + position]
+                        if arrival < min(best[stop], best[target]):
+                            current[stop] = best[stop] = arrival
+                            parent[stop] = ("ride", pattern, trip, board, position)
+                            marked.add(stop)
+
+                    if previous[stop] < INFINITY and (
+                        trip is None
+                        or previous[stop] <= self.departures[time_base + trip * width + position]
+                    ):
+                        earlier = self._earliest_trip(pattern, position, previous[stop], running)
+                        if earlier is not None and earlier != trip:
+                            trip, board = earlier, position
+
+            if not marked:
+                break
+
+            self._walk(marked, current, best, parent)
+            labels.append(current)
+            parents.append(parent)
+
+        if best[target] == INFINITY:
+            return None
+
+        rounds = min(
+            (k for k in range(len(labels)) if labels[k][target] == best[target])
+        )
+        return self._legs(target, rounds, parents, midnight + timedelta(seconds=start))
+
+    def _walk(self, marked, labels, best, parent):
+        for stop in list(marked):
+            for edge in range(self.transfer_offset[stop], self.transfer_offset[stop + 1]):
+                other = self.transfer_to[edge]
+                arrival = labels[stop] + self.transfer_secs[edge]
+                if arrival < best[other]:
+                    labels[other] = best[other] = arrival
+                    parent[other] = ("walk", stop, self.transfer_secs[edge])
+                    marked.add(other)
+
+    def _legs(self, stop, rounds, parents, depart):
+        midnight = depart.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        def at(seconds):
+            return midnight + timedelta(seconds=seconds)
+
+        legs = []
+        k = rounds
+        while True:
+            label = parents[k].get(stop)
+            if label is None:
+                if k == 0:
+                    break
+                k -= 1
+                continue
+
+            if label[0] == "walk":
+                _, origin, seconds = label
+                legs.append(("walk", origin, stop, seconds))
+                stop = origin
+                continue
+
+            _, pattern, trip, board, alight = label
+            stop_base = self.pattern_stop_offset[pattern]
+            width = self.pattern_stop_offset[pattern + 1] - stop_base
+            row = self.pattern_time_offset[pattern] + trip * width
+            origin = self.pattern_stops[stop_base + board]
+            legs.append(Leg(
+                "ride",
+                self.stop_codes[origin],
+                self.stop_codes[stop],
+                at(self.departures[row + board]),
+                at(self.arrivals[row + alight]),
+                self.pattern_route[pattern],
+                self.trip_ids[self.pattern_trip_offset[pattern] + trip],
+            ))
+            stop = origin
+            k -= 1
+
+        legs.reverse()
+
+        # Walks are timed from the arrival of the leg before them
+        journey = []
+        clock = depart
+        for leg in legs:
+            if leg[0] == "walk":
+                _, origin, destination, seconds = leg
+                leg = Leg(
+                    "walk",
+                    self.stop_codes[origin],
+                    self.stop_codes[destination],
+                    clock,
+                    clock + timedelta(seconds=seconds),
+                    None,
+                    None,
+                )
+            journey.append(leg)
+            clock = leg.arrive
+        return journey
+
+    def stop_name(self, code):
+        pos = self.code_pos.get(code)
+        return self.stop_names[pos] if pos is not None else code
+
+    def stop_code(self, value):
+        """
+        The code of the stop `value` names: a code, or a stop's full name
+        in any case (the first stop of that name).
+        """
+        if value in self.code_pos:
+            return value
+        folded = value.casefold()
+        for pos, name in enumerate(self.folded_names):
+            if name == folded:
+                return self.stop_codes[pos]
+        return value
+
+    def find_stops(self, query, limit=10):
+        """
+        (code, name) of up to `limit` stops for a search box: the stop
+        with code `query`, then names starting with it, then names
+        containing it.
+        """
+        folded = query.strip().casefold()
+        if not folded:
+            return []
+
+        found = []
+        if query.strip() in self.code_pos:
+            found.append(self.code_pos[query.strip()])
+        starting = []
+        containing = []
+        for pos, name in enumerate(self.folded_names):
+            if name.startswith(folded):
+                starting.append(pos)
+            elif folded in name:
+                containing.append(pos)
+            if len(starting) >= limit:
+                break
+        for pos in (*starting, *containing):
+            if len(found) >= limit:
+                break
+            if pos not in found:
+                found.append(pos)
+        return [(self.stop_codes[pos], self.stop_names[pos]) for pos in found]
+
+
+def get_planner():
+    version = versions.get(timetable_index.VERSION_NAME)
+    if _local["version"] != version:
+        _local["planner"] = JourneyPlanner.from_db()
+        _local["version"] = version
+    return _local["planner"]
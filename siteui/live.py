@@ -0,0 +1,225 @@
+"""
+Live status push over Server-Sent Events.
+
+One Publisher per process watches the status snapshot and the incident
+banner and fans changes out to every connected /status/stream/ client:
+
+- it wakes when siteui.signals pokes it after a RouteStatus or
+  NetworkIncident change, and otherwise once a second, when it checks
+  the version counters (a cache read) so status windows opening, and
+  changes made by other processes, are picked up too. The counters are
+  only shared with other processes with a shared TFP_CACHE_URL
+  (versions.shared()); without one it reads the snapshot and banner
+  every second instead;
+- on a change it reads the snapshot once, diffs it against the previous
+  one and encodes each delta once, whatever the number of subscribers;
+- every subscriber has a bounded queue. A client too slow to drain it
+  has its backlog dropped and its stream ended with a single "resync"
+  event, so one stalled screen never holds up the rest.
+
+Events carry ids, "<epoch>-<n>" where the epoch is random per process
+run, and a recent history is kept so a client reconnecting with
+Last-Event-ID gets what it missed. An id too old for the history, or
+from another epoch (another worker, or before a restart), gets "resync":
+what it missed is unknown.
+"""
+
+import asyncio
+import json
+import secrets
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import incidents, pagecache, status_engine, versions
+from .models import NetworkStatusSnapshot
+
+QUEUE_SIZE = 64
+HISTORY_SIZE = 256
+POLL_INTERVAL = 1.0
+KEEPALIVE_INTERVAL = 15.0
+RETRY_MS = 5000
+
+RESYNC = b"event: resync\ndata: {}\n\n"
+KEEPALIVE = b": keepalive\n\n"
+
+ROUTE_FIELDS = {
+    "route": "route_uuid",
+    "service": "service",
+    "mode": "mode_name",
+    "mode_slug": "mode_slug",
+    "operator": "operator_name",
+    "colour": "colour_hex",
+    "status": "status_name",
+    "status_colour": "status_colour_hex",
+    "severity": "severity",
+    "summary": "summary",
+}
+
+
+def format_event(event_id, name, data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {name}\ndata: {payload}\n\n".encode()
+
+
+class Subscription:
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.stale = False
+
+    def offer(self, message):
+        if self.stale:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too far behind: drop the backlog and end with a resync, the
+            # client reloads instead of catching up
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            self.stale = True
+
+    async def next_message(self):
+        try:
+            return await asyncio.wait_for(self.queue.get(), KEEPALIVE_INTERVAL)
+        except asyncio.TimeoutError:
+            return KEEPALIVE
+
+
+class Publisher:
+    def __init__(self):
+        self.subscribers = set()
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.epoch = secrets.token_hex(4)
+        self.last_id = 0
+
+        # Last state seen: route uuid -> payload, banner payload, versions
+        self.routes = None
+        self.banner = None
+        self.versions = None
+
+        self.loop = None
+        self.task = None
+        self.wakeup = None
+
+    # Subscribers (event loop only)
+
+    def _seen(self, last_event_id):
+        """
+        The event number a Last-Event-ID header refers to, or None if it
+        is not one of this publisher's.
+        """
+        epoch, _, number = last_event_id.partition("-")
+        if epoch != self.epoch or not number.isdigit() or int(number) > self.last_id:
+            return None
+        return int(number)
+
+    def subscribe(self, last_event_id=None):
+        self._ensure_running()
+        subscription = Subscription()
+        self.subscribers.add(subscription)
+
+        if last_event_id is None:
+            return subscription
+        seen = self._seen(last_event_id)
+        if seen is not None and self.history and self.history[0][0] <= seen + 1:
+            for event_id, message in self.history:
+                if event_id > seen:
+                    subscription.offer(message)
+        elif seen != self.last_id:
+            subscription.offer(RESYNC)
+            subscription.stale = True
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    def broadcast(self, name, data):
+        self.last_id += 1
+        message = format_event(f"{self.epoch}-{self.last_id}", name, data)
+        self.history.append((self.last_id, message))
+        for subscription in self.subscribers:
+            subscription.offer(message)
+
+    # Wake-ups (any thread)
+
+    def poke(self):
+        loop, wakeup = self.loop, self.wakeup
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    # Watching
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self.task is not None and not self.task.done() and self.loop is loop:
+            return
+        if self.loop is not loop:
+            self.subscribers = set()
+        self.loop = loop
+        self.wakeup = asyncio.Event()
+        self.task = loop.create_task(self.run())
+
+    async def run(self):
+        # Stops once the last subscriber leaves; the next one restarts it
+        # and changes made meanwhile are diffed against the last state.
+        while self.subscribers:
+            await self.check()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    def _read(self):
+        status_engine.refresh_if_due()
+
+        current = versions.get_many([
+            pagecache.version_name(NetworkStatusSnapshot),
+            incidents.VERSION_NAME,
+        ])
+        shared = versions.shared()
+        if shared and current == self.versions:
+            return None
+
+        rows = NetworkStatusSnapshot.objects.values(*ROUTE_FIELDS.values())
+        routes = {
+            str(row["route_uuid"]): {
+                name: row[field] for name, field in ROUTE_FIELDS.items()
+            }
+            for row in rows
+        }
+
+        # The per-process banner follows the counters too
+        latest = (incidents.get_banner() if shared else incidents.build_banner()).latest
+        banner = latest and {
+            "title": latest.title,
+            "description": latest.description,
+            "status": latest.status_type.name,
+            "colour": latest.status_type.colour_hex,
+        }
+        return current, routes, banner
+
+    async def check(self):
+        state = await sync_to_async(self._read)()
+        if state is None:
+            return
+        current, routes, banner = state
+
+        if self.routes is not None:
+            changed = [
+                routes.get(uuid, {"route": uuid, "status": None})
+                for uuid in sorted(self.routes.keys() | routes.keys())
+                if self.routes.get(uuid) != routes.get(uuid)
+            ]
+            if changed:
+                self.broadcast("status", {"routes": changed})
+            if banner != self.banner:
+                self.broadcast("incident", {"latest": banner})
+
+        self.versions, self.routes, self.banner = current, routes, banner
+
+
+publisher = Publisher()
@@ -0,0 +1,103 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from siteui import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Run siteui benchmarks against a throwaway test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "suites",
+            nargs="*",
+            help=f"Suites to run (default: all of {', '.join(benchmarks.SUITES)})",
+        )
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=1.0,
+            help="Multiplier for the size of the seeded data (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=200,
+            help="Timed iterations per measurement (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write results as JSON to this file",
+        )
+        parser.add_argument(
+            "--compare",
+            help="Earlier --output file to report changes against",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.1,
+            help="Smallest relative change --compare reports (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        names = options["suites"] or list(benchmarks.SUITES)
+        unknown = set(names) - set(benchmarks.SUITES)
+        if unknown:
+            raise CommandError(f"Unknown suite(s): {', '.join(sorted(unknown))}")
+
+        results = {}
+        for name in names:
+            with benchmarks.test_database():
+                results[name] = benchmarks.SUITES[name](
+                    scale=options["scale"],
+                    repeat=options["repeat"],
+                )
+            self.stdout.write(f"{name}: {json.dumps(results[name], indent=2)}")
+
+        results["meta"] = {
+            "commit": self.commit(),
+            "scale": options["scale"],
+            "repeat": options["repeat"],
+            "python": platform.python_version(),
+            "django": django.get_version(),
+        }
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options["compare"]:
+            with open(options["compare"]) as previous:
+                old = json.load(previous)
+            changes = benchmarks.compare(
+                {k: v for k, v in old.items() if k != "meta"},
+                {k: v for k, v in results.items() if k != "meta"},
+                threshold=options["threshold"],
+            )
+            self.stdout.write(
+                f"Against {options['compare']} ({old.get('meta', {}).get('commit', 'unknown')}):"
+            )
+            for path, before, after in changes:
+                change = f"{(after - before) / before:+.0%}" if before else "new"
+                self.stdout.write(f"  {path}: {before} -> {after} ({change})")
+            if not changes:
+                self.stdout.write("  no changes above the threshold")
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from siteui import geometry
+from siteui.models import Route
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild route geometry from the stop sequences of loaded trips "
+        "(import_timetables does this for the routes it loads, using GTFS "
+        "shapes where the feed has them)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--route",
+            type=int,
+            action="append",
+            dest="bustimes_ids",
+            help="Bustimes ID of a route to rebuild (repeatable; default: all)",
+        )
+
+    def handle(self, *args, **options):
+        routes = Route.objects.filter(trips__isnull=False).distinct()
+        if options["bustimes_ids"]:
+            routes = routes.filter(bustimes_id__in=options["bustimes_ids"])
+
+        with transaction.atomic():
+            written = geometry.rebuild(routes.values_list("pk", flat=True))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{written // len(geometry.LEVELS)} route(s), {written} geometries written"
+        ))
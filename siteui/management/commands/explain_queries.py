@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from siteui import benchmarks, explain
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot siteui querysets and flag full table scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=float,
+            help=(
+                "Seed a throwaway test database at this benchmark scale and "
+                "explain against it (default: the configured database)"
+            ),
+        )
+        parser.add_argument(
+            "--verbose",
+            action="store_true",
+            help="Print every plan, not only the flagged ones",
+        )
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="Exit non-zero if any query is flagged",
+        )
+
+    def handle(self, *args, **options):
+        if options["scale"] is None:
+            flagged = self.report(options["verbose"])
+        else:
+            with benchmarks.test_database():
+                benchmarks.seed_scale(options["scale"])
+                with connection.cursor() as cursor:
+                    # Fresh planner statistics, as a long-running database has
+                    cursor.execute("ANALYZE")
+                flagged = self.report(options["verbose"])
+
+        if flagged and options["strict"]:
+            raise CommandError(f"{flagged} query(s) use full table scans")
+
+    def report(self, verbose):
+        try:
+            results = explain.plans()
+        except ValueError as e:
+            raise CommandError(e)
+
+        flagged = 0
+        for name, plan, tables in results:
+            if tables:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(
+                    f"{name}: full scan of {', '.join(tables)}"
+                ))
+            else:
+                self.stdout.write(f"{name}: ok")
+            if tables or verbose:
+                self.stdout.write("    " + plan.replace("\n", "\n    "))
+        return flagged
@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand
+
+from siteui import images, pagecache
+from siteui.models import ImageDerivatives
+
+
+class Command(BaseCommand):
+    help = (
+        "Make WebP/AVIF derivatives of existing operator logos and map "
+        "previews, pointing duplicate uploads at one copy"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Remake derivatives that already exist",
+        )
+
+    def handle(self, *args, **options):
+        # Content hash -> the original to keep: one derivatives were
+        # already made from, else the first seen
+        originals = dict(ImageDerivatives.objects.values_list("sha256", "original"))
+        # Content hash -> widths wanted by the fields using it
+        wanted = {}
+        # Stored name -> content hash, bytes
+        hashes = {}
+        data = {}
+        repointed = set()
+        duplicates = set()
+
+        for (model, field_name), widths in images.BREAKPOINTS.items():
+            rows = (
+                model.objects
+                .exclude(**{field_name: ""})
+                .values_list("pk", field_name)
+            )
+            for pk, name in rows:
+                if name not in hashes:
+                    try:
+                        hashes[name], data[name] = images.read(name)
+                    except FileNotFoundError:
+                        self.stderr.write(f"Missing: {name}")
+                        continue
+                sha256 = hashes[name]
+                canonical = originals.setdefault(sha256, name)
+                wanted.setdefault(sha256, set()).update(widths)
+
+                if name != canonical:
+                    model.objects.filter(pk=pk).update(**{field_name: canonical})
+                    repointed.add(model)
+                    duplicates.add(name)
+
+        for model in repointed:
+            pagecache.invalidate(model)
+        for name in sorted(duplicates):
+            self.stdout.write(f"Duplicate of {originals[hashes[name]]}, no longer used: {name}")
+
+        done = set()
+        if not options["force"]:
+            done = {
+                derivatives.sha256
+                for derivatives in ImageDerivatives.objects.filter(sha256__in=wanted)
+                if images.has_variants(derivatives, wanted[derivatives.sha256])
+            }
+
+        names = {sha256: name for name, sha256 in hashes.items()}
+        jobs = [
+            (sha256, data[names[sha256]], sorted(widths))
+            for sha256, widths in wanted.items()
+            if sha256 not in done
+        ]
+        for sha256, result in images.render_all(jobs):
+            images.store(sha256, originals[sha256], result)
+            self.stdout.write(f"{originals[sha256]}: {len(result[2])} variants")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(jobs)} image(s) processed, {len(duplicates)} duplicate(s) repointed"
+        ))
@@ -1,12 +1,11 @@
-import requests
+import time
 
-from django.core.management.base import BaseCommand
-from django.utils.text import slugify
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
 
-from siteui.models import Operator, Route, Mode
-
-
-BUSTIMES_URL = "https://bustimes.org/api/services/"
+from siteui import bustimes
+from siteui.models import BustimesSyncState, Operator, Mode
 
 
 class Command(BaseCommand):
@@ -16,75 +15,147 @@ class Command(BaseCommand):
         parser.add_argument(
             "--operator-code",
             required=True,
-            help="Bustimes operator code used by the API (e.g. FHAM)",
+            action="append",
+            help="Bustimes operator code used by the API (e.g. FHAM). "
+                 "Repeat for several operators.",
         )
         parser.add_argument(
             "--operator-slug",
             required=True,
-            help="Bustimes operator slug stored in Operator.bustimes_slug (e.g. fham)",
+            action="append",
+            help="Bustimes operator slug stored in Operator.bustimes_slug (e.g. fham). "
+                 "Repeat once per --operator-code, in the same order.",
+        )
+        parser.add_argument(
+            "--base-url",
+            default=bustimes.BUSTIMES_URL,
+            help="Services API endpoint (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Concurrent API requests (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--retire-missing",
+            action="store_true",
+            help="Mark routes no longer listed upstream as retired",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Ignore stored sync state and re-check every service",
+        )
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=bustimes.PAGE_SIZE,
+            help="Services requested per API page (default: %(default)s)",
         )
 
     def handle(self, *args, **options):
-        operator_code = options["operator_code"]
-        operator_slug = options["operator_slug"]
+        codes = options["operator_code"]
+        slugs = options["operator_slug"]
+
+        if len(codes) != len(slugs):
+            raise CommandError(
+                "Pass one --operator-slug for every --operator-code"
+            )
 
-        operator = Operator.objects.filter(bustimes_slug=operator_slug).first()
-        if not operator:
+        operators = Operator.objects.in_bulk(slugs, field_name="bustimes_slug")
+        missing = [slug for slug in slugs if slug not in operators]
+        if missing:
             self.stderr.write(
                 self.style.ERROR(
-                    f"Operator with bustimes_slug='{operator_slug}' not found"
+                    "Operator with bustimes_slug="
+                    + ", ".join(f"'{slug}'" for slug in missing)
+                    + " not found"
                 )
             )
             return
 
-        response = requests.get(
-            BUSTIMES_URL,
-            params={"operator": operator_code},
-            timeout=20,
-        )
-        response.raise_for_status()
-
-        results = response.json().get("results", [])
-        if not results:
-            self.stderr.write(
-                self.style.WARNING("Bustimes API returned no services")
+        states = {
+            state.operator_id: state
+            for state in BustimesSyncState.objects.filter(
+                operator__in=operators.values()
             )
-            return
+        }
+        if options["full"]:
+            states = {}
+
+        validators = {}
+        for code, slug in zip(codes, slugs):
+            state = states.get(operators[slug].pk)
+            if state:
+                validators[code] = (state.etag, state.last_modified)
+
+        started = time.perf_counter()
+        feeds = bustimes.fetch_services(
+            codes,
+            base_url=options["base_url"],
+            workers=options["workers"],
+            page_size=options["page_size"],
+            validators=validators,
+        )
+        fetched = time.perf_counter()
 
         # Resolve / create bus mode once
-        bus_mode, _ = Mode.objects.get_or_create(name="Bus")
-
-        created = 0
-        updated = 0
-
-        for item in results:
-            # Split description safely
-            parts = [p.strip() for p in item["description"].split(" - ")]
-
-            origin = parts[0]
-            destination = parts[-1]
-            via = " - ".join(parts[1:-1]) if len(parts) > 2 else ""
-
-            route, was_created = Route.objects.update_or_create(
-                bustimes_id=item["id"],
-                defaults={
-                    "service": item["line_name"],
-                    "origin": origin,
-                    "destination": destination,
-                    "via": via,
-                    "operator": operator,
-                    "mode": bus_mode,
-                },
-            )
+        bus_mode, _ = Mode.objects.get_or_create(
+            name="Bus",
+            defaults={"slug": "bus"},
+        )
 
-            if was_created:
-                created += 1
-            else:
-                updated += 1
+        with transaction.atomic():
+            for code, slug in zip(codes, slugs):
+                operator = operators[slug]
+                feed = feeds[code]
+                state = states.get(operator.pk)
+
+                if feed.not_modified:
+                    self.stdout.write(
+                        f"{operator.operator_name}: not modified since last sync"
+                    )
+                    continue
+
+                if not feed.services:
+                    self.stderr.write(
+                        self.style.WARNING(
+                            f"Bustimes API returned no services for {code}"
+                        )
+                    )
+                    continue
+
+                result = bustimes.sync_routes(
+                    operator,
+                    bus_mode,
+                    feed.services,
+                    known_hashes=state.service_hashes if state else None,
+                    retire_missing=options["retire_missing"],
+                )
+
+                BustimesSyncState.objects.update_or_create(
+                    operator=operator,
+                    defaults={
+                        "etag": feed.etag,
+                        "last_modified": feed.last_modified,
+                        "service_hashes": result.hashes,
+                        "synced_at": timezone.now(),
+                    },
+                )
+
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Import complete for {operator.operator_name}: "
+                        f"{result.created} created, {result.updated} updated, "
+                        f"{result.unchanged} unchanged, "
+                        f"{result.skipped} skipped, {result.retired} retired"
+                    )
+                )
+        written = time.perf_counter()
 
         self.stdout.write(
-            self.style.SUCCESS(
-                f"Import complete for {operator.operator_name}: "
-                f"{created} created, {updated} updated"
-            )
+            f"Fetched {sum(len(feed.services or ()) for feed in feeds.values())} "
+            f"services in {fetched - started:.2f}s, "
+            f"wrote in {written - fetched:.2f}s"
         )
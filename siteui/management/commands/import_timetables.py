@@ -0,0 +1,63 @@
+import resource
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from siteui import geometry, timetable_index, timetables
+
+
+class Command(BaseCommand):
+    help = "Load stops and timetables from a GTFS zip or TransXChange file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="GTFS .zip or TransXChange .xml file")
+        parser.add_argument(
+            "--format",
+            choices=("gtfs", "txc"),
+            help="Input format (default: guessed from the file extension)",
+        )
+        parser.add_argument(
+            "--bustimes-id",
+            type=int,
+            help="Bustimes service ID of the route a TransXChange file describes",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=timetables.CHUNK_SIZE,
+            help="Rows written per INSERT; bounds memory use (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("gtfs" if path.endswith(".zip") else "txc")
+
+        if fmt == "txc" and options["bustimes_id"] is None:
+            raise CommandError("--bustimes-id is required for TransXChange files")
+
+        loader = timetables.TimetableLoader(chunk_size=options["chunk_size"])
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            if fmt == "gtfs":
+                timetables.load_gtfs(path, loader)
+            else:
+                timetables.load_transxchange(path, loader, options["bustimes_id"])
+            geometries = geometry.rebuild(loader.route_ids, loader.shapes)
+
+        timetable_index.invalidate()
+
+        stats = loader.stats
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Loaded {stats.stops} stops, {stats.calendars} calendars, "
+                f"{stats.trips} trips and {stats.stop_times} stop times "
+                f"({stats.skipped_trips} trips and {stats.skipped_stop_times} untimed "
+                f"stop times skipped) and {geometries} route "
+                f"geometries in "
+                f"{time.perf_counter() - started:.1f}s, peak RSS {peak_mb:.0f} MB"
+            )
+        )
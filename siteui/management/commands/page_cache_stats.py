@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from siteui import pagecache, views  # noqa: F401 (registers cached pages)
+
+
+class Command(BaseCommand):
+    help = "Show page and fragment cache hit/miss counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the counters as JSON for monitoring",
+        )
+
+    def handle(self, *args, **options):
+        stats = pagecache.stats()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        for name, counts in stats.items():
+            lookups = counts["hits"] + counts["misses"]
+            ratio = counts["hits"] / lookups if lookups else 0
+            self.stdout.write(
+                f"{name}: {counts['hits']} hits, {counts['misses']} misses "
+                f"({ratio:.0%}) depends on {', '.join(counts['depends_on'])}"
+            )
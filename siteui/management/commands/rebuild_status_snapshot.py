@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from siteui import snapshot
+from siteui.models import NetworkStatusSnapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed network status snapshot from route statuses"
+
+    def handle(self, *args, **options):
+        snapshot.rebuild_all()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Snapshot rebuilt: {NetworkStatusSnapshot.objects.count()} "
+                f"disrupted routes"
+            )
+        )
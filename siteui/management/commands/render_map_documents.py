@@ -0,0 +1,48 @@
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from siteui import images, mapdocs
+from siteui.models import Map
+
+
+class Command(BaseCommand):
+    help = "Render map documents to previews and zoom tiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Record renderings again for maps that already have them",
+        )
+
+    def handle(self, *args, **options):
+        maps = Map.objects.exclude(document="")
+        if not options["force"]:
+            maps = maps.filter(document_sha256="")
+        maps = list(maps)
+
+        if images.workers():
+            futures = {
+                images.pool().submit(mapdocs.render, map_obj.document.name): map_obj
+                for map_obj in maps
+            }
+            results = ((futures[future], future) for future in as_completed(futures))
+        else:
+            results = ((map_obj, None) for map_obj in maps)
+
+        failed = 0
+        for map_obj, future in results:
+            name = map_obj.document.name
+            try:
+                result = future.result() if future else mapdocs.render(name)
+            except (OSError, RuntimeError) as e:
+                self.stderr.write(f"{name}: {e}")
+                failed += 1
+                continue
+            mapdocs.rendered(map_obj, name, result)
+            self.stdout.write(f"{name}: {result[1]}x{result[2]}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(maps) - failed} map(s) rendered, {failed} failed"
+        ))
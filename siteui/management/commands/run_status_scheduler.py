@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from siteui import status_engine
+
+
+class Command(BaseCommand):
+    help = (
+        "Keep the status snapshot in step with RouteStatus validity windows, "
+        "waking exactly when a window opens or closes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-sleep",
+            type=int,
+            default=300,
+            help="Upper bound in seconds between checks, to pick up edits "
+                 "made through other processes (default: 300)",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Apply pending transitions and exit",
+        )
+
+    def handle(self, *args, **options):
+        max_sleep = options["max_sleep"]
+
+        while True:
+            next_transition = status_engine.apply_transitions()
+
+            if options["once"]:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Next transition: {next_transition or 'none'}")
+                )
+                return
+
+            if next_transition is None:
+                delay = max_sleep
+            else:
+                delay = (next_transition - timezone.now()).total_seconds()
+                delay = min(max(delay, 0), max_sleep)
+
+            time.sleep(delay)
@@ -0,0 +1,372 @@
+"""
+Map documents: hosting, previews and zoom tiles.
+
+A Map's uploaded document (a PDF or an image) is served by
+serve_file(), which answers single byte-range requests (so PDF viewers
+can fetch the pages they show first) and hands whole files to the WSGI
+server's file wrapper, which uses sendfile() where it can. Set
+SITEUI_SENDFILE to "x-accel-redirect" (nginx, with internal location
+SITEUI_SENDFILE_PREFIX mapped to MEDIA_ROOT) or "x-sendfile" (Apache,
+lighttpd) to have the web server send files instead.
+
+When a document is uploaded it is rendered in the image worker pool
+(siteui.images): the first page is rasterised (PDFs need pypdfium2) and
+cut into a pyramid of 256px WebP tiles, level 0 a single tile and the
+last level full resolution, for the viewer on the map page. A preview
+is kept too and becomes the map's preview image if it has none.
+Renderings are stored on disk by the document's content hash, under
+maps/rendered/<sha256>/, so re-uploading a document renders nothing and
+tile URLs can be cached for good.
+"""
+
+import hashlib
+import io
+import json
+import math
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils.http import http_date
+from PIL import Image
+
+try:
+    import pypdfium2
+except ImportError:  # optional, PDF maps are served but not rendered without it
+    pypdfium2 = None
+
+from . import images, pagecache
+from .models import Map
+
+TILE_SIZE = 256
+TILE_QUALITY = 80
+# Longest side of the full-resolution raster, and the resolution PDFs
+# are rendered at below that
+MAX_RASTER = 8192
+PDF_DPI = 200
+PREVIEW_WIDTH = 1280
+
+# Documents keep their name when replaced in place, so are revalidated
+# (cheaply, by ETag) after an hour
+DOCUMENT_CACHE_CONTROL = "public, max-age=3600"
+
+RENDERED = "maps/rendered/{sha256}"
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+# --------------------
+# Serving
+# --------------------
+
+class RangeFile:
+    """
+    `length` bytes of an open file from `start`, as a file object.
+
+    FileResponse takes its Content-Length from seek(0, SEEK_END), and
+    file wrappers that use sendfile() start at tell() and stop at
+    Content-Length, so only the range is read either way.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.end = start + length
+        file.seek(start)
+
+    def read(self, size=-1):
+        remaining = self.end - self.file.tell()
+        if remaining <= 0:
+            return b""
+        return self.file.read(remaining if size < 0 else min(size, remaining))
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END:
+            return self.file.seek(self.end + offset)
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def seekable(self):
+        return True
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    (first, last) byte positions for a single-range Range header, or
+    None to send the whole file (no range, or several). Raises
+    ValueError if the range is outside the file.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        suffix = int(last)
+        if not suffix or not size:
+            raise ValueError("Empty range")
+        return max(0, size - suffix), size - 1
+
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last:
+        raise ValueError("Range outside the file")
+    return first, last
+
+
+def serve_file(request, name, cache_control, content_type=None):
+    """
+    The stored file `name`, honouring Range, If-Range and If-None-Match.
+    """
+    try:
+        full_path = default_storage.path(name)
+    except NotImplementedError:
+        # Remote storage serves its own files
+        return redirect(default_storage.url(name))
+    try:
+        stat = os.stat(full_path)
+    except FileNotFoundError:
+        raise Http404
+
+    etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if etag in request.headers.get("If-None-Match", ""):
+        return HttpResponseNotModified(headers=headers)
+
+    content_type = content_type or mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+    backend = getattr(settings, "SITEUI_SENDFILE", "")
+    if backend:
+        # The web server handles ranges itself
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if backend == "x-accel-redirect":
+            prefix = getattr(settings, "SITEUI_SENDFILE_PREFIX", "/protected-media/")
+            response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(name)
+        else:
+            response["X-Sendfile"] = full_path
+        return response
+
+    byte_range = None
+    range_header = request.headers.get("Range")
+    if range_header and request.headers.get("If-Range", etag) == etag:
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            return HttpResponse(
+                status=416,
+                headers={**headers, "Content-Range": f"bytes */{stat.st_size}"},
+            )
+
+    file = open(full_path, "rb")
+    if byte_range is None:
+        return FileResponse(file, content_type=content_type, headers=headers)
+
+    first, last = byte_range
+    return FileResponse(
+        RangeFile(file, first, last - first + 1),
+        status=206,
+        content_type=content_type,
+        headers={**headers, "Content-Range": f"bytes {first}-{last}/{stat.st_size}"},
+    )
+
+
+# --------------------
+# Rendering (worker processes)
+# --------------------
+
+def rasterise(data, name):
+    """
+    First page of a PDF, or an image, as an RGB image no larger than
+    MAX_RASTER on its longest side.
+    """
+    if name.lower().endswith(".pdf"):
+        if pypdfium2 is None:
+            raise RuntimeError("Install pypdfium2 to render PDF maps")
+        pdf = pypdfium2.PdfDocument(data)
+        try:
+            page = pdf[0]
+            width, height = page.get_size()
+            scale = min(PDF_DPI / 72, MAX_RASTER / max(width, height))
+            image = page.render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+    else:
+        image = Image.open(io.BytesIO(data))
+        image.thumbnail((MAX_RASTER, MAX_RASTER), Image.Resampling.LANCZOS)
+    return image.convert("RGB")
+
+
+def tile_levels(width, height):
+    """
+    Index of the full-resolution level; level 0 fits one tile.
+    """
+    return max(0, math.ceil(math.log2(max(width, height) / TILE_SIZE)))
+
+
+def tile_name(sha256, z, x, y):
+    return f"{RENDERED.format(sha256=sha256)}/tiles/{z}/{x}/{y}.webp"
+
+
+def _save(name, image, image_format, **options):
+    output = io.BytesIO()
+    image.save(output, image_format, **options)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(output.getvalue()))
+
+
+def render(name):
+    """
+    Rasterise the stored document `name` into its preview and tiles.
+
+    Returns (sha256, width, height). Already rendered documents (the
+    same content uploaded before) are not rendered again.
+    """
+    with default_storage.open(name, "rb") as file:
+        data = file.read()
+    sha256 = hashlib.sha256(data).hexdigest()
+    root = RENDERED.format(sha256=sha256)
+
+    meta_name = f"{root}/meta.json"
+    if default_storage.exists(meta_name):
+        with default_storage.open(meta_name) as file:
+            meta = json.load(file)
+        return sha256, meta["width"], meta["height"]
+
+    image = rasterise(data, name)
+    width, height = image.size
+
+    preview = image.copy()
+    preview.thumbnail((PREVIEW_WIDTH, PREVIEW_WIDTH * 4), Image.Resampling.LANCZOS)
+    _save(f"{root}/preview.png", preview, "PNG", optimize=True)
+
+    # Full resolution first, each level half the one before
+    level = image
+    for z in range(tile_levels(width, height), -1, -1):
+        for x in range(math.ceil(level.width / TILE_SIZE)):
+            for y in range(math.ceil(level.height / TILE_SIZE)):
+                tile = level.crop((
+                    x * TILE_SIZE,
+                    y * TILE_SIZE,
+                    min((x + 1) * TILE_SIZE, level.width),
+                    min((y + 1) * TILE_SIZE, level.height),
+                ))
+                _save(tile_name(sha256, z, x, y), tile, "WEBP", quality=TILE_QUALITY)
+        level = level.resize(
+            (max(1, math.ceil(level.width / 2)), max(1, math.ceil(level.height / 2))),
+            Image.Resampling.LANCZOS,
+        )
+
+    # Written last: its presence means the rendering is complete
+    default_storage.save(meta_name, ContentFile(json.dumps({
+        "width": width,
+        "height": height,
+        "tile_size": TILE_SIZE,
+    }).encode()))
+    return sha256, width, height
+
+
+# --------------------
+# Scheduling
+# --------------------
+
+def rendered(map_obj, name, result):
+    """
+    Record a finished rendering of `name` against `map_obj`.
+    """
+    sha256, width, height = result
+    updated = Map.objects.filter(pk=map_obj.pk, document=name).update(
+        document_sha256=sha256,
+        raster_width=width,
+        raster_height=height,
+    )
+    if not updated:
+        # Replaced by another upload meanwhile
+        return
+
+    preview = f"{RENDERED.format(sha256=sha256)}/preview.png"
+    if Map.objects.filter(pk=map_obj.pk, preview_image="").update(preview_image=preview):
+        images.schedule(preview, images.BREAKPOINTS[Map, "preview_image"])
+    pagecache.invalidate(Map)
+
+
+def schedule(map_obj):
+    """
+    Render `map_obj`'s document unless it has been already, in the
+    worker pool unless SITEUI_IMAGE_WORKERS is 0.
+    """
+    if not map_obj.document or map_obj.document_sha256:
+        return
+
+    name = map_obj.document.name
+    if not images.workers():
+        try:
+            rendered(map_obj, name, render(name))
+        except (OSError, RuntimeError):
+            images.logger.exception("Could not render map %s", name)
+        return
+
+    def done(future):
+        # Runs on the pool's management thread
+        try:
+            rendered(map_obj, name, future.result())
+        except Exception:
+            images.logger.exception("Could not render map %s", name)
+        finally:
+            close_old_connections()
+
+    images.pool().submit(render, name).add_done_callback(done)
+
+
+def document_changing(map_obj):
+    """
+    Forget the rendering of a document being replaced or removed. Call
+    before the map is saved.
+    """
+    if not map_obj.document or not map_obj.document._committed:
+        map_obj.document_sha256 = ""
+        map_obj.raster_width = map_obj.raster_height = 0
+
+
+# --------------------
+# Viewer
+# --------------------
+
+def tiles(map_obj):
+    """
+    Settings for the tile viewer on the map page, or None before the
+    document has been rendered.
+    """
+    if not map_obj.document_sha256:
+        return None
+
+    first = reverse("siteui:map_tile", args=[map_obj.document_sha256, 0, 0, 0])
+    return {
+        "url": first.replace("/0/0/0.webp", "/{z}/{x}/{y}.webp"),
+        "width": map_obj.raster_width,
+        "height": map_obj.raster_height,
+        "levels": tile_levels(map_obj.raster_width, map_obj.raster_height),
+        "size": TILE_SIZE,
+    }
@@ -0,0 +1,297 @@
+"""
+Per-request timings for siteui views, exported for Prometheus.
+
+MetricsMiddleware splits each request's time by view into:
+
+- SQL time and query count (via siteui.querybudget's query recorder);
+- template rendering, context processors included;
+- the incident banner context processor on its own;
+- page and fragment cache hits and misses (siteui.pagecache).
+
+Samples go into an in-process registry of fixed-bucket histograms,
+served in the Prometheus text format at /metrics and summarised for
+staff at /admin/metrics/. Each worker process keeps its own registry,
+so scrape every worker (or run one per container).
+
+Off unless SITEUI_METRICS_ENABLED; when off the middleware costs a
+settings lookup and the template and cache hooks a context variable read.
+"""
+
+import bisect
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import querybudget
+
+SECONDS_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, math.inf,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, math.inf)
+
+# name -> (help, buckets)
+HISTOGRAMS = {
+    "request_seconds": ("Time to handle a request", SECONDS_BUCKETS),
+    "sql_seconds": ("Time spent in SQL per request", SECONDS_BUCKETS),
+    "sql_queries": ("SQL queries per request", QUERY_BUCKETS),
+    "template_seconds": (
+        "Time rendering templates per request, context processors included",
+        SECONDS_BUCKETS,
+    ),
+    "context_processor_seconds": (
+        "Time in the incident banner context processor per request",
+        SECONDS_BUCKETS,
+    ),
+}
+
+COUNTERS = {
+    "requests_total": "Requests handled, by view and status code",
+    "page_cache_total": "Page and fragment cache lookups, by view and outcome",
+}
+
+_current = ContextVar("siteui_request_metrics", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Estimate of the q-quantile, interpolating within its bucket.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                upper = self.buckets[i]
+                lower = self.buckets[i - 1] if i else 0
+                if math.isinf(upper):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-2]
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = Counter()
+
+    def observe(self, name, view, value):
+        with self.lock:
+            histogram = self.histograms.get((name, view))
+            if histogram is None:
+                histogram = self.histograms[name, view] = Histogram(HISTOGRAMS[name][1])
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        with self.lock:
+            self.counters[name, labels] += amount
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def views(self):
+        return sorted({view for _, view in self.histograms})
+
+    def summary(self):
+        """
+        One row per view for the dashboard; times in milliseconds.
+        """
+        def mean(name, view, scale=1e3):
+            histogram = self.histograms.get((name, view))
+            if not histogram or not histogram.count:
+                return None
+            return histogram.sum / histogram.count * scale
+
+        rows = []
+        with self.lock:
+            for view in self.views():
+                requests = self.histograms["request_seconds", view]
+                hits = self.counters["page_cache_total", (view, "hits")]
+                misses = self.counters["page_cache_total", (view, "misses")]
+                rows.append({
+                    "view": view,
+                    "requests": requests.count,
+                    "p50_ms": requests.quantile(0.5) * 1e3,
+                    "p95_ms": requests.quantile(0.95) * 1e3,
+                    "mean_ms": mean("request_seconds", view),
+                    "sql_ms": mean("sql_seconds", view),
+                    "queries": mean("sql_queries", view, scale=1),
+                    "template_ms": mean("template_seconds", view),
+                    "context_processor_ms": mean("context_processor_seconds", view),
+                    "cache_hit_ratio": hits / (hits + misses) if hits + misses else None,
+                })
+        return rows
+
+    def prometheus(self):
+        lines = []
+        with self.lock:
+            for name, (help_text, _) in HISTOGRAMS.items():
+                metric = f"siteui_{name}"
+                lines += [f"# HELP {metric} {help_text}.", f"# TYPE {metric} histogram"]
+                for (histogram_name, view), histogram in sorted(self.histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, n in zip(histogram.buckets, histogram.counts):
+                        cumulative += n
+                        le = "+Inf" if math.isinf(bound) else repr(bound)
+                        lines.append(
+                            f'{metric}_bucket{{view="{_escape(view)}",le="{le}"}} {cumulative}'
+                        )
+                    lines.append(f'{metric}_sum{{view="{_escape(view)}"}} {histogram.sum!r}')
+                    lines.append(f'{metric}_count{{view="{_escape(view)}"}} {histogram.count}')
+
+            for name, help_text in COUNTERS.items():
+                metric = f"siteui_{name}"
+                second = "status" if name == "requests_total" else "outcome"
+                lines += [f"# HELP {metric} {help_text}.", f"# TYPE {metric} counter"]
+                for (counter_name, (view, value)), n in sorted(self.counters.items()):
+                    if counter_name == name:
+                        lines.append(
+                            f'{metric}{{view="{_escape(view)}",{second}="{_escape(value)}"}} {n}'
+                        )
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+# --------------------
+# Per-request hooks
+# --------------------
+
+class RequestMetrics:
+    def __init__(self):
+        self.template = 0.0
+        self.context_processor = 0.0
+        self.cache = Counter()
+
+
+@contextmanager
+def timed(part):
+    """
+    Add the time spent in the block to the current request's `part`.
+    """
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(current, part, getattr(current, part) + time.perf_counter() - started)
+
+
+def note_cache(outcome):
+    current = _current.get()
+    if current is not None:
+        current.cache[outcome] += 1
+
+
+def instrument_templates():
+    """
+    Time Django template renders (called once from SiteuiConfig.ready).
+    Includes are rendered inside the outer render, so are not counted
+    twice.
+    """
+    from django.template.backends.django import Template
+
+    render = Template.render
+    if getattr(render, "siteui_timed", False):
+        return
+
+    @wraps(render)
+    def timed_render(self, context=None, request=None):
+        with timed("template"):
+            return render(self, context, request)
+
+    timed_render.siteui_timed = True
+    Template.render = timed_render
+
+
+def is_enabled():
+    return getattr(settings, "SITEUI_METRICS_ENABLED", False)
+
+
+def record(request, response, elapsed, recorder, current):
+    match = getattr(request, "resolver_match", None)
+    view = match.view_name if match else "unresolved"
+
+    registry.observe("request_seconds", view, elapsed)
+    registry.observe("sql_seconds", view, recorder.duration)
+    registry.observe("sql_queries", view, len(recorder))
+    registry.observe("template_seconds", view, current.template)
+    registry.observe("context_processor_seconds", view, current.context_processor)
+    registry.inc("requests_total", (view, str(response.status_code)))
+    for outcome, n in current.cache.items():
+        registry.inc("page_cache_total", (view, outcome), n)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not is_enabled():
+            return self.get_response(request)
+
+        current = RequestMetrics()
+        token = _current.set(current)
+        started = time.perf_counter()
+        try:
+            with querybudget.active(querybudget.QueryRecorder()) as recorder:
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        record(request, response, time.perf_counter() - started, recorder, current)
+        return response
+
+    async def __acall__(self, request):
+        if not is_enabled():
+            return await self.get_response(request)
+
+        current = RequestMetrics()
+        token = _current.set(current)
+        started = time.perf_counter()
+        try:
+            with querybudget.active(querybudget.QueryRecorder()) as recorder:
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        record(request, response, time.perf_counter() - started, recorder, current)
+        return response
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_snapshot(apps, schema_editor):
+    RouteStatus = apps.get_model("siteui", "RouteStatus")
+    NetworkStatusSnapshot = apps.get_model("siteui", "NetworkStatusSnapshot")
+
+    statuses = (
+        RouteStatus.objects
+        .filter(is_active=True)
+        .exclude(status_type__name__iexact="Good service")
+        .select_related("status_type", "route__mode", "route__operator")
+        .order_by("route_id", "-status_type__severity", "-valid_from")
+    )
+
+    rows = {}
+    for status in statuses:
+        if status.route_id in rows:
+            continue
+        route = status.route
+        rows[status.route_id] = NetworkStatusSnapshot(
+            route=route,
+            route_uuid=route.uuid,
+            service=route.service,
+            mode_name=route.mode.name,
+            mode_slug=route.mode.slug,
+            operator_name=route.operator.operator_name,
+            display_order=route.display_order,
+            colour_hex=route.route_hex or route.operator.primary_hex,
+            status_name=status.status_type.name,
+            status_colour_hex=status.status_type.colour_hex,
+            severity=status.status_type.severity,
+            summary=status.summary,
+        )
+
+    NetworkStatusSnapshot.objects.bulk_create(rows.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteui', '0004_networkincident'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NetworkStatusSnapshot',
+            fields=[
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='status_snapshot', serialize=False, to='siteui.route')),
+                ('route_uuid', models.UUIDField()),
+                ('service', models.CharField(max_length=10)),
+                ('mode_name', models.CharField(max_length=20)),
+                ('mode_slug', models.SlugField()),
+                ('operator_name', models.CharField(max_length=50)),
+                ('display_order', models.PositiveIntegerField(default=1000)),
+                ('colour_hex', models.CharField(help_text='Route colour, falling back to the operator colour', max_length=7)),
+                ('status_name', models.CharField(max_length=30)),
+                ('status_colour_hex', models.CharField(max_length=7)),
+                ('severity', models.PositiveSmallIntegerField(default=0)),
+                ('summary', models.CharField(max_length=200)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Network status snapshot',
+                'verbose_name_plural': 'Network status snapshot',
+                'ordering': ['mode_name', 'operator_name', 'display_order', 'service'],
+                'indexes': [models.Index(fields=['mode_name', 'operator_name', 'display_order', 'service'], name='siteui_snapshot_order_idx')],
+            },
+        ),
+        migrations.RunPython(build_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteui', '0005_networkstatussnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BustimesSyncState',
+            fields=[
+                ('operator', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='bustimes_sync_state', serialize=False, to='siteui.operator')),
+                ('etag', models.CharField(blank=True, max_length=200)),
+                ('last_modified', models.CharField(blank=True, max_length=50)),
+                ('service_hashes', models.JSONField(blank=True, default=dict, help_text='Content hash of each service payload, keyed by Bustimes service ID')),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Bustimes sync state',
+                'verbose_name_plural': 'Bustimes sync states',
+            },
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='is_retired',
+            field=models.BooleanField(default=False, help_text='Withdrawn upstream on Bustimes.org; hidden from route lists'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteui', '0006_bustimes_sync_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceCalendar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(help_text='GTFS service_id or derived TransXChange profile key', max_length=100, unique=True)),
+                ('days', models.PositiveSmallIntegerField(default=0, help_text='Bitmask of operating weekdays, Monday = 1 … Sunday = 64')),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Service calendar',
+                'verbose_name_plural': 'Service calendars',
+            },
+        ),
+        migrations.CreateModel(
+            name='Stop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(help_text='ATCO code or GTFS stop_id', max_length=50, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Trip',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(help_text='GTFS trip_id or TransXChange vehicle journey key', max_length=100, unique=True)),
+                ('headsign', models.CharField(blank=True, max_length=100)),
+                ('calendar', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='trips', to='siteui.servicecalendar')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trips', to='siteui.route')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StopTime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveIntegerField()),
+                ('arrival_time', models.PositiveIntegerField()),
+                ('departure_time', models.PositiveIntegerField()),
+                ('stop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stop_times', to='siteui.stop')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stop_times', to='siteui.trip')),
+            ],
+            options={
+                'ordering': ['trip', 'sequence'],
+                'indexes': [models.Index(fields=['stop', 'departure_time'], name='siteui_stoptime_departure_idx')],
+                'unique_together': {('trip', 'sequence')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteui', '0008_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(condition=models.Q(('is_retired', False)), fields=['display_order', 'service', 'id'], name='siteui_route_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(condition=models.Q(('is_retired', False)), fields=['operator', 'display_order', 'service'], name='siteui_route_operator_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(condition=models.Q(('is_retired', False)), fields=['mode', 'display_order', 'service'], name='siteui_route_mode_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='routestatus',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['route', '-valid_from'], name='siteui_status_route_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='routestatus',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['valid_from', 'valid_to'], name='siteui_status_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['operator', 'price'], name='siteui_ticket_operator_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='networkincident',
+            index=models.Index(condition=models.Q(('active', True)), fields=['-start_time'], name='siteui_incident_active_idx'),
+        ),
+    ]
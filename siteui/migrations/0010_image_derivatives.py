@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteui', '0009_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivatives',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('original', models.CharField(db_index=True, help_text='Storage path of the original the variants were made from', max_length=255)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('variants', models.JSONField(blank=True, default=list, help_text='[{"format": "webp", "width": 320, "name": "<storage path>"}, ...]')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Image derivatives',
+                'verbose_name_plural': 'Image derivatives',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.9 on 2026-10-18 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def documents_from_paths(apps, schema_editor):
+    # Maps whose path points into MEDIA_URL are hosted here already
+    Map = apps.get_model("siteui", "Map")
+    media_url = "/" + settings.MEDIA_URL.strip("/") + "/"
+    for map_obj in Map.objects.filter(path__startswith=media_url, document=""):
+        map_obj.document = map_obj.path[len(media_url):]
+        map_obj.save(update_fields=["document"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteui', '0010_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='map',
+            name='document',
+            field=models.FileField(blank=True, help_text='PDF or image of the map, served in place of path when set', upload_to='maps/documents/'),
+        ),
+        migrations.AddField(
+            model_name='map',
+            name='document_sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='map',
+            name='raster_width',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='map',
+            name='raster_height',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(documents_from_paths, migrations.RunPython.noop),
+    ]
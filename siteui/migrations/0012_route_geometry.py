@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteui', '0011_map_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteGeometry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField(help_text='Index into siteui.geometry.LEVELS; higher is more detailed')),
+                ('lines', models.JSONField(default=list, help_text='Google encoded polylines, precision 5')),
+                ('points', models.PositiveIntegerField(default=0)),
+                ('min_lat', models.FloatField()),
+                ('min_lon', models.FloatField()),
+                ('max_lat', models.FloatField()),
+                ('max_lon', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='geometries', to='siteui.route')),
+            ],
+            options={
+                'verbose_name': 'Route geometry',
+                'verbose_name_plural': 'Route geometries',
+                'unique_together': {('route', 'level')},
+            },
+        ),
+    ]
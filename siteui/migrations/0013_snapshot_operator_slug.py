@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:20
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def operator_slugs(apps, schema_editor):
+    NetworkStatusSnapshot = apps.get_model("siteui", "NetworkStatusSnapshot")
+    Route = apps.get_model("siteui", "Route")
+    NetworkStatusSnapshot.objects.update(
+        operator_slug=Subquery(
+            Route.objects
+            .filter(pk=OuterRef("route_id"))
+            .values("operator__bustimes_slug")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteui', '0012_route_geometry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='networkstatussnapshot',
+            name='operator_slug',
+            field=models.SlugField(blank=True),
+        ),
+        migrations.RunPython(operator_slugs, migrations.RunPython.noop),
+    ]
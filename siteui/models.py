@@ -2,6 +2,9 @@ import uuid
 
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
 
 class Mode(models.Model):
@@ -94,6 +97,8 @@ class Operator(models.Model):
         help_text="Optional template path, e.g. siteui/operators/stagecoach.html",
     )
 
+    updated_at = models.DateTimeField(auto_now=True)
+
     is_featured = models.BooleanField(
         default=False,
         help_text="Show this operator as featured on key pages",
@@ -106,6 +111,42 @@ class Operator(models.Model):
         return self.operator_name
 
 
+class RouteQuerySet(models.QuerySet):
+    def in_service(self):
+        """
+        Routes still running, i.e. not retired by the Bustimes sync.
+        """
+        return self.filter(is_retired=False)
+
+    def annotate_worst_status(self, at=None):
+        """
+        Annotate each route with its most severe status in effect at `at`
+        (default: now), as worst_status_name / _colour_hex / _severity /
+        _summary. Routes with no status get None.
+        """
+        worst = (
+            RouteStatus.objects
+            .current(at)
+            .filter(route=models.OuterRef("pk"))
+            .order_by("-status_type__severity", "-valid_from", "-pk")
+        )
+
+        return self.annotate(
+            worst_status_name=models.Subquery(
+                worst.values("status_type__name")[:1]
+            ),
+            worst_status_colour_hex=models.Subquery(
+                worst.values("status_type__colour_hex")[:1]
+            ),
+            worst_status_severity=models.Subquery(
+                worst.values("status_type__severity")[:1]
+            ),
+            worst_status_summary=models.Subquery(
+                worst.values("summary")[:1]
+            ),
+        )
+
+
 class Route(models.Model):
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
 
@@ -158,14 +199,168 @@ class Route(models.Model):
         help_text="Lower numbers appear first in lists",
     )
 
+    is_retired = models.BooleanField(
+        default=False,
+        help_text="Withdrawn upstream on Bustimes.org; hidden from route lists",
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RouteQuerySet.as_manager()
+
     class Meta:
         unique_together = ("service", "operator", "mode")
         ordering = ["display_order", "service"]
+        indexes = [
+            # In-service lists and the API's keyset pagination
+            models.Index(
+                fields=["display_order", "service", "id"],
+                condition=Q(is_retired=False),
+                name="siteui_route_order_idx",
+            ),
+            models.Index(
+                fields=["operator", "display_order", "service"],
+                condition=Q(is_retired=False),
+                name="siteui_route_operator_idx",
+            ),
+            models.Index(
+                fields=["mode", "display_order", "service"],
+                condition=Q(is_retired=False),
+                name="siteui_route_mode_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.service} ({self.operator})"
 
 
+class Stop(models.Model):
+    """
+    Bus stop, ferry pier or station platform.
+    """
+
+    code = models.CharField(
+        max_length=50,
+        unique=True,
+        help_text="ATCO code or GTFS stop_id",
+    )
+
+    name = models.CharField(max_length=200)
+
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class ServiceCalendar(models.Model):
+    """
+    Days of the week and date range on which trips run.
+    """
+
+    MONDAY = 1
+    TUESDAY = 2
+    WEDNESDAY = 4
+    THURSDAY = 8
+    FRIDAY = 16
+    SATURDAY = 32
+    SUNDAY = 64
+
+    code = models.CharField(
+        max_length=100,
+        unique=True,
+        help_text="GTFS service_id or derived TransXChange profile key",
+    )
+
+    days = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Bitmask of operating weekdays, Monday = 1 … Sunday = 64",
+    )
+
+    start_date = models.DateField(blank=True, null=True)
+    end_date = models.DateField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Service calendar"
+        verbose_name_plural = "Service calendars"
+
+    def __str__(self):
+        return self.code
+
+    def runs_on(self, day):
+        if self.start_date and day < self.start_date:
+            return False
+        if self.end_date and day > self.end_date:
+            return False
+        return bool(self.days & (1 << day.weekday()))
+
+
+class Trip(models.Model):
+    code = models.CharField(
+        max_length=100,
+        unique=True,
+        help_text="GTFS trip_id or TransXChange vehicle journey key",
+    )
+
+    route = models.ForeignKey(
+        Route,
+        on_delete=models.CASCADE,
+        related_name="trips",
+    )
+
+    calendar = models.ForeignKey(
+        ServiceCalendar,
+        on_delete=models.PROTECT,
+        related_name="trips",
+    )
+
+    headsign = models.CharField(max_length=100, blank=True)
+
+    def __str__(self):
+        return f"{self.route} – {self.code}"
+
+
+class StopTime(models.Model):
+    """
+    A trip calling at a stop. Times are seconds after midnight of the
+    service day and may exceed 24 hours for trips running past midnight.
+    """
+
+    trip = models.ForeignKey(
+        Trip,
+        on_delete=models.CASCADE,
+        related_name="stop_times",
+    )
+
+    stop = models.ForeignKey(
+        Stop,
+        on_delete=models.CASCADE,
+        related_name="stop_times",
+    )
+
+    sequence = models.PositiveIntegerField()
+
+    arrival_time = models.PositiveIntegerField()
+    departure_time = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ["trip", "sequence"]
+        unique_together = ("trip", "sequence")
+        indexes = [
+            models.Index(
+                fields=["stop", "departure_time"],
+                name="siteui_stoptime_departure_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.trip} @ {self.stop}"
+
+
 class Fare(models.Model):
     mode = models.ForeignKey(Mode, on_delete=models.CASCADE)
 
@@ -208,6 +403,39 @@ class ServiceStatusType(models.Model):
         return self.name
 
 
+class RouteStatusQuerySet(models.QuerySet):
+    def current(self, at=None):
+        """
+        Statuses in effect at `at` (default: now).
+
+        `is_active` is the manual switch; the validity window decides
+        whether an active status actually applies at a given moment.
+        """
+        at = at or timezone.now()
+        return (
+            self
+            .filter(is_active=True, valid_from__lte=at)
+            .filter(Q(valid_to__isnull=True) | Q(valid_to__gt=at))
+        )
+
+    def worst_per_route(self):
+        """
+        Keep only the most severe status for each route, ties going to the
+        most recent. Combine with current() for the live picture.
+        """
+        return self.annotate(
+            severity_rank=models.Window(
+                expression=RowNumber(),
+                partition_by=[models.F("route_id")],
+                order_by=[
+                    models.F("status_type__severity").desc(),
+                    models.F("valid_from").desc(),
+                    models.F("pk").desc(),
+                ],
+            )
+        ).filter(severity_rank=1)
+
+
 class RouteStatus(models.Model):
     """
     Live or scheduled status affecting a route.
@@ -245,10 +473,26 @@ class RouteStatus(models.Model):
 
     last_updated = models.DateTimeField(auto_now=True)
 
+    objects = RouteStatusQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Route status"
         verbose_name_plural = "Route statuses"
         ordering = ["-valid_from"]
+        indexes = [
+            # A route's statuses in effect (annotate_worst_status, detail)
+            models.Index(
+                fields=["route", "-valid_from"],
+                condition=Q(is_active=True),
+                name="siteui_status_route_active_idx",
+            ),
+            # Statuses in effect across the network (snapshot, timeline)
+            models.Index(
+                fields=["valid_from", "valid_to"],
+                condition=Q(is_active=True),
+                name="siteui_status_window_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.route} – {self.status_type}"
@@ -269,9 +513,17 @@ class Ticket(models.Model):
 
     description = models.TextField(blank=True)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ["operator", "price"]
         unique_together = ("name", "operator")
+        indexes = [
+            models.Index(
+                fields=["operator", "price"],
+                name="siteui_ticket_operator_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.operator.operator_name})"
@@ -286,6 +538,17 @@ class Map(models.Model):
         help_text="URL or file path to the map",
     )
 
+    document = models.FileField(
+        upload_to="maps/documents/",
+        blank=True,
+        help_text="PDF or image of the map, served in place of path when set",
+    )
+
+    # Set by siteui.mapdocs once the document has been rendered to tiles
+    document_sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    raster_width = models.PositiveIntegerField(default=0, editable=False)
+    raster_height = models.PositiveIntegerField(default=0, editable=False)
+
     preview_image = models.ImageField(
         upload_to="maps/previews/",
         blank=True,
@@ -298,6 +561,8 @@ class Map(models.Model):
 
     slug = models.SlugField(unique=True)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ["title"]
         verbose_name = "Map"
@@ -328,9 +593,174 @@ class NetworkIncident(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-start_time"]
+        indexes = [
+            # The incident banner
+            models.Index(
+                fields=["-start_time"],
+                condition=Q(active=True),
+                name="siteui_incident_active_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class BustimesSyncState(models.Model):
+    """
+    Per-operator state of the last Bustimes.org import, used to make
+    conditional requests and skip services that have not changed.
+    """
+
+    operator = models.OneToOneField(
+        Operator,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="bustimes_sync_state",
+    )
+
+    etag = models.CharField(max_length=200, blank=True)
+    last_modified = models.CharField(max_length=50, blank=True)
+
+    service_hashes = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Content hash of each service payload, keyed by Bustimes service ID",
+    )
+
+    synced_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Bustimes sync state"
+        verbose_name_plural = "Bustimes sync states"
+
+    def __str__(self):
+        return f"{self.operator} ({self.synced_at or 'never synced'})"
+
+
+class NetworkStatusSnapshot(models.Model):
+    """
+    Denormalised status row for a disrupted route.
+
+    Maintained by siteui.snapshot so the status page is a single
+    indexed read with no joins.
+    """
+
+    route = models.OneToOneField(
+        Route,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="status_snapshot",
+    )
+
+    route_uuid = models.UUIDField()
+    service = models.CharField(max_length=10)
+
+    mode_name = models.CharField(max_length=20)
+    mode_slug = models.SlugField()
+
+    operator_name = models.CharField(max_length=50)
+    operator_slug = models.SlugField(blank=True)
+    display_order = models.PositiveIntegerField(default=1000)
+
+    colour_hex = models.CharField(
+        max_length=7,
+        help_text="Route colour, falling back to the operator colour",
+    )
+
+    status_name = models.CharField(max_length=30)
+    status_colour_hex = models.CharField(max_length=7)
+    severity = models.PositiveSmallIntegerField(default=0)
+    summary = models.CharField(max_length=200)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Network status snapshot"
+        verbose_name_plural = "Network status snapshot"
+        ordering = ["mode_name", "operator_name", "display_order", "service"]
+        indexes = [
+            models.Index(
+                fields=["mode_name", "operator_name", "display_order", "service"],
+                name="siteui_snapshot_order_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.service} – {self.status_name}"
+
+
+class ImageDerivatives(models.Model):
+    """
+    Resized WebP/AVIF variants of an uploaded image, keyed by the hash of
+    its content. Maintained by siteui.images; identical uploads share one
+    original and one set of variants.
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    original = models.CharField(
+        max_length=255,
+        db_index=True,
+        help_text="Storage path of the original the variants were made from",
+    )
+
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    variants = models.JSONField(
+        default=list,
+        blank=True,
+        help_text='[{"format": "webp", "width": 320, "name": "<storage path>"}, ...]',
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Image derivatives"
+        verbose_name_plural = "Image derivatives"
+
+    def __str__(self):
+        return self.original
+
+
+class RouteGeometry(models.Model):
+    """
+    A route's lines simplified for one band of map zooms, as encoded
+    polylines. Built by siteui.geometry when timetables are imported.
+    """
+
+    route = models.ForeignKey(
+        Route,
+        on_delete=models.CASCADE,
+        related_name="geometries",
+    )
+
+    level = models.PositiveSmallIntegerField(
+        help_text="Index into siteui.geometry.LEVELS; higher is more detailed",
+    )
+
+    lines = models.JSONField(
+        default=list,
+        help_text="Google encoded polylines, precision 5",
+    )
+    points = models.PositiveIntegerField(default=0)
+
+    # Bounding box of the unsimplified lines
+    min_lat = models.FloatField()
+    min_lon = models.FloatField()
+    max_lat = models.FloatField()
+    max_lon = models.FloatField()
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Route geometry"
+        verbose_name_plural = "Route geometries"
+        unique_together = ("route", "level")
+
+    def __str__(self):
+        return f"{self.route} (level {self.level})"
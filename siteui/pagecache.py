@@ -0,0 +1,216 @@
+"""
+Rendered page and fragment cache with per-model invalidation.
+
+Every cached page or fragment declares the models it is built from.
+Each model has a version counter (see siteui.versions), bumped by
+siteui.signals on save/delete, and cache keys embed the current
+versions of their dependencies: a change to Ticket moves the fares page
+and ticket fragments on to new keys, leaving everything else warm.
+
+Entries live in the cache alias named by SITEUI_PAGE_CACHE_ALIAS
+("pages"), so production can point it at a shared file or Redis cache
+while tests use locmem. Hit and miss counts per page or fragment are
+kept in the same cache and reported by stats().
+"""
+
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+from . import incidents, metrics, versions
+
+DEFAULT_TIMEOUT = 60 * 60 * 24
+
+KEY = "siteui:pagecache:{kind}:{name}:{digest}"
+COUNTER_KEY = "siteui:pagecache:stats:{name}:{outcome}"
+
+# Template fragments ({% cachefragment %}) and the models they render
+FRAGMENTS = {
+    "route-maps": ["siteui.map"],
+    "route-tickets": ["siteui.ticket"],
+}
+
+# Page or fragment name -> labels of the models it depends on
+REGISTRY = dict(FRAGMENTS)
+
+
+def get_cache():
+    return caches[getattr(settings, "SITEUI_PAGE_CACHE_ALIAS", "pages")]
+
+
+def label(model):
+    return model if isinstance(model, str) else model._meta.label_lower
+
+
+def version_name(model):
+    return f"model:{label(model)}"
+
+
+def invalidate(model):
+    """
+    Retire every cached entry that depends on `model`.
+    """
+    versions.bump(version_name(model))
+
+
+def invalidate_on_commit(model):
+    """
+    invalidate() now and again on commit, so no other process caches a
+    page built from before the change under the new version.
+    """
+    invalidate(model)
+    transaction.on_commit(lambda: invalidate(model))
+
+
+def register(name, depends_on):
+    labels = sorted({label(model) for model in depends_on})
+    REGISTRY[name] = labels
+    return labels
+
+
+def make_key(kind, name, labels, *vary_on):
+    names = [version_name(model) for model in labels]
+    parts = [*versions.get_many(names), *vary_on]
+    digest = hashlib.md5(
+        "\x1f".join(str(part) for part in parts).encode()
+    ).hexdigest()
+    return KEY.format(kind=kind, name=name, digest=digest)
+
+
+def count(name, outcome):
+    metrics.note_cache(outcome)
+    cache = get_cache()
+    key = COUNTER_KEY.format(name=name, outcome=outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def lookup_fragment(name, *vary_on):
+    """
+    (key, cached content or None) of fragment `name` for `vary_on`,
+    counted as a hit or miss.
+    """
+    key = make_key("fragment", name, FRAGMENTS[name], *vary_on)
+    content = get_cache().get(key)
+    count(name, "misses" if content is None else "hits")
+    return key, content
+
+
+def lookup_fragments(fragments):
+    """
+    {name: lookup_fragment(name, *vary_on)} for a {name: vary_on} dict.
+
+    Views pass the result to their template as `fragments`, so they can
+    skip the queries behind fragments that are already cached and
+    {% cachefragment %} does not look them up again.
+    """
+    return {
+        name: lookup_fragment(name, *vary_on)
+        for name, vary_on in fragments.items()
+    }
+
+
+def stats():
+    """
+    {name: {"hits": n, "misses": n, "depends_on": [...]}} for every
+    registered page and fragment.
+    """
+    keys = {
+        (name, outcome): COUNTER_KEY.format(name=name, outcome=outcome)
+        for name in REGISTRY
+        for outcome in ("hits", "misses")
+    }
+    found = get_cache().get_many(keys.values())
+    return {
+        name: {
+            "hits": found.get(keys[name, "hits"], 0),
+            "misses": found.get(keys[name, "misses"], 0),
+            "depends_on": labels,
+        }
+        for name, labels in sorted(REGISTRY.items())
+    }
+
+
+def _lookup(name, labels, request, before):
+    if before is not None:
+        before()
+
+    key = make_key(
+        "page",
+        name,
+        labels,
+        incidents.current_version(),
+        request.get_full_path(),
+    )
+    cached = get_cache().get(key)
+    count(name, "misses" if cached is None else "hits")
+    return key, cached
+
+
+def _store(key, response, timeout):
+    if (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    ):
+        get_cache().set(
+            key,
+            (response.content, response["Content-Type"]),
+            timeout=timeout,
+        )
+
+
+def cache_page(name, depends_on, timeout=DEFAULT_TIMEOUT, before=None):
+    """
+    Cache successful GET/HEAD responses of a view per full path.
+
+    Pages also depend on the incident banner rendered by base.html.
+    `before` is called ahead of the lookup, for data that changes with
+    time rather than with a save (see status_engine.refresh_if_due).
+    Async views do the lookup and store in one thread hop each.
+    """
+    labels = register(name, depends_on)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return await view(request, *args, **kwargs)
+
+                key, cached = await sync_to_async(_lookup)(name, labels, request, before)
+                if cached is not None:
+                    content, content_type = cached
+                    return HttpResponse(content, content_type=content_type)
+
+                response = await view(request, *args, **kwargs)
+                await sync_to_async(_store)(key, response, timeout)
+                return response
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            key, cached = _lookup(name, labels, request, before)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            response = view(request, *args, **kwargs)
+            _store(key, response, timeout)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,244 @@
+"""
+Per-request query budgets and N+1 detection.
+
+QueryBudgetMiddleware counts the queries each request runs and checks
+them against SITEUI_QUERY_BUDGETS, a URL name -> maximum mapping:
+
+    SITEUI_QUERY_BUDGETS = {"siteui:status": 1, "siteui:routes": 4}
+
+It also flags the same SQL running more than SITEUI_QUERY_REPEAT_LIMIT
+times in one request, the shape of an N+1. Each violation is logged with
+the call sites of the queries involved: the first frame in project code
+and, for queries a template triggered, the template and line.
+
+Enabled by SITEUI_QUERY_BUDGET_ENABLED (default: DEBUG); otherwise the
+middleware costs a settings lookup. With SITEUI_QUERY_BUDGET_STRICT,
+violations raise QueryBudgetExceeded instead, which the siteui tests
+turn on so a view going over budget fails the suite.
+
+Queries are recorded through a database execute wrapper keyed on a
+context variable, so queries async views run on worker threads (via
+sync_to_async) are counted against the request too.
+"""
+
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPEAT_LIMIT = 3
+
+_recorders = ContextVar("siteui_query_recorders", default=())
+
+_PROJECT_ROOT = str(settings.BASE_DIR) + os.sep
+# Instrumentation frames, never reported as call sites
+_SKIP_FILES = {
+    os.path.abspath(__file__),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics.py"),
+}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+@dataclass
+class Query:
+    sql: str
+    duration: float
+    site: str = ""
+
+
+@dataclass
+class QueryRecorder:
+    """
+    Queries run while active(); call sites are captured when `sites`.
+    """
+    sites: bool = False
+    queries: list = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(query.duration for query in self.queries)
+
+    def repeated(self, limit):
+        """
+        {sql: count} for statements run more than `limit` times.
+        """
+        counts = Counter(query.sql for query in self.queries)
+        return {sql: n for sql, n in counts.items() if n > limit}
+
+    def duplicates(self):
+        return sum(n - 1 for n in Counter(q.sql for q in self.queries).values())
+
+    def sites_for(self, sql=None):
+        return sorted({
+            query.site
+            for query in self.queries
+            if query.site and (sql is None or query.sql == sql)
+        })
+
+
+class active:
+    """
+    Record the queries run in this context (and contexts copied from it,
+    such as sync_to_async calls) into `recorder`, alongside any recorders
+    already active.
+    """
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def __enter__(self):
+        self.token = _recorders.set((*_recorders.get(), self.recorder))
+        return self.recorder
+
+    def __exit__(self, *exc_info):
+        _recorders.reset(self.token)
+
+
+def call_site():
+    """
+    "path.py:line in func" for the innermost project frame, plus
+    "template.html:line" if a template node triggered the query.
+    """
+    code_site = template_site = None
+    frame = sys._getframe(2)
+    while frame is not None and not (code_site and template_site):
+        code = frame.f_code
+        if (
+            template_site is None
+            and code.co_name == "render_annotated"
+            and "django/template" in code.co_filename
+        ):
+            node = frame.f_locals.get("self")
+            origin = getattr(node, "origin", None)
+            token = getattr(node, "token", None)
+            if origin is not None and token is not None:
+                template_site = f"{origin.template_name}:{token.lineno}"
+        elif (
+            code_site is None
+            and code.co_filename.startswith(_PROJECT_ROOT)
+            and code.co_filename not in _SKIP_FILES
+            and "site-packages" not in code.co_filename
+        ):
+            path = code.co_filename[len(_PROJECT_ROOT):]
+            code_site = f"{path}:{frame.f_lineno} in {code.co_name}"
+        frame = frame.f_back
+
+    return "; ".join(site for site in (code_site, template_site) if site)
+
+
+def _record(execute, sql, params, many, context):
+    recorders = _recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        site = call_site() if any(r.sites for r in recorders) else ""
+        for recorder in recorders:
+            recorder.queries.append(Query(sql, duration, site))
+
+
+def install(connection, **kwargs):
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+connection_created.connect(install)
+for _connection in connections.all(initialized_only=True):
+    install(_connection)
+
+
+# --------------------
+# Budgets
+# --------------------
+
+def is_enabled():
+    return getattr(settings, "SITEUI_QUERY_BUDGET_ENABLED", settings.DEBUG)
+
+
+def violations(view_name, recorder):
+    """
+    Messages describing how a request for `view_name` broke its budget.
+    """
+    problems = []
+
+    budget = getattr(settings, "SITEUI_QUERY_BUDGETS", {}).get(view_name)
+    if budget is not None and len(recorder) > budget:
+        sites = "\n    ".join(recorder.sites_for())
+        problems.append(
+            f"{view_name} ran {len(recorder)} queries, budget {budget}"
+            f" ({recorder.duplicates()} duplicate):\n    {sites}"
+        )
+
+    limit = getattr(settings, "SITEUI_QUERY_REPEAT_LIMIT", DEFAULT_REPEAT_LIMIT)
+    for sql, n in recorder.repeated(limit).items():
+        sites = "\n    ".join(recorder.sites_for(sql))
+        problems.append(
+            f"{view_name} ran the same query {n} times (possible N+1):"
+            f"\n    {sql}\n    {sites}"
+        )
+
+    return problems
+
+
+def check(request, recorder):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return
+
+    problems = violations(match.view_name, recorder)
+    if not problems:
+        return
+    if getattr(settings, "SITEUI_QUERY_BUDGET_STRICT", False):
+        raise QueryBudgetExceeded("\n".join(problems))
+    for problem in problems:
+        logger.warning(problem)
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not is_enabled():
+            return self.get_response(request)
+
+        with active(QueryRecorder(sites=True)) as recorder:
+            response = self.get_response(request)
+        check(request, recorder)
+        return response
+
+    async def __acall__(self, request):
+        if not is_enabled():
+            return await self.get_response(request)
+
+        with active(QueryRecorder(sites=True)) as recorder:
+            response = await self.get_response(request)
+        check(request, recorder)
+        return response
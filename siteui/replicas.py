@@ -0,0 +1,125 @@
+"""
+Read replica routing for siteui's pages and API.
+
+With a "replica" database configured (TFP_DATABASE_REPLICA_URL),
+ReplicaMiddleware marks GET and HEAD requests to siteui views, and
+ReplicaRouter sends their reads to the replica. Everything else uses
+the primary ("default"): the admin, POSTs, management commands, the
+status scheduler and the live status publisher.
+
+Writes always go to the primary. A request that writes (a view
+rebuilding the status snapshot on a cache miss, say) reads from the
+primary for the rest of the request, so it never reads a replica that
+has not caught up with its own write.
+
+Other processes' writes are covered by the version counters: for
+SITEUI_REPLICA_LAG seconds after any counter is bumped (see
+siteui.versions), siteui requests read from the primary as well.
+Otherwise a page, fragment, ETag or per-process index rebuilt under the
+new version could be filled from a replica still showing the old data,
+and kept until the next change. Set the lag above the replica's worst
+delay; it needs the shared default cache (TFP_CACHE_URL) to see other
+processes' bumps.
+"""
+
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import versions
+
+REPLICA = "replica"
+PRIMARY = "default"
+
+_state = ContextVar("siteui_replica_state", default=None)
+
+
+class ReplicaState:
+    # Set in process_view, once the URL has been resolved; a mutable
+    # object rather than context variable values so it is seen by
+    # sync_to_async calls started before it changes
+    def __init__(self):
+        self.reads = False
+        self.wrote = False
+
+
+class reading:
+    """
+    Route this context's reads to the replica, as for a siteui view.
+    """
+
+    def __enter__(self):
+        state = ReplicaState()
+        state.reads = True
+        self.token = _state.set(state)
+        return state
+
+    def __exit__(self, *exc_info):
+        _state.reset(self.token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.reads and not state.wrote:
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both, so objects read from either can be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = _state.set(ReplicaState())
+        try:
+            return self.get_response(request)
+        finally:
+            _state.reset(token)
+
+    async def __acall__(self, request):
+        token = _state.set(ReplicaState())
+        try:
+            return await self.get_response(request)
+        finally:
+            _state.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        if state is not None:
+            state.reads = (
+                request.method in ("GET", "HEAD")
+                and request.resolver_match.namespace == "siteui"
+                and not replica_may_lag()
+            )
+
+
+def replica_may_lag():
+    """
+    Whether data changed recently enough that the replica may still be
+    behind (always False without a router or SITEUI_REPLICA_LAG).
+    """
+    lag = getattr(settings, "SITEUI_REPLICA_LAG", 0)
+    return bool(settings.DATABASE_ROUTERS and lag) and versions.changed_within(lag)
@@ -0,0 +1,131 @@
+"""
+Pre-rendered rows for the routes and status lists.
+
+Views group their rows by mode in one pass, rather than templates
+looping over every route once per mode, and hand the page the rendered
+rows. Each row is rendered from its own template (siteui/rows/),
+compiled once by the cached template loader, and kept per process for
+reuse by every page that lists it:
+
+- route rows (the routes page and every search result page) until a
+  route, operator, mode or vehicle type changes, tracked by their page
+  cache version counters;
+- status rows until their snapshot row is rebuilt (its updated_at).
+"""
+
+import uuid
+
+from django.db.models import prefetch_related_objects
+from django.template import Context
+from django.template.loader import get_template
+from django.urls import reverse
+
+from . import pagecache, versions
+from .models import Mode, Operator, Route, VehicleType
+
+ROUTE_TEMPLATE = "siteui/rows/route.html"
+STATUS_TEMPLATE = "siteui/rows/status.html"
+
+ROUTE_MODELS = (Route, Operator, Mode, VehicleType)
+
+# Rows kept per process, per kind; about 1.5 KB each
+MAX_ROWS = 20000
+
+_local = {"version": None, "routes": {}, "statuses": {}}
+
+
+def _render_all(template_name, contexts):
+    """
+    Render each of `contexts` (dicts) with one compiled template and one
+    Context.
+    """
+    template = get_template(template_name).template
+    context = Context(autoescape=True)
+    rendered = []
+    for values in contexts:
+        with context.push(values):
+            rendered.append(template.render(context))
+    return rendered
+
+
+def _cache(kind):
+    cache = _local[kind]
+    if len(cache) > MAX_ROWS:
+        cache.clear()
+    return cache
+
+
+def group_by_mode(items, modes):
+    """
+    [(mode, [item, ...]), ...] for each of `modes`, items in their
+    original order.
+    """
+    groups = {mode.pk: (mode, []) for mode in modes}
+    for item in items:
+        group = groups.get(item.mode_id)
+        if group is not None:
+            group[1].append(item)
+    return list(groups.values())
+
+
+def route_rows(routes):
+    """
+    Rendered rows for `routes` (with mode and operator selected), in
+    order. Vehicles are fetched only for the rows not rendered yet.
+    """
+    version = tuple(versions.get_many([pagecache.version_name(model) for model in ROUTE_MODELS]))
+    if _local["version"] != version:
+        _local["routes"] = {}
+        _local["version"] = version
+    cache = _cache("routes")
+
+    missing = [route for route in routes if route.pk not in cache]
+    if missing:
+        prefetch_related_objects(missing, "vehicles_used")
+        # Reversed once rather than by {% url %} in every row
+        placeholder = str(uuid.UUID(int=0))
+        detail_url = reverse("siteui:route_detail", args=[placeholder])
+        contexts = (
+            {
+                "route": route,
+                "url": detail_url.replace(placeholder, str(route.uuid)),
+                "vehicles": [vehicle.name for vehicle in route.vehicles_used.all()],
+            }
+            for route in missing
+        )
+        cache.update(zip(
+            (route.pk for route in missing),
+            _render_all(ROUTE_TEMPLATE, contexts),
+        ))
+    return [cache[route.pk] for route in routes]
+
+
+def route_groups(routes, modes):
+    """
+    [(mode, [rendered row, ...]), ...] for the routes page.
+    """
+    rows = dict(zip((route.pk for route in routes), route_rows(routes)))
+    return [
+        (mode, [rows[route.pk] for route in mode_routes])
+        for mode, mode_routes in group_by_mode(routes, modes)
+    ]
+
+
+def status_groups(snapshot):
+    """
+    [(mode name, mode slug, [rendered row, ...]), ...] for snapshot rows
+    in their (mode first) order.
+    """
+    cache = _cache("statuses")
+    missing = [row for row in snapshot if (row.pk, row.updated_at) not in cache]
+    cache.update(zip(
+        ((row.pk, row.updated_at) for row in missing),
+        _render_all(STATUS_TEMPLATE, ({"row": row} for row in missing)),
+    ))
+
+    groups = []
+    for row in snapshot:
+        if not groups or groups[-1][0] != row.mode_name:
+            groups.append((row.mode_name, row.mode_slug, []))
+        groups[-1][2].append(cache[row.pk, row.updated_at])
+    return groups
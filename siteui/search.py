@@ -0,0 +1,214 @@
+"""
+In-memory route search.
+
+Every in-service route is tokenised across its service number, origin,
+destination, via and operator name. Tokens are kept in a sorted term
+list (prefix matches are a bisect range) and a trigram index (for typo
+tolerance), each term pointing at the routes and fields it came from.
+
+A query matches a route when every query word matches one of its terms
+exactly, as a prefix, or by trigram similarity; routes are ranked by the
+sum of each word's best match weighted by the field it hit.
+
+The index is built lazily per process and rebuilt when the "routes"
+version counter moves on, which route, operator and mode saves and the
+Bustimes import bump.
+"""
+
+import re
+from bisect import bisect_left
+from collections import namedtuple
+
+from . import versions
+from .models import Route
+
+VERSION_NAME = "routes"
+
+FIELD_WEIGHTS = {
+    "service": 8.0,
+    "origin": 3.0,
+    "destination": 3.0,
+    "via": 1.5,
+    "operator": 1.0,
+}
+
+EXACT, PREFIX = 1.0, 0.7
+FUZZY_THRESHOLD = 0.45
+FUZZY_WEIGHT = 0.5
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+Result = namedtuple(
+    "Result", "route_id uuid service origin destination operator mode score"
+)
+
+_local = {"version": None, "index": None}
+
+
+def tokenise(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def trigrams(term):
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class RouteSearchIndex:
+    def __init__(self, routes):
+        """
+        `routes`: (pk, uuid, service, origin, destination, via, operator
+        name, mode name) rows.
+        """
+        self.routes = {}
+        postings = {}
+        for pk, uuid, service, origin, destination, via, operator, mode in routes:
+            self.routes[pk] = (uuid, service, origin, destination, operator, mode)
+            fields = {
+                "service": service,
+                "origin": origin,
+                "destination": destination,
+                "via": via,
+                "operator": operator,
+            }
+            for field, text in fields.items():
+                weight = FIELD_WEIGHTS[field]
+                for token in tokenise(text or ""):
+                    route_weights = postings.setdefault(token, {})
+                    if weight > route_weights.get(pk, 0):
+                        route_weights[pk] = weight
+
+        self.terms = sorted(postings)
+        self.postings = [postings[term] for term in self.terms]
+
+        self.operator_terms = {
+            pk: set(tokenise(row[4])) for pk, row in self.routes.items()
+        }
+
+        self.trigrams = {}
+        self.gram_counts = []
+        for position, term in enumerate(self.terms):
+            grams = trigrams(term)
+            self.gram_counts.append(len(grams))
+            if len(term) >= 3:
+                for gram in grams:
+                    self.trigrams.setdefault(gram, []).append(position)
+
+    @classmethod
+    def from_db(cls):
+        return cls(
+            Route.objects
+            .in_service()
+            .values_list(
+                "pk",
+                "uuid",
+                "service",
+                "origin",
+                "destination",
+                "via",
+                "operator__operator_name",
+                "mode__name",
+            )
+        )
+
+    def __len__(self):
+        return len(self.routes)
+
+    def _term_matches(self, word):
+        """
+        (term position, match quality) for every term `word` can stand for.
+        """
+        matches = {}
+
+        position = bisect_left(self.terms, word)
+        while position < len(self.terms) and self.terms[position].startswith(word):
+            matches[position] = EXACT if self.terms[position] == word else PREFIX
+            position += 1
+
+        if len(word) >= 3:
+            grams = trigrams(word)
+            shared = {}
+            for gram in grams:
+                for position in self.trigrams.get(gram, ()):
+                    shared[position] = shared.get(position, 0) + 1
+            for position, count in shared.items():
+                if position in matches:
+                    continue
+                similarity = 2 * count / (len(grams) + self.gram_counts[position])
+                if similarity >= FUZZY_THRESHOLD:
+                    matches[position] = similarity * FUZZY_WEIGHT
+
+        return matches
+
+    def _word_scores(self, word):
+        scores = {}
+        for position, quality in self._term_matches(word).items():
+            for pk, weight in self.postings[position].items():
+                score = quality * weight
+                if score > scores.get(pk, 0):
+                    scores[pk] = score
+        return scores
+
+    def _operator_filter(self, operator):
+        """
+        Routes whose operator name matches every word of `operator`.
+        """
+        allowed = None
+        for word in tokenise(operator):
+            terms = {
+                self.terms[position] for position in self._term_matches(word)
+            }
+            matching = {
+                pk for pk, names in self.operator_terms.items() if names & terms
+            }
+            allowed = matching if allowed is None else allowed & matching
+        return allowed
+
+    def search(self, q="", operator="", limit=20):
+        """
+        Ranked Results for free text `q`, optionally restricted to routes
+        whose operator matches `operator`. An empty `q` lists every route
+        of the matching operators.
+        """
+        allowed = self._operator_filter(operator) if operator else None
+
+        scores = None
+        for word in tokenise(q):
+            word_scores = self._word_scores(word)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {
+                    pk: score + word_scores[pk]
+                    for pk, score in scores.items()
+                    if pk in word_scores
+                }
+            if not scores:
+                return []
+
+        if scores is None:
+            if allowed is None:
+                return []
+            scores = dict.fromkeys(allowed, 0.0)
+        elif allowed is not None:
+            scores = {pk: score for pk, score in scores.items() if pk in allowed}
+
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (-item[1], self.routes[item[0]][1]),
+        )
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [Result(pk, *self.routes[pk], score) for pk, score in ranked]
+
+
+def get_index():
+    version = versions.get(VERSION_NAME)
+    if _local["version"] != version:
+        _local["index"] = RouteSearchIndex.from_db()
+        _local["version"] = version
+    return _local["index"]
+
+
+def invalidate():
+    versions.bump(VERSION_NAME)
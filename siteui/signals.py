@@ -0,0 +1,168 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import geometry, images, incidents, live, mapdocs, pagecache, search, snapshot, status_engine
+from .models import (
+    ImageDerivatives,
+    Map,
+    Mode,
+    NetworkIncident,
+    Operator,
+    Route,
+    RouteStatus,
+    ServiceStatusType,
+    Ticket,
+    VehicleType,
+)
+
+
+# --------------------
+# Status snapshot
+# --------------------
+
+@receiver(post_save, sender=RouteStatus)
+@receiver(post_delete, sender=RouteStatus)
+def route_status_changed(sender, instance, **kwargs):
+    snapshot.rebuild_routes([instance.route_id])
+    status_engine.reschedule()
+    transaction.on_commit(live.publisher.poke)
+
+
+@receiver(post_save, sender=Route)
+def route_changed(sender, instance, **kwargs):
+    snapshot.rebuild_routes([instance.pk])
+
+
+@receiver(post_save, sender=Operator)
+def operator_changed(sender, instance, **kwargs):
+    snapshot.rebuild_routes(
+        instance.routes.values_list("pk", flat=True)
+    )
+
+
+@receiver(post_save, sender=Mode)
+def mode_changed(sender, instance, **kwargs):
+    snapshot.rebuild_routes(
+        instance.routes.values_list("pk", flat=True)
+    )
+
+
+@receiver(post_save, sender=ServiceStatusType)
+def status_type_changed(sender, instance, **kwargs):
+    snapshot.rebuild_routes(
+        RouteStatus.objects
+        .filter(status_type=instance)
+        .values_list("route_id", flat=True)
+    )
+
+
+# --------------------
+# Incident banner
+# --------------------
+
+@receiver(post_save, sender=NetworkIncident)
+@receiver(post_delete, sender=NetworkIncident)
+@receiver(m2m_changed, sender=NetworkIncident.affects_modes.through)
+@receiver(post_save, sender=ServiceStatusType)
+@receiver(post_save, sender=Mode)
+@receiver(post_delete, sender=Mode)
+def incident_banner_changed(sender, **kwargs):
+    # Bump again on commit so no other process caches a banner built
+    # from before the change under the new version
+    incidents.bump_version()
+    transaction.on_commit(incidents.bump_version)
+    transaction.on_commit(live.publisher.poke)
+
+
+# --------------------
+# Route search index
+# --------------------
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+@receiver(post_save, sender=Operator)
+@receiver(post_save, sender=Mode)
+def search_index_changed(sender, **kwargs):
+    search.invalidate()
+    transaction.on_commit(search.invalidate)
+
+
+# --------------------
+# Route geometry index
+# --------------------
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+@receiver(post_save, sender=Operator)
+def geometry_index_changed(sender, **kwargs):
+    geometry.invalidate()
+    transaction.on_commit(geometry.invalidate)
+
+
+# --------------------
+# Image derivatives
+# --------------------
+
+@receiver(pre_save, sender=Operator)
+@receiver(pre_save, sender=Map)
+def image_uploading(sender, instance, **kwargs):
+    for model, field_name in images.BREAKPOINTS:
+        if model is sender:
+            images.dedupe_upload(instance, field_name)
+
+
+@receiver(post_save, sender=Operator)
+@receiver(post_save, sender=Map)
+def image_uploaded(sender, instance, **kwargs):
+    for model, field_name in images.BREAKPOINTS:
+        if model is sender:
+            transaction.on_commit(
+                lambda field_name=field_name: images.uploaded(instance, field_name)
+            )
+
+
+# --------------------
+# Map documents
+# --------------------
+
+@receiver(pre_save, sender=Map)
+def map_document_changing(sender, instance, **kwargs):
+    mapdocs.document_changing(instance)
+
+
+@receiver(post_save, sender=Map)
+def map_document_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: mapdocs.schedule(instance))
+
+
+# --------------------
+# Page cache
+# --------------------
+
+PAGE_CACHE_MODELS = (
+    ImageDerivatives,
+    Map,
+    Mode,
+    Operator,
+    Route,
+    RouteStatus,
+    ServiceStatusType,
+    Ticket,
+    VehicleType,
+)
+
+
+def page_cache_model_changed(sender, **kwargs):
+    pagecache.invalidate_on_commit(sender)
+
+
+def route_vehicles_changed(sender, **kwargs):
+    pagecache.invalidate_on_commit(Route)
+
+
+for model in PAGE_CACHE_MODELS:
+    post_save.connect(page_cache_model_changed, sender=model)
+    post_delete.connect(page_cache_model_changed, sender=model)
+
+m2m_changed.connect(route_vehicles_changed, sender=Route.vehicles_used.through)
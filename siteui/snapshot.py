@@ -0,0 +1,101 @@
+"""
+Precomputed network status snapshot.
+
+One NetworkStatusSnapshot row exists for every route in service with a
+disruption in effect, holding everything the status page renders. Rows are rebuilt
+per route from the signal handlers in siteui.signals, so the status page
+never has to join Mode → Route → RouteStatus itself. Validity windows
+opening and closing are handled by siteui.status_engine.
+"""
+
+from django.db import transaction
+
+from . import pagecache
+from .models import NetworkStatusSnapshot, Route, RouteStatus
+
+GOOD_SERVICE = "Good service"
+
+
+def disruption_statuses(route_ids=None, at=None):
+    """
+    The worst non-good status in effect per route, as a queryset.
+    """
+    statuses = (
+        RouteStatus.objects
+        .current(at)
+        .exclude(status_type__name__iexact=GOOD_SERVICE)
+    )
+    if route_ids is not None:
+        statuses = statuses.filter(route_id__in=route_ids)
+
+    return statuses.worst_per_route().select_related("status_type")
+
+
+def _disruptions(route_ids=None, at=None):
+    return {
+        status.route_id: status
+        for status in disruption_statuses(route_ids, at)
+    }
+
+
+def _build_row(route, status):
+    return NetworkStatusSnapshot(
+        route=route,
+        route_uuid=route.uuid,
+        service=route.service,
+        mode_name=route.mode.name,
+        mode_slug=route.mode.slug,
+        operator_name=route.operator.operator_name,
+        operator_slug=route.operator.bustimes_slug,
+        display_order=route.display_order,
+        colour_hex=route.route_hex or route.operator.primary_hex,
+        status_name=status.status_type.name,
+        status_colour_hex=status.status_type.colour_hex,
+        severity=status.status_type.severity,
+        summary=status.summary,
+    )
+
+
+def rebuild_routes(route_ids, at=None):
+    """
+    Rebuild snapshot rows for the given routes only, as of `at`
+    (default: now).
+    """
+    route_ids = set(route_ids)
+    if not route_ids:
+        return
+
+    worst = _disruptions(route_ids, at)
+    routes = (
+        Route.objects
+        .in_service()
+        .filter(pk__in=worst.keys())
+        .select_related("mode", "operator")
+    )
+
+    with transaction.atomic():
+        NetworkStatusSnapshot.objects.filter(route_id__in=route_ids).delete()
+        NetworkStatusSnapshot.objects.bulk_create(
+            _build_row(route, worst[route.pk]) for route in routes
+        )
+        pagecache.invalidate_on_commit(NetworkStatusSnapshot)
+
+
+def rebuild_all(at=None):
+    """
+    Rebuild the whole snapshot from scratch, as of `at` (default: now).
+    """
+    worst = _disruptions(at=at)
+    routes = (
+        Route.objects
+        .in_service()
+        .filter(pk__in=worst.keys())
+        .select_related("mode", "operator")
+    )
+
+    with transaction.atomic():
+        NetworkStatusSnapshot.objects.all().delete()
+        NetworkStatusSnapshot.objects.bulk_create(
+            _build_row(route, worst[route.pk]) for route in routes
+        )
+        pagecache.invalidate_on_commit(NetworkStatusSnapshot)
@@ -0,0 +1,167 @@
+"""
+Time-window aware status resolution.
+
+RouteStatus rows carry a validity window (valid_from / valid_to). Rather
+than re-filtering on every request, StatusTimeline indexes the windows
+as a sequence of segments between consecutive window boundaries; the
+set of statuses in effect is constant within a segment, so "what applies
+at T" and "when does that next change" are both a single bisect.
+
+The snapshot (siteui.snapshot) is only refreshed when a boundary has
+been crossed: refresh_if_due() is a cache read until then. The
+run_status_scheduler command calls it at each transition so the
+snapshot is up to date before the next request arrives.
+"""
+
+from bisect import bisect_right
+
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from . import pagecache, snapshot
+from .models import RouteStatus
+
+NEXT_TRANSITION_KEY = "siteui:status:next-transition"
+APPLIED_AT_KEY = "siteui:status:applied-at"
+
+_MISSING = object()
+
+
+class StatusTimeline:
+    """
+    Interval index over status validity windows.
+
+    `windows` is an iterable of (status_id, route_id, valid_from, valid_to)
+    tuples; a valid_to of None means open-ended.
+    """
+
+    def __init__(self, windows):
+        windows = list(windows)
+        self.route_for = {pk: route_id for pk, route_id, _, _ in windows}
+
+        events = {}
+        for pk, _, start, end in windows:
+            events.setdefault(start, ([], []))[0].append(pk)
+            if end is not None:
+                events.setdefault(end, ([], []))[1].append(pk)
+
+        # boundaries[i] opens segments[i], which lasts until boundaries[i + 1]
+        self.boundaries = sorted(events)
+        self.segments = []
+
+        active = set()
+        for boundary in self.boundaries:
+            opening, closing = events[boundary]
+            active.update(opening)
+            active.difference_update(closing)
+            self.segments.append(frozenset(active))
+
+    @classmethod
+    def from_db(cls):
+        return cls(
+            RouteStatus.objects
+            .filter(is_active=True)
+            .values_list("pk", "route_id", "valid_from", "valid_to")
+        )
+
+    def active_at(self, at):
+        """
+        IDs of the statuses in effect at `at`.
+        """
+        index = bisect_right(self.boundaries, at)
+        if index == 0:
+            return frozenset()
+        return self.segments[index - 1]
+
+    def next_transition(self, after):
+        """
+        First moment strictly after `after` when the effective set changes.
+        """
+        index = bisect_right(self.boundaries, after)
+        if index == len(self.boundaries):
+            return None
+        return self.boundaries[index]
+
+    def routes_changed(self, since, at):
+        """
+        Routes whose effective statuses differ between `since` and `at`.
+        """
+        changed = self.active_at(since) ^ self.active_at(at)
+        return {self.route_for[pk] for pk in changed}
+
+
+def next_transition(after):
+    """
+    StatusTimeline.from_db().next_transition(after), as one aggregate
+    over the active windows (siteui_status_window_idx) rather than a
+    load of every active status.
+    """
+    found = RouteStatus.objects.filter(is_active=True).aggregate(
+        start=Min("valid_from", filter=Q(valid_from__gt=after)),
+        end=Min("valid_to", filter=Q(valid_to__gt=after)),
+    )
+    boundaries = [when for when in found.values() if when is not None]
+    return min(boundaries, default=None)
+
+
+def apply_transitions(now=None):
+    """
+    Bring the snapshot up to date for `now` and schedule the next refresh.
+
+    Only routes whose windows opened or closed since the last refresh are
+    rebuilt; without a previous refresh the whole snapshot is rebuilt.
+    """
+    now = now or timezone.now()
+    timeline = StatusTimeline.from_db()
+
+    applied_at = cache.get(APPLIED_AT_KEY)
+    if applied_at is None:
+        snapshot.rebuild_all(now)
+        pagecache.invalidate(RouteStatus)
+    else:
+        changed = timeline.routes_changed(applied_at, now)
+        snapshot.rebuild_routes(changed, now)
+        if changed:
+            # Statuses shown on cached pages have come into or out of effect
+            pagecache.invalidate(RouteStatus)
+
+    next_transition = timeline.next_transition(now)
+    cache.set_many(
+        {
+            APPLIED_AT_KEY: now,
+            NEXT_TRANSITION_KEY: next_transition,
+        },
+        timeout=None,
+    )
+    return next_transition
+
+
+def refresh_if_due(now=None):
+    """
+    Apply pending transitions if a window boundary has been crossed.
+
+    Costs a single cache read while nothing is due.
+    """
+    now = now or timezone.now()
+    due = cache.get(NEXT_TRANSITION_KEY, _MISSING)
+    if due is not _MISSING and (due is None or due > now):
+        return False
+
+    apply_transitions(now)
+    return True
+
+
+def reschedule(now=None):
+    """
+    Recompute the next transition after a status was edited.
+
+    The edited route itself is rebuilt by the signal handler, so only the
+    schedule needs updating unless a transition was already due. Called
+    on every status save, so it costs one aggregate query.
+    """
+    now = now or timezone.now()
+    if refresh_if_due(now):
+        return
+
+    cache.set(NEXT_TRANSITION_KEY, next_transition(now), timeout=None)
@@ -0,0 +1,32 @@
+"""
+{% bundle %}: a stylesheet or script bundle from siteui.assets.BUNDLES.
+
+    {% load assets %}
+    {% bundle "css/site.min.css" %}
+
+Links the built, content-hashed bundle once collectstatic has made it,
+and each of its sources otherwise.
+"""
+
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from siteui import assets
+
+register = template.Library()
+
+
+@register.simple_tag
+def bundle(name):
+    if name not in assets.BUNDLES:
+        raise template.TemplateSyntaxError(
+            f"Bundle {name!r} is not declared in siteui.assets.BUNDLES"
+        )
+
+    paths = [name] if assets.is_built(name) else assets.BUNDLES[name]
+    if name.endswith(".css"):
+        html = '<link rel="stylesheet" href="{}">'
+    else:
+        html = '<script src="{}" defer></script>'
+    return format_html_join("\n  ", html, ((static(path),) for path in paths))
@@ -0,0 +1,44 @@
+"""
+{% picture %}: an image with its WebP/AVIF derivatives (siteui.images).
+
+    {% load images %}
+    {% picture operator.logo_circular sizes="48px" alt=operator.operator_name class="operator-logo" %}
+
+Renders a <picture> with a <source> and srcset per format, falling back
+to the original, or just the original <img> until derivatives exist.
+`sizes` tells the browser how wide the image is laid out (default
+100vw); any other keyword arguments become attributes of the <img>.
+"""
+
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from siteui import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(image, sizes="100vw", **attrs):
+    if not image:
+        return ""
+
+    sources = images.srcsets(image.name)
+    if sources is None:
+        return format_html(
+            "<img src=\"{}\"{}>",
+            image.url,
+            format_html_join("", ' {}="{}"', attrs.items()),
+        )
+
+    attrs = {"decoding": "async", **attrs}
+    return format_html(
+        "<picture>{}<img src=\"{}\"{}></picture>",
+        format_html_join(
+            "",
+            '<source type="image/{}" srcset="{}" sizes="{}">',
+            ((image_format, srcset, sizes) for image_format, srcset in sources),
+        ),
+        image.url,
+        format_html_join("", ' {}="{}"', attrs.items()),
+    )
@@ -0,0 +1,66 @@
+"""
+{% cachefragment %}: template fragments cached by siteui.pagecache.
+
+    {% load pagecache %}
+    {% cachefragment "route-tickets" route.operator_id %}
+      ...
+    {% endcachefragment %}
+
+The fragment name must be declared in pagecache.FRAGMENTS along with the
+models it is built from; any further arguments are values the fragment
+varies on. A fragment the view already looked up (a `fragments` context
+variable from pagecache.lookup_fragments) is not looked up again.
+"""
+
+from django import template
+
+from siteui import pagecache
+
+register = template.Library()
+
+
+class CacheFragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        found = context.get("fragments", {}).get(self.name)
+        if found is None:
+            found = pagecache.lookup_fragment(
+                self.name,
+                *(value.resolve(context) for value in self.vary_on),
+            )
+
+        key, content = found
+        if content is not None:
+            return content
+
+        content = self.nodelist.render(context)
+        pagecache.get_cache().set(key, content, timeout=pagecache.DEFAULT_TIMEOUT)
+        return content
+
+
+@register.tag
+def cachefragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            "cachefragment takes a fragment name and optional vary-on values"
+        )
+
+    name = bits[1].strip("\"'")
+    if name not in pagecache.FRAGMENTS:
+        raise template.TemplateSyntaxError(
+            f"Fragment {name!r} is not declared in siteui.pagecache.FRAGMENTS"
+        )
+
+    nodelist = parser.parse(("endcachefragment",))
+    parser.delete_first_token()
+
+    return CacheFragmentNode(
+        nodelist,
+        name,
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
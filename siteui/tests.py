@@ -1,3 +1,1994 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+
+from . import assets, benchmarks, checks, explain, geometry, images, incidents, journey, live, mapdocs, metrics, pagecache, querybudget, replicas, rows, search, status_engine, timetable_index, timetables, versions
+from .models import (
+    ImageDerivatives,
+    Map,
+    Mode,
+    NetworkIncident,
+    NetworkStatusSnapshot,
+    Operator,
+    Route,
+    RouteGeometry,
+    RouteStatus,
+    ServiceStatusType,
+    Stop,
+    StopTime,
+    Ticket,
+    Trip,
+    VehicleType,
+)
+
+
+class NetworkFixtureMixin:
+    """
+    Small network shared by the siteui tests.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bus = Mode.objects.create(name="Bus", slug="bus")
+        cls.ferry = Mode.objects.create(name="Ferry", slug="ferry")
+
+        cls.first = Operator.objects.create(
+            operator_name="First Bus",
+            bustimes_slug="fham",
+            primary_hex="#D40B8B",
+        )
+        cls.stagecoach = Operator.objects.create(
+            operator_name="Stagecoach",
+            bustimes_slug="scso",
+            primary_hex="#0019A8",
+        )
+
+        cls.route_1 = Route.objects.create(
+            service="1",
+            mode=cls.bus,
+            operator=cls.first,
+            origin="Southsea",
+            destination="Portsmouth Harbour",
+            bustimes_id=101,
+        )
+        cls.route_700 = Route.objects.create(
+            service="700",
+            mode=cls.bus,
+            operator=cls.stagecoach,
+            origin="Southsea",
+            destination="Chichester",
+            via="Havant",
+            route_hex="#FF6600",
+            bustimes_id=700,
+        )
+
+        cls.good = ServiceStatusType.objects.get(name="Good Service")
+        cls.minor = ServiceStatusType.objects.get(name="Minor Delays")
+        cls.severe = ServiceStatusType.objects.get(name="Severe Delays")
+
+    def setUp(self):
+        cache.clear()
+        pagecache.get_cache().clear()
+        # Any view going over its SITEUI_QUERY_BUDGETS entry fails the test.
+        # The tests run in one process, which shares its own counters
+        self.enterContext(override_settings(
+            SITEUI_QUERY_BUDGET_ENABLED=True,
+            SITEUI_QUERY_BUDGET_STRICT=True,
+            SITEUI_SHARED_VERSIONS=True,
+        ))
+
+    def add_status(self, route, status_type, **kwargs):
+        kwargs.setdefault("summary", f"{status_type.name} on {route.service}")
+        kwargs.setdefault("valid_from", timezone.now() - timedelta(hours=1))
+        return RouteStatus.objects.create(
+            route=route,
+            status_type=status_type,
+            **kwargs,
+        )
+
+
+class NetworkStatusSnapshotTests(NetworkFixtureMixin, TestCase):
+    def test_snapshot_holds_worst_status_per_disrupted_route(self):
+        self.add_status(self.route_1, self.minor)
+        self.add_status(self.route_1, self.severe, valid_from=timezone.now() - timedelta(days=1))
+        self.add_status(self.route_700, self.good)
+
+        rows = list(NetworkStatusSnapshot.objects.all())
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].route_id, self.route_1.pk)
+        self.assertEqual(rows[0].status_name, "Severe Delays")
+        self.assertEqual(rows[0].colour_hex, "#D40B8B")
+
+    def test_snapshot_follows_status_changes(self):
+        status = self.add_status(self.route_700, self.minor)
+        self.assertEqual(
+            NetworkStatusSnapshot.objects.get().colour_hex, "#FF6600"
+        )
+
+        status.is_active = False
+        status.save()
+        self.assertFalse(NetworkStatusSnapshot.objects.exists())
+
+        status.is_active = True
+        status.save()
+        status.delete()
+        self.assertFalse(NetworkStatusSnapshot.objects.exists())
+
+    def test_snapshot_follows_route_and_operator_changes(self):
+        self.add_status(self.route_1, self.minor)
+
+        self.first.operator_name = "First South"
+        self.first.save()
+        self.route_1.service = "1A"
+        self.route_1.save()
+
+        row = NetworkStatusSnapshot.objects.get()
+        self.assertEqual(row.operator_name, "First South")
+        self.assertEqual(row.service, "1A")
+
+    def test_status_page_is_a_single_query(self):
+        self.add_status(self.route_1, self.minor)
+        self.add_status(self.route_700, self.severe)
+
+        self.client.get(reverse("siteui:status"))  # warm the incident banner
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("siteui:status"))
+
+        self.assertContains(response, "Minor Delays")
+        self.assertContains(response, "Severe Delays")
+
+
+class StatusTimelineTests(NetworkFixtureMixin, TestCase):
+    def test_active_at_and_next_transition(self):
+        t0 = timezone.now()
+        timeline = status_engine.StatusTimeline([
+            (1, 10, t0, t0 + timedelta(hours=2)),
+            (2, 20, t0 + timedelta(hours=1), None),
+        ])
+
+        self.assertEqual(timeline.active_at(t0 - timedelta(minutes=1)), set())
+        self.assertEqual(timeline.active_at(t0), {1})
+        self.assertEqual(timeline.active_at(t0 + timedelta(hours=1)), {1, 2})
+        self.assertEqual(timeline.active_at(t0 + timedelta(hours=3)), {2})
+
+        self.assertEqual(timeline.next_transition(t0), t0 + timedelta(hours=1))
+        self.assertEqual(
+            timeline.next_transition(t0 + timedelta(hours=1)),
+            t0 + timedelta(hours=2),
+        )
+        self.assertIsNone(timeline.next_transition(t0 + timedelta(hours=2)))
+        self.assertEqual(
+            timeline.routes_changed(t0, t0 + timedelta(hours=3)), {10, 20}
+        )
+
+    def test_planned_status_activates_and_expires_on_schedule(self):
+        now = timezone.now()
+        self.add_status(
+            self.route_1,
+            self.severe,
+            valid_from=now + timedelta(hours=1),
+            valid_to=now + timedelta(hours=2),
+        )
+        self.assertFalse(NetworkStatusSnapshot.objects.exists())
+        self.assertEqual(
+            cache.get(status_engine.NEXT_TRANSITION_KEY),
+            now + timedelta(hours=1),
+        )
+
+        self.assertFalse(status_engine.refresh_if_due(now + timedelta(minutes=30)))
+        self.assertTrue(status_engine.refresh_if_due(now + timedelta(minutes=90)))
+        self.assertEqual(NetworkStatusSnapshot.objects.get().route, self.route_1)
+
+        self.assertTrue(status_engine.refresh_if_due(now + timedelta(hours=3)))
+        self.assertFalse(NetworkStatusSnapshot.objects.exists())
+        self.assertIsNone(cache.get(status_engine.NEXT_TRANSITION_KEY))
+
+
+    def test_reschedule_is_one_aggregate(self):
+        now = timezone.now()
+        self.add_status(self.route_1, self.minor, valid_to=now + timedelta(hours=3))
+        self.add_status(self.route_700, self.severe, valid_from=now + timedelta(hours=2))
+        self.add_status(
+            self.route_700, self.minor, valid_from=now + timedelta(hours=1), is_active=False
+        )
+
+        with self.assertNumQueries(1):
+            status_engine.reschedule(now)
+
+        self.assertEqual(
+            cache.get(status_engine.NEXT_TRANSITION_KEY), now + timedelta(hours=2)
+        )
+        for after in (now, now + timedelta(hours=2), now + timedelta(hours=3)):
+            self.assertEqual(
+                status_engine.next_transition(after),
+                status_engine.StatusTimeline.from_db().next_transition(after),
+            )
+
+
+class WorstStatusTests(NetworkFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_status(self.route_1, self.severe, valid_from=timezone.now() - timedelta(days=2))
+        self.add_status(self.route_1, self.minor)
+        self.add_status(self.route_700, self.good)
+        self.add_status(
+            self.route_700,
+            self.severe,
+            valid_from=timezone.now() + timedelta(days=1),
+        )
+
+    def test_worst_per_route_picks_most_severe_current_status(self):
+        with self.assertNumQueries(1):
+            worst = {
+                status.route_id: status.status_type.name
+                for status in RouteStatus.objects
+                .current()
+                .worst_per_route()
+                .select_related("status_type")
+            }
+
+        self.assertEqual(
+            worst,
+            {self.route_1.pk: "Severe Delays", self.route_700.pk: "Good Service"},
+        )
+
+    def test_annotate_worst_status(self):
+        with self.assertNumQueries(1):
+            routes = {
+                route.service: route
+                for route in Route.objects.annotate_worst_status()
+            }
+
+        self.assertEqual(routes["1"].worst_status_name, "Severe Delays")
+        self.assertEqual(routes["1"].worst_status_severity, 2)
+        self.assertEqual(routes["700"].worst_status_name, "Good Service")
+
+    def test_route_and_operator_pages_show_worst_status(self):
+        response = self.client.get(
+            reverse("siteui:route_detail", args=[self.route_1.uuid])
+        )
+        self.assertContains(response, "Severe Delays on 1")
+
+        response = self.client.get(
+            reverse("siteui:operator_detail", args=[self.first.bustimes_slug])
+        )
+        self.assertContains(response, "Severe Delays")
+
+
+class IncidentBannerTests(NetworkFixtureMixin, TestCase):
+    def add_incident(self, title, modes=(), **kwargs):
+        kwargs.setdefault("start_time", timezone.now())
+        incident = NetworkIncident.objects.create(
+            title=title,
+            description=f"{title} description",
+            status_type=self.severe,
+            **kwargs,
+        )
+        incident.affects_modes.set(modes)
+        return incident
+
+    def test_banner_is_served_from_cache_until_incidents_change(self):
+        self.add_incident("M27 closure")
+        # The status page is not page-cached, so it exercises the banner cache
+        url = reverse("siteui:status")
+
+        response = self.client.get(url)
+        self.assertContains(response, "M27 closure description")
+
+        with self.assertNumQueries(1):  # the status snapshot
+            self.client.get(url)
+
+        self.add_incident("Gosport ferry suspended", modes=[self.ferry])
+        response = self.client.get(url)
+        self.assertContains(response, "Gosport ferry suspended description")
+
+    def test_banner_scoped_by_mode(self):
+        older = timezone.now() - timedelta(hours=2)
+        network = self.add_incident("M27 closure", start_time=older)
+        ferry = self.add_incident("Gosport ferry suspended", modes=[self.ferry])
+
+        banner = incidents.get_banner()
+
+        self.assertEqual(banner.latest, ferry)
+        self.assertEqual(banner.for_mode("ferry"), ferry)
+        self.assertEqual(banner.for_mode("bus"), network)
+
+        ferry.affects_modes.clear()
+        ferry.active = False
+        ferry.save()
+
+        banner = incidents.get_banner()
+        self.assertEqual(banner.for_mode("ferry"), network)
+
+
+class FakeBustimes:
+    """
+    Local stand-in for the Bustimes services API, with limit/offset
+    pagination and ETags. `services` maps operator code to a list of
+    services.
+    """
+
+    def __init__(self, services):
+        self.services = services
+        self.requests = []
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests.append(self.path)
+                query = parse_qs(urlsplit(self.path).query)
+                items = fake.services.get(query["operator"][0], [])
+                limit = int(query.get("limit", ["100"])[0])
+                offset = int(query.get("offset", ["0"])[0])
+
+                next_url = None
+                if offset + limit < len(items):
+                    next_url = (
+                        f"{fake.url}?operator={query['operator'][0]}"
+                        f"&limit={limit}&offset={offset + limit}"
+                    )
+
+                body = json.dumps({
+                    "count": len(items),
+                    "next": next_url,
+                    "results": items[offset:offset + limit],
+                }).encode()
+                etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/services/"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def bustimes_service(pk, line_name, description):
+    return {"id": pk, "line_name": line_name, "description": description}
+
+
+class ImportBustimesRoutesTests(NetworkFixtureMixin, TestCase):
+    def import_routes(self, fake, *operators, options=()):
+        args = list(options)
+        for code, slug in operators:
+            args += ["--operator-code", code, "--operator-slug", slug]
+
+        out = StringIO()
+        call_command(
+            "import_bustimes_routes",
+            *args,
+            "--base-url", fake.url,
+            "--page-size", "2",
+            stdout=out,
+            stderr=StringIO(),
+        )
+        return out.getvalue()
+
+    def test_imports_many_operators_across_pages(self):
+        services = {
+            "FHAM": [
+                bustimes_service(101, "1", "Southsea - Gunwharf Quays"),
+                bustimes_service(102, "2", "Hilsea - Commercial Road - Southsea"),
+                bustimes_service(103, "3", "Fratton - Cosham"),
+            ],
+            "SCSO": [
+                bustimes_service(700, "700", "Southsea - Havant - Chichester"),
+            ],
+        }
+
+        with FakeBustimes(services) as fake:
+            output = self.import_routes(fake, ("FHAM", "fham"), ("SCSO", "scso"))
+
+        self.assertIn("2 created, 1 updated, 0 unchanged", output)
+        self.assertIn("0 created, 0 updated, 1 unchanged", output)
+        self.assertEqual(len(fake.requests), 3)
+
+        route = Route.objects.get(bustimes_id=102)
+        self.assertEqual(
+            (route.operator, route.origin, route.via, route.destination),
+            (self.first, "Hilsea", "Commercial Road", "Southsea"),
+        )
+        self.route_1.refresh_from_db()
+        self.assertEqual(self.route_1.destination, "Gunwharf Quays")
+
+    def test_rerun_is_conditional(self):
+        services = {"FHAM": [bustimes_service(104, "4", "Eastney - Hilsea")]}
+
+        with FakeBustimes(services) as fake:
+            self.import_routes(fake, ("FHAM", "fham"))
+            # operators, sync state, mode and an empty import transaction
+            with self.assertNumQueries(5):
+                output = self.import_routes(fake, ("FHAM", "fham"))
+
+        self.assertIn("not modified since last sync", output)
+
+    def test_unchanged_services_are_skipped_and_missing_retired(self):
+        services = {
+            "FHAM": [
+                bustimes_service(101, "1", "Southsea - Portsmouth Harbour"),
+                bustimes_service(102, "2", "Hilsea - Southsea"),
+                bustimes_service(103, "3", "Fratton - Cosham"),
+            ],
+        }
+
+        with FakeBustimes(services) as fake:
+            self.import_routes(fake, ("FHAM", "fham"))
+
+            services["FHAM"][1] = bustimes_service(102, "2", "Hilsea - Eastney")
+            del services["FHAM"][2]
+            output = self.import_routes(
+                fake, ("FHAM", "fham"), options=["--retire-missing"]
+            )
+
+        self.assertIn(
+            "0 created, 1 updated, 0 unchanged, 1 skipped, 1 retired", output
+        )
+        self.assertEqual(Route.objects.get(bustimes_id=102).destination, "Eastney")
+        self.assertTrue(Route.objects.get(bustimes_id=103).is_retired)
+        self.assertEqual(
+            set(Route.objects.in_service().values_list("bustimes_id", flat=True)),
+            {101, 102, 700},
+        )
+
+    def test_retired_routes_leave_the_status_page_and_indexes(self):
+        self.add_status(self.route_1, self.severe)
+        self.assertContains(self.client.get(reverse("siteui:status")), "Severe Delays")
+        before = versions.get_many([search.VERSION_NAME, geometry.VERSION_NAME])
+
+        services = {"FHAM": [bustimes_service(102, "2", "Hilsea - Southsea")]}
+        with FakeBustimes(services) as fake:
+            output = self.import_routes(
+                fake, ("FHAM", "fham"), options=["--retire-missing"]
+            )
+
+        self.assertIn("1 retired", output)
+        self.assertFalse(NetworkStatusSnapshot.objects.filter(route=self.route_1).exists())
+        self.assertNotContains(self.client.get(reverse("siteui:status")), "Severe Delays")
+        after = versions.get_many([search.VERSION_NAME, geometry.VERSION_NAME])
+        self.assertNotEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+
+
+GTFS_FEED = {
+    "stops.txt": (
+        "stop_id,stop_name,stop_lat,stop_lon\n"
+        "SSEA,Southsea Strand,50.7810,-1.0750\n"
+        "GUIL,Guildhall,50.7970,-1.0920\n"
+        "HARB,Portsmouth Harbour,50.7970,-1.1080\n"
+        "CHIC,Chichester Bus Station,50.8320,-0.7820\n"
+    ),
+    "calendar.txt": (
+        "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date\n"
+        "WK,1,1,1,1,1,0,0,20260101,20271231\n"
+        "SU,0,0,0,0,0,0,1,20260101,20271231\n"
+    ),
+    "routes.txt": (
+        "route_id,route_short_name\n"
+        "101,1\n"
+        "700,700\n"
+        "999,X99\n"
+    ),
+    "trips.txt": (
+        "route_id,service_id,trip_id,trip_headsign\n"
+        "101,WK,1-0800,Portsmouth Harbour\n"
+        "101,WK,1-0830,Portsmouth Harbour\n"
+        "101,SU,1-su-0900,Portsmouth Harbour\n"
+        "700,WK,700-0815,Chichester\n"
+        "999,WK,X99-0900,Nowhere\n"
+    ),
+    "stop_times.txt": (
+        "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+        "1-0800,08:00:00,08:00:00,SSEA,1\n"
+        "1-0800,08:10:00,08:11:00,GUIL,2\n"
+        "1-0800,08:20:00,08:20:00,HARB,3\n"
+        "1-0830,08:30:00,08:30:00,SSEA,1\n"
+        "1-0830,08:40:00,08:40:00,GUIL,2\n"
+        "1-0830,08:50:00,08:50:00,HARB,3\n"
+        "1-su-0900,09:00:00,09:00:00,SSEA,1\n"
+        "1-su-0900,09:20:00,09:20:00,HARB,3\n"
+        "700-0815,08:15:00,08:15:00,GUIL,1\n"
+        "700-0815,09:25:00,09:25:00,CHIC,2\n"
+        "X99-0900,09:00:00,09:00:00,SSEA,1\n"
+    ),
+}
+
+TXC_FILE = """<?xml version="1.0" encoding="UTF-8"?>
+<TransXChange xmlns="http://www.transxchange.org.uk/">
+  <StopPoints>
+    <AnnotatedStopPointRef>
+      <StopPointRef>SSEA</StopPointRef>
+      <CommonName>Southsea Strand</CommonName>
+    </AnnotatedStopPointRef>
+    <AnnotatedStopPointRef>
+      <StopPointRef>GUIL</StopPointRef>
+      <CommonName>Guildhall</CommonName>
+    </AnnotatedStopPointRef>
+    <AnnotatedStopPointRef>
+      <StopPointRef>HARB</StopPointRef>
+      <CommonName>Portsmouth Harbour</CommonName>
+    </AnnotatedStopPointRef>
+  </StopPoints>
+  <JourneyPatternSections>
+    <JourneyPatternSection id="JPS1">
+      <JourneyPatternTimingLink>
+        <From><StopPointRef>SSEA</StopPointRef></From>
+        <To><StopPointRef>GUIL</StopPointRef></To>
+        <RunTime>PT10M</RunTime>
+      </JourneyPatternTimingLink>
+      <JourneyPatternTimingLink>
+        <From><WaitTime>PT1M</WaitTime><StopPointRef>GUIL</StopPointRef></From>
+        <To><StopPointRef>HARB</StopPointRef></To>
+        <RunTime>PT9M</RunTime>
+      </JourneyPatternTimingLink>
+    </JourneyPatternSection>
+  </JourneyPatternSections>
+  <Services>
+    <Service>
+      <OperatingPeriod><StartDate>2026-01-01</StartDate></OperatingPeriod>
+      <OperatingProfile>
+        <RegularDayType><DaysOfWeek><MondayToFriday/></DaysOfWeek></RegularDayType>
+      </OperatingProfile>
+      <StandardService>
+        <JourneyPattern id="JP1">
+          <JourneyPatternSectionRefs>JPS1</JourneyPatternSectionRefs>
+        </JourneyPattern>
+      </StandardService>
+    </Service>
+  </Services>
+  <VehicleJourneys>
+    <VehicleJourney>
+      <VehicleJourneyCode>VJ1</VehicleJourneyCode>
+      <JourneyPatternRef>JP1</JourneyPatternRef>
+      <DepartureTime>08:00:00</DepartureTime>
+    </VehicleJourney>
+    <VehicleJourney>
+      <OperatingProfile>
+        <RegularDayType><DaysOfWeek><Sunday/></DaysOfWeek></RegularDayType>
+      </OperatingProfile>
+      <VehicleJourneyCode>VJ2</VehicleJourneyCode>
+      <JourneyPatternRef>JP1</JourneyPatternRef>
+      <DepartureTime>23:50:00</DepartureTime>
+    </VehicleJourney>
+  </VehicleJourneys>
+</TransXChange>
+"""
+
+
+class TimetableFixtureMixin(NetworkFixtureMixin):
+    """
+    Loads GTFS_FEED for routes 1 and 700 before each test.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+        path = os.path.join(self.tmp.name, "feed.zip")
+        with zipfile.ZipFile(path, "w") as archive:
+            for name, content in GTFS_FEED.items():
+                archive.writestr(name, content)
+        self.import_timetables(path)
+
+    def import_timetables(self, path, *args):
+        out = StringIO()
+        call_command("import_timetables", path, *args, "--chunk-size", "2", stdout=out)
+        return out.getvalue()
+
+
+class ImportTimetablesTests(TimetableFixtureMixin, TestCase):
+    def test_gtfs_feed_is_loaded_for_known_routes(self):
+        self.assertEqual(Stop.objects.count(), 4)
+        self.assertEqual(
+            set(Trip.objects.values_list("code", flat=True)),
+            {"1-0800", "1-0830", "1-su-0900", "700-0815"},
+        )
+        self.assertEqual(StopTime.objects.count(), 10)
+
+        call = StopTime.objects.get(trip__code="1-0800", stop__code="GUIL")
+        self.assertEqual((call.arrival_time, call.departure_time), (29400, 29460))
+
+    def test_reimport_replaces_trips(self):
+        path = os.path.join(self.tmp.name, "feed.zip")
+        self.import_timetables(path)
+
+        self.assertEqual(Trip.objects.count(), 4)
+        self.assertEqual(StopTime.objects.count(), 10)
+
+    def test_untimed_stops_are_interpolated(self):
+        feed = dict(GTFS_FEED)
+        feed["stop_times.txt"] = (
+            "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+            "1-su-0900,09:00:00,09:00:00,SSEA,1\n"
+            "1-su-0900,,,GUIL,2\n"
+            "1-su-0900,09:20:00,09:20:00,HARB,3\n"
+            # Untimed with no timed stop after it
+            "1-su-0900,,,CHIC,4\n"
+            "700-0815,08:15:00,08:15:00,GUIL,1\n"
+            "700-0815,09:25:00,09:25:00,CHIC,2\n"
+        )
+        path = os.path.join(self.tmp.name, "untimed.zip")
+        with zipfile.ZipFile(path, "w") as archive:
+            for name, content in feed.items():
+                archive.writestr(name, content)
+
+        output = self.import_timetables(path)
+
+        self.assertIn("1 untimed stop times skipped", output)
+        times = list(
+            StopTime.objects
+            .filter(trip__code="1-su-0900")
+            .order_by("sequence")
+            .values_list("stop__code", "arrival_time", "departure_time")
+        )
+        self.assertEqual(
+            times,
+            [("SSEA", 32400, 32400), ("GUIL", 33000, 33000), ("HARB", 33600, 33600)],
+        )
+
+    def test_transxchange_sections_are_dropped_once_read(self):
+        path = os.path.join(self.tmp.name, "route1.xml")
+        with open(path, "w") as xml:
+            xml.write(TXC_FILE)
+
+        journeys = []
+        for element in timetables._iterparse(path):
+            if timetables._local(element.tag) == "VehicleJourney":
+                journeys.append(timetables._text(element, "DepartureTime"))
+            root = element
+
+        self.assertEqual(len(journeys), 2)
+        self.assertTrue(all(journeys))
+        self.assertEqual(len(root), 0)
+
+    def test_transxchange_file(self):
+        path = os.path.join(self.tmp.name, "route1.xml")
+        with open(path, "w") as xml:
+            xml.write(TXC_FILE)
+
+        output = self.import_timetables(path, "--bustimes-id", "101")
+
+        self.assertIn("2 trips and 6 stop times", output)
+        trips = {
+            trip.code: trip
+            for trip in Trip.objects.filter(route=self.route_1).select_related("calendar")
+        }
+        self.assertEqual(set(trips), {"101:VJ1", "101:VJ2"})
+        self.assertEqual(trips["101:VJ1"].calendar.days, 31)
+        self.assertEqual(trips["101:VJ2"].calendar.days, 64)
+
+        times = list(
+            StopTime.objects
+            .filter(trip=trips["101:VJ2"])
+            .values_list("stop__code", "arrival_time", "departure_time")
+        )
+        self.assertEqual(
+            times,
+            [("SSEA", 85800, 85800), ("GUIL", 86400, 86460), ("HARB", 87000, 87000)],
+        )
+
+
+class RouteGeometryTests(TimetableFixtureMixin, TestCase):
+    def test_polyline_encoding(self):
+        points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+        encoded = geometry.encode_polyline(points)
+
+        self.assertEqual(encoded, "_p~iF~ps|U_ulLnnqC_mqNvxq`@")
+        self.assertEqual(geometry.decode_polyline(encoded), points)
+
+    def test_simplify_keeps_corners_and_drops_wiggles(self):
+        # ~1 m off a straight line north, then a turn east
+        line = [(50.80 + i * 0.001, -1.09 + (0.00001 if i % 2 else 0)) for i in range(11)]
+        line.append((50.81, -1.08))
+
+        self.assertEqual(
+            geometry.simplify(line, 5),
+            [line[0], line[-2], line[-1]],
+        )
+
+    def test_import_builds_geometry_from_stop_sequences(self):
+        self.assertEqual(RouteGeometry.objects.count(), 2 * len(geometry.LEVELS))
+
+        detailed = RouteGeometry.objects.get(route=self.route_1, level=len(geometry.LEVELS) - 1)
+        self.assertEqual(
+            sorted(geometry.decode_polyline(line) for line in detailed.lines),
+            [
+                [(50.781, -1.075), (50.797, -1.108)],
+                [(50.781, -1.075), (50.797, -1.092), (50.797, -1.108)],
+            ],
+        )
+
+    def test_gtfs_shapes_are_used_when_present(self):
+        feed = dict(GTFS_FEED)
+        feed["trips.txt"] = feed["trips.txt"].replace(
+            "trip_headsign\n", "trip_headsign,shape_id\n"
+        ).replace("700-0815,Chichester", "700-0815,Chichester,S700")
+        feed["shapes.txt"] = (
+            "shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\n"
+            "S700,50.832,-0.782,3\n"
+            "S700,50.797,-1.092,1\n"
+            "S700,50.81,-0.95,2\n"
+        )
+        path = os.path.join(self.tmp.name, "shapes.zip")
+        with zipfile.ZipFile(path, "w") as archive:
+            for name, content in feed.items():
+                archive.writestr(name, content)
+
+        self.import_timetables(path)
+
+        detailed = RouteGeometry.objects.get(route=self.route_700, level=len(geometry.LEVELS) - 1)
+        self.assertEqual(
+            [geometry.decode_polyline(line) for line in detailed.lines],
+            [[(50.797, -1.092), (50.81, -0.95), (50.832, -0.782)]],
+        )
+
+    def test_bbox_lookup_returns_routes_in_view(self):
+        url = reverse("siteui:api_route_geometry")
+
+        chichester = self.client.get(url, {"bbox": "-0.80,50.82,-0.77,50.84", "zoom": "14"}).json()
+        self.assertEqual(
+            [route["uuid"] for route in chichester["routes"]],
+            [str(self.route_700.uuid)],
+        )
+        self.assertEqual(chichester["precision"], 5)
+
+        southsea = self.client.get(url, {"bbox": "-1.11,50.78,-1.07,50.80"}).json()
+        self.assertEqual(len(southsea["routes"]), 2)
+
+        self.assertEqual(self.client.get(url, {"bbox": "1,2,3"}).status_code, 400)
+        for bbox in ("0,0,inf,1", "nan,0,1,1", "-inf,-inf,inf,inf"):
+            with self.subTest(bbox=bbox):
+                self.assertEqual(self.client.get(url, {"bbox": bbox}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"bbox": "-200,-100,200,100"}).status_code, 200)
+
+    def test_tile_clips_lines(self):
+        x, y = geometry.tile_at(50.83, -0.79, 14)
+        min_lat, min_lon, max_lat, max_lon = geometry.tile_bounds(14, x, y)
+
+        response = self.client.get(reverse("siteui:api_route_geometry_tile", args=[14, x, y]))
+
+        routes = response.json()["routes"]
+        self.assertEqual([route["service"] for route in routes], ["700"])
+        points = [point for line in routes[0]["lines"] for point in geometry.decode_polyline(line)]
+        margin = (max_lon - min_lon) * geometry.TILE_BUFFER + 1e-5
+        for lat, lon in points:
+            self.assertTrue(min_lon - margin <= lon <= max_lon + margin)
+        self.assertEqual(
+            self.client.get(reverse("siteui:api_route_geometry_tile", args=[2, 4, 0])).status_code,
+            404,
+        )
+
+
+class TimetableIndexTests(TimetableFixtureMixin, TestCase):
+    def at(self, day, hour, minute=0):
+        return timezone.make_aware(datetime(2026, 3, day, hour, minute))
+
+    def stop(self, code):
+        return Stop.objects.get(code=code).pk
+
+    def test_next_departures_respect_time_and_calendar(self):
+        index = timetable_index.get_index()
+
+        # Wednesday 4 March 2026
+        departures = index.next_departures(self.stop("GUIL"), self.at(4, 8, 5))
+        self.assertEqual(
+            [(d.when.strftime("%H:%M"), d.route_id) for d in departures],
+            [("08:11", self.route_1.pk), ("08:15", self.route_700.pk), ("08:40", self.route_1.pk)],
+        )
+
+        # Sunday 8 March: only the Sunday trip runs
+        departures = index.next_departures(self.stop("SSEA"), self.at(8, 7))
+        self.assertEqual([d.when.strftime("%H:%M") for d in departures], ["09:00"])
+
+        departures = index.next_departures(
+            self.stop("GUIL"), self.at(4, 8), route_id=self.route_700.pk
+        )
+        self.assertEqual(len(departures), 1)
+
+    def test_trips_after_midnight_belong_to_previous_service_day(self):
+        trip = Trip.objects.get(code="1-0830")
+        StopTime.objects.filter(trip=trip, stop__code="HARB").update(
+            arrival_time=25 * 3600, departure_time=25 * 3600
+        )
+        timetable_index.invalidate()
+
+        # 01:00 on Thursday is 25:00 on Wednesday's service day
+        departures = timetable_index.get_index().next_departures(
+            self.stop("HARB"), self.at(5, 0, 30)
+        )
+        self.assertEqual(departures[0].when, self.at(5, 1))
+
+    def test_route_page_lists_next_departures(self):
+        response = self.client.get(
+            reverse("siteui:route_detail", args=[self.route_1.uuid])
+        )
+        self.assertContains(response, "Next departures from Southsea Strand")
+
+
+class JourneyPlannerTests(TimetableFixtureMixin, TestCase):
+    def at(self, day, hour, minute=0):
+        return timezone.make_aware(datetime(2026, 3, day, hour, minute))
+
+    def test_earliest_arrival_with_a_change(self):
+        # Wednesday 4 March: route 1 to Guildhall, then the 700
+        legs = journey.get_planner().plan("SSEA", "CHIC", self.at(4, 7, 55))
+
+        self.assertEqual(
+            [(leg.from_stop, leg.to_stop, leg.route_id) for leg in legs],
+            [("SSEA", "GUIL", self.route_1.pk), ("GUIL", "CHIC", self.route_700.pk)],
+        )
+        self.assertEqual(legs[0].depart, self.at(4, 8))
+        self.assertEqual(legs[-1].arrive, self.at(4, 9, 25))
+
+    def test_single_ride_uses_next_running_trip(self):
+        legs = journey.get_planner().plan("SSEA", "HARB", self.at(4, 8, 1))
+        self.assertEqual(len(legs), 1)
+        self.assertEqual(legs[0].arrive, self.at(4, 8, 50))
+
+        # Sunday 8 March: only the Sunday trip runs
+        legs = journey.get_planner().plan("SSEA", "HARB", self.at(8, 7))
+        self.assertEqual(legs[0].arrive, self.at(8, 9, 20))
+
+        self.assertIsNone(journey.get_planner().plan("SSEA", "CHIC", self.at(8, 7)))
+
+    def test_walks_to_nearby_stops(self):
+        Stop.objects.create(
+            code="CHCA", name="Chichester Cathedral", latitude=50.8325, longitude=-0.7825
+        )
+        timetable_index.invalidate()
+
+        legs = journey.get_planner().plan("SSEA", "CHCA", self.at(4, 7, 55))
+
+        self.assertEqual([leg.kind for leg in legs], ["ride", "ride", "walk"])
+        self.assertEqual(legs[-1].from_stop, "CHIC")
+        self.assertGreater(legs[-1].arrive, self.at(4, 9, 25))
+        self.assertLess(legs[-1].arrive, self.at(4, 9, 30))
+
+    def test_json_endpoint(self):
+        url = reverse("siteui:journey_api")
+
+        response = self.client.get(
+            url, {"from": "SSEA", "to": "CHIC", "date": "2026-03-04", "depart": "07:55"}
+        )
+        self.assertEqual(response.status_code, 200)
+        legs = response.json()["legs"]
+        self.assertEqual([leg["route"]["service"] for leg in legs], ["1", "700"])
+        self.assertEqual(legs[1]["route"]["operator"], "Stagecoach")
+        self.assertEqual(legs[1]["arrive"], self.at(4, 9, 25).isoformat())
+
+        response = self.client.get(
+            url, {"from": "SSEA", "to": "CHIC", "date": "2026-03-08", "depart": "07:00"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(url, {"from": "SSEA", "to": "CHIC", "depart": "7pm"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_planner_page(self):
+        response = self.client.get(
+            reverse("siteui:journey"),
+            {"from": "SSEA", "to": "CHIC", "date": "2026-03-04", "depart": "07:55"},
+        )
+        self.assertContains(response, "Your journey")
+        self.assertContains(response, "Chichester Bus Station")
+        self.assertNotContains(response, "<option")
+
+    def test_stop_names_are_planned_from(self):
+        response = self.client.get(
+            reverse("siteui:journey_api"),
+            {"from": "southsea strand", "to": "CHIC", "date": "2026-03-04", "depart": "07:55"},
+        )
+        self.assertEqual(response.json()["legs"][0]["from"], "SSEA")
+
+    def test_stop_search(self):
+        url = reverse("siteui:journey_stops")
+
+        response = self.client.get(url, {"q": "chi"})
+        self.assertEqual(
+            response.json()["results"], [{"code": "CHIC", "name": "Chichester Bus Station"}]
+        )
+        self.assertEqual(self.client.get(url, {"q": "GUIL"}).json()["results"][0]["code"], "GUIL")
+        self.assertEqual(self.client.get(url, {"q": ""}).json()["results"], [])
+
+
+class RouteSearchTests(NetworkFixtureMixin, TestCase):
+    def services(self, *args, **kwargs):
+        return [result.service for result in search.get_index().search(*args, **kwargs)]
+
+    def test_ranks_service_numbers_above_places(self):
+        Route.objects.create(
+            service="X7",
+            mode=self.bus,
+            operator=self.first,
+            origin="Fareham",
+            destination="Portsmouth Harbour",
+            via="Route 700 corridor",
+            bustimes_id=7,
+        )
+
+        self.assertEqual(self.services("700"), ["700", "X7"])
+        self.assertEqual(self.services("7"), ["700", "X7"])
+        self.assertEqual(self.services("harbour"), ["1", "X7"])
+        self.assertEqual(self.services("southsea chichester"), ["700"])
+
+    def test_typos_and_operator_filter(self):
+        self.assertEqual(self.services("chichster"), ["700"])
+        self.assertEqual(self.services("southsea", "stagecoach"), ["700"])
+        self.assertEqual(self.services("", "first"), ["1"])
+        self.assertEqual(self.services("southsea", "megabus"), [])
+
+    def test_index_follows_route_changes(self):
+        self.assertEqual(self.services("gunwharf"), [])
+
+        self.route_1.destination = "Gunwharf Quays"
+        self.route_1.save()
+        self.assertEqual(self.services("gunwharf"), ["1"])
+
+        self.route_1.is_retired = True
+        self.route_1.save()
+        self.assertEqual(self.services("gunwharf"), [])
+
+    def test_routes_page_honours_query(self):
+        response = self.client.get(reverse("siteui:routes"), {"q": "chichester"})
+        self.assertEqual([route.service for route in response.context["routes"]], ["700"])
+
+        response = self.client.get(reverse("siteui:routes"), {"operator": "first"})
+        self.assertEqual([route.service for route in response.context["routes"]], ["1"])
+
+        response = self.client.get(reverse("siteui:routes"))
+        self.assertEqual(len(response.context["routes"]), 2)
+
+    def test_autocomplete_endpoint(self):
+        search.get_index()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("siteui:route_search"), {"q": "sou"})
+
+        results = response.json()["results"]
+        self.assertEqual({result["service"] for result in results}, {"1", "700"})
+        self.assertEqual(
+            results[0]["url"],
+            reverse("siteui:route_detail", args=[results[0]["uuid"]]),
+        )
+
+
+class RowRenderingTests(NetworkFixtureMixin, TestCase):
+    def test_routes_page_groups_rows_by_mode(self):
+        Route.objects.create(
+            service="FF",
+            mode=self.ferry,
+            operator=self.first,
+            origin="Portsmouth",
+            destination="Gosport",
+            bustimes_id=9001,
+        )
+
+        response = self.client.get(reverse("siteui:routes"))
+
+        groups = response.context["groups"]
+        self.assertEqual([mode for mode, _ in groups], [self.bus, self.ferry])
+        self.assertEqual([len(group_rows) for _, group_rows in groups], [2, 1])
+        self.assertIn(reverse("siteui:route_detail", args=[self.route_700.uuid]), groups[0][1][1])
+        self.assertContains(response, 'class="route-row"', count=3)
+
+    def test_rows_are_reused_until_a_dependency_changes(self):
+        self.client.get(reverse("siteui:routes"))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("siteui:routes"), {"q": "chichester"})
+        self.assertFalse(
+            [query for query in queries if "vehicles_used" in query["sql"]]
+        )
+
+        self.route_700.vehicles_used.add(VehicleType.objects.create(name="Double-deck bus"))
+        response = self.client.get(reverse("siteui:routes"), {"q": "chichester"})
+        self.assertContains(response, "Double-deck bus")
+
+    def test_status_rows_follow_snapshot_rebuilds(self):
+        self.add_status(self.route_700, self.severe)
+        self.client.get(reverse("siteui:status"))
+        status = RouteStatus.objects.get(route=self.route_700)
+        status.status_type = self.minor
+        status.save()
+
+        response = self.client.get(reverse("siteui:status"))
+
+        self.assertEqual(
+            [(name, slug, len(group_rows)) for name, slug, group_rows in response.context["groups"]],
+            [("Bus", "bus", 1)],
+        )
+        self.assertContains(response, "Minor Delays")
+        self.assertNotContains(response, "Severe Delays")
+
+
+class PageCacheTests(NetworkFixtureMixin, TestCase):
+    def test_pages_are_served_from_cache_until_a_dependency_changes(self):
+        url = reverse("siteui:fares")
+        Ticket.objects.create(
+            operator=self.stagecoach, name="Dayrider", price="5.50", duration="1 day"
+        )
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, "Dayrider")
+
+        Ticket.objects.create(
+            operator=self.stagecoach, name="Megarider", price="20.00", duration="7 days"
+        )
+        self.assertContains(self.client.get(url), "Megarider")
+
+        self.assertEqual(
+            pagecache.stats()["fares"],
+            {"hits": 1, "misses": 2, "depends_on": ["siteui.operator", "siteui.ticket"]},
+        )
+
+    def test_only_dependent_pages_are_invalidated(self):
+        maps_url = reverse("siteui:maps")
+        fares_url = reverse("siteui:fares")
+        self.client.get(maps_url)
+        self.client.get(fares_url)
+
+        self.stagecoach.primary_hex = "#000000"
+        self.stagecoach.save()
+
+        with self.assertNumQueries(0):
+            self.client.get(maps_url)
+        # Last-Modified (operator, ticket, incident) + operators + tickets
+        with self.assertNumQueries(5):
+            self.client.get(fares_url)
+
+    def test_operator_page_follows_status_windows(self):
+        url = reverse("siteui:operator_detail", args=["scso"])
+        self.add_status(
+            self.route_700,
+            self.severe,
+            valid_from=timezone.now() + timedelta(minutes=10),
+        )
+
+        self.assertNotContains(self.client.get(url), "Severe Delays")
+
+        # The status comes into effect without another save
+        with patch("django.utils.timezone.now", return_value=timezone.now() + timedelta(minutes=11)):
+            self.assertContains(self.client.get(url), "Severe Delays")
+
+    def test_route_fragments(self):
+        url = reverse("siteui:route_detail", args=[self.route_700.uuid])
+        Ticket.objects.create(
+            operator=self.stagecoach, name="Dayrider", price="5.50", duration="1 day"
+        )
+
+        self.assertContains(self.client.get(url), "Dayrider")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertContains(self.client.get(url), "Dayrider")
+
+        # Cached fragments skip the queries behind them
+        tables = " ".join(query["sql"] for query in queries.captured_queries)
+        self.assertNotIn('"siteui_ticket"', tables)
+        self.assertNotIn('"siteui_map"', tables)
+
+        stats = pagecache.stats()
+        self.assertEqual(stats["route-tickets"]["hits"], 1)
+        self.assertEqual(stats["route-maps"]["hits"], 1)
+
+        # Other operators' routes do not share the tickets fragment
+        response = self.client.get(
+            reverse("siteui:route_detail", args=[self.route_1.uuid])
+        )
+        self.assertNotContains(response, "Dayrider")
+
+    def test_counters_are_shared_between_processes(self):
+        url = reverse("siteui:fares")
+        with tempfile.TemporaryDirectory() as directory:
+            shared = {
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": directory,
+                },
+                "pages": settings.CACHES["pages"],
+            }
+            with override_settings(CACHES=shared):
+                self.client.get(url)
+                with self.assertNumQueries(0):
+                    self.client.get(url)
+
+                # A management command changing tickets under the server
+                subprocess.run(
+                    [
+                        sys.executable, "manage.py", "shell", "-v", "0", "-c",
+                        "from siteui import pagecache; from siteui.models import Ticket; "
+                        "pagecache.invalidate(Ticket)",
+                    ],
+                    cwd=settings.BASE_DIR,
+                    env={**os.environ, "TFP_CACHE_URL": f"file://{directory}"},
+                    check=True,
+                )
+
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                self.assertTrue(queries.captured_queries)
+
+    def test_per_process_counters_are_flagged(self):
+        per_process = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "pages": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://"},
+        }
+        with override_settings(CACHES=per_process):
+            self.assertEqual(
+                [warning.id for warning in checks.page_cache_counters(None)], ["siteui.W001"]
+            )
+            self.assertEqual(
+                [warning.id for warning in checks.shared_default_cache(None)], ["siteui.W002"]
+            )
+
+
+class ConditionalResponseTests(NetworkFixtureMixin, TestCase):
+    def test_unchanged_pages_return_304_without_queries(self):
+        url = reverse("siteui:routes")
+        response = self.client.get(url)
+        self.assertTrue(response.has_header("ETag"))
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_saves_change_the_validators(self):
+        url = reverse("siteui:routes")
+        first = self.client.get(url)
+
+        self.route_1.via = "Fratton"
+        self.route_1.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_last_modified_follows_updated_at_and_deletes(self):
+        url = reverse("siteui:fares")
+        first = self.client.get(url)
+
+        later = timezone.now() + timedelta(minutes=5)
+        with patch("django.utils.timezone.now", return_value=later):
+            self.stagecoach.save()
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 200)
+
+        # A delete moves no timestamp but still changes Last-Modified
+        even_later = later + timedelta(minutes=5)
+        with patch("django.utils.timezone.now", return_value=even_later):
+            Operator.objects.create(
+                operator_name="Megabus", bustimes_slug="mega", primary_hex="#000000"
+            ).delete()
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, 200)
+
+    # Budgets are sized for shared counters
+    @override_settings(SITEUI_SHARED_VERSIONS=False, SITEUI_QUERY_BUDGET_ENABLED=False)
+    def test_validators_come_from_the_data_without_shared_counters(self):
+        url = reverse("siteui:routes")
+        first = self.client.get(url)
+
+        # Routes, operators, modes, vehicle types and incidents
+        with self.assertNumQueries(5):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        # A change this process's counters never saw, as if made by another
+        later = timezone.now() + timedelta(minutes=5)
+        Route.objects.filter(pk=self.route_1.pk).update(via="Fratton", updated_at=later)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Last-Modified"], http_date(later.timestamp()))
+
+        # Deletes move no timestamp but change the row count
+        Route.objects.filter(pk=self.route_1.pk).delete()
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200
+        )
+
+    def test_status_page_honours_status_windows(self):
+        url = reverse("siteui:status")
+        self.add_status(
+            self.route_700,
+            self.severe,
+            valid_from=timezone.now() + timedelta(minutes=10),
+        )
+        first = self.client.get(url)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        with patch("django.utils.timezone.now", return_value=timezone.now() + timedelta(minutes=11)):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertContains(response, "Severe Delays")
+
+
+class AsyncViewTests(NetworkFixtureMixin, TestCase):
+    async def test_pages_render_through_asgi(self):
+        await sync_to_async(self.add_status)(self.route_700, self.severe)
+
+        response = await self.async_client.get(reverse("siteui:status"))
+        self.assertContains(response, "Severe Delays")
+
+        response = await self.async_client.get(
+            reverse("siteui:status"), headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get(
+            reverse("siteui:route_detail", args=[self.route_700.uuid])
+        )
+        self.assertContains(response, "Chichester")
+
+        response = await self.async_client.get(
+            reverse("siteui:operator_detail", args=["scso"])
+        )
+        self.assertContains(response, "Stagecoach")
+
+    async def test_missing_objects_are_404(self):
+        response = await self.async_client.get(
+            reverse("siteui:operator_detail", args=["nope"])
+        )
+        self.assertEqual(response.status_code, 404)
+
+        response = await self.async_client.get(
+            reverse("siteui:route_detail", args=[self.stagecoach.uuid])
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryBudgetTests(NetworkFixtureMixin, TestCase):
+    def grow_network(self):
+        for i in range(12):
+            route = Route.objects.create(
+                service=f"X{i}",
+                mode=self.ferry if i % 3 else self.bus,
+                operator=self.first if i % 2 else self.stagecoach,
+                origin="Gosport",
+                destination=f"Stop {i}",
+                bustimes_id=1000 + i,
+            )
+            self.add_status(route, self.minor if i % 2 else self.severe)
+        for operator in (self.first, self.stagecoach):
+            for name in ("Single", "Dayrider"):
+                Ticket.objects.create(
+                    operator=operator, name=name, price="2.00", duration="1 day"
+                )
+        # Budgets include building the incident banner
+        incident = NetworkIncident.objects.create(
+            title="Floating bridge closed",
+            description="No service",
+            status_type=self.severe,
+            start_time=timezone.now(),
+        )
+        incident.affects_modes.set([self.ferry])
+
+    def test_pages_stay_within_budget_as_the_network_grows(self):
+        self.grow_network()
+        urls = [
+            reverse("siteui:home"),
+            reverse("siteui:status"),
+            reverse("siteui:maps"),
+            reverse("siteui:fares"),
+            reverse("siteui:operators"),
+            reverse("siteui:operator_detail", args=["scso"]),
+            reverse("siteui:routes"),
+            reverse("siteui:routes") + "?q=gosport",
+            reverse("siteui:route_search") + "?q=x1",
+            reverse("siteui:route_detail", args=[self.route_700.uuid]),
+            reverse("siteui:journey"),
+            reverse("siteui:journey_stops") + "?q=guil",
+            reverse("siteui:api_status"),
+            reverse("siteui:api_routes"),
+            reverse("siteui:api_route_detail", args=[self.route_700.uuid]),
+            reverse("siteui:api_operators"),
+            reverse("siteui:api_operator_detail", args=["fham"]),
+            reverse("siteui:api_tickets"),
+            reverse("siteui:api_route_geometry") + "?bbox=-1.2,50.7,-1.0,50.9",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                pagecache.get_cache().clear()
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(SITEUI_QUERY_BUDGETS={"siteui:fares": 1})
+    def test_over_budget_view_reports_call_sites(self):
+        with self.assertRaises(querybudget.QueryBudgetExceeded) as raised:
+            self.client.get(reverse("siteui:fares"))
+
+        message = str(raised.exception)
+        self.assertIn("siteui:fares ran", message)
+        self.assertIn("siteui/fares.html:", message)
+        self.assertIn("siteui/views.py:", message)
+
+    @override_settings(SITEUI_QUERY_REPEAT_LIMIT=1)
+    def test_repeated_queries_flagged_as_n_plus_one(self):
+        recorder = querybudget.QueryRecorder(sites=True)
+        with querybudget.active(recorder):
+            for route in Route.objects.all():
+                route.operator.operator_name
+
+        problems = querybudget.violations("siteui:routes", recorder)
+        self.assertEqual(len(problems), 1)
+        self.assertIn("possible N+1", problems[0])
+        self.assertIn("siteui/tests.py:", problems[0])
+
+
+@override_settings(SITEUI_METRICS_ENABLED=True)
+class MetricsTests(NetworkFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_requests_are_timed_per_view(self):
+        self.add_status(self.route_700, self.severe)
+        self.client.get(reverse("siteui:status"))
+        self.client.get(reverse("siteui:route_detail", args=[self.route_700.uuid]))
+        self.client.get(reverse("siteui:route_detail", args=[self.route_700.uuid]))
+
+        text = self.client.get(reverse("siteui:metrics")).content.decode()
+
+        self.assertIn(
+            'siteui_request_seconds_bucket{view="siteui:status",le="+Inf"} 1', text
+        )
+        self.assertIn('siteui_request_seconds_count{view="siteui:route_detail"} 2', text)
+        self.assertIn('siteui_requests_total{view="siteui:status",status="200"} 1', text)
+        # Second render of each fragment was a hit
+        self.assertIn(
+            'siteui_page_cache_total{view="siteui:route_detail",outcome="hits"} 2', text
+        )
+
+        rows = {row["view"]: row for row in metrics.registry.summary()}
+        status = rows["siteui:status"]
+        self.assertGreater(status["queries"], 0)
+        self.assertGreater(status["template_ms"], 0)
+        self.assertGreater(status["context_processor_ms"], 0)
+        self.assertLessEqual(status["sql_ms"] + status["template_ms"], status["mean_ms"])
+
+    @override_settings(SITEUI_METRICS_ENABLED=False)
+    def test_disabled_records_nothing(self):
+        self.client.get(reverse("siteui:status"))
+
+        self.assertEqual(self.client.get(reverse("siteui:metrics")).status_code, 404)
+        self.assertEqual(metrics.registry.summary(), [])
+
+    def test_dashboard_is_staff_only(self):
+        self.client.get(reverse("siteui:status"))
+        url = reverse("metrics_dashboard")
+
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        staff = User.objects.create_user("ops", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url)
+        self.assertContains(response, "siteui:status")
+
+    def test_histogram_quantiles(self):
+        histogram = metrics.Histogram(metrics.SECONDS_BUCKETS)
+        for value in [0.002] * 90 + [0.2] * 10:
+            histogram.observe(value)
+
+        self.assertLessEqual(histogram.quantile(0.5), 0.0025)
+        self.assertGreater(histogram.quantile(0.95), 0.1)
+
+
+class BenchmarkTests(NetworkFixtureMixin, TestCase):
+    def test_views_suite_covers_every_url(self):
+        seeded = {
+            "routes": [self.route_1, self.route_700],
+            "operators": [self.first],
+            "maps": [
+                Map.objects.create(
+                    title="Network", path="/m.pdf", hex_colour="#000000", slug="network"
+                )
+            ],
+            "stop_codes": ["A", "B"],
+        }
+
+        found = benchmarks.view_urls(seeded)
+
+        self.assertIn("route_detail", found)
+        self.assertNotIn("status_stream", found)
+
+    def test_every_suite_runs_back_to_back(self):
+        # In a process of its own: each suite creates and destroys its
+        # own test database
+        result = subprocess.run(
+            [sys.executable, "manage.py", "benchmark", "--scale", "0.005", "--repeat", "2"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        for name in benchmarks.SUITES:
+            self.assertIn(f"{name}: {{", result.stdout)
+
+    def test_compare_reports_changes_above_threshold(self):
+        old = {"views": {"status": {"p50_us": 100.0, "p95_us": 200.0}, "routes": 10}}
+        new = {"views": {"status": {"p50_us": 150.0, "p95_us": 205.0}, "routes": 10}}
+
+        self.assertEqual(
+            benchmarks.compare(old, new),
+            [("views.status.p50_us", 100.0, 150.0)],
+        )
+
+
+class ExplainTests(NetworkFixtureMixin, TestCase):
+    def test_full_scans_ignores_index_scans_and_subqueries(self):
+        plan = "\n".join([
+            "SCAN siteui_route",
+            "SCAN siteui_mode USING INDEX sqlite_autoindex_siteui_mode_1",
+            "SCAN siteui_ticket USING COVERING INDEX siteui_ticket_operator_idx",
+            "SCAN (subquery-3)",
+            "SCAN qualify",
+        ])
+
+        self.assertEqual(explain.full_scans(plan), ["siteui_route"])
+
+    def test_command_explains_every_hot_query(self):
+        out = StringIO()
+
+        call_command("explain_queries", stdout=out)
+
+        for query in explain.HOT_QUERIES:
+            self.assertIn(f"{query.name}: ", out.getvalue())
+
+
+class RecordingReplicaRouter(replicas.ReplicaRouter):
+    # Records where reads would go, but reads from the one test database
+    choices = []
+
+    def db_for_read(self, model, **hints):
+        self.choices.append(super().db_for_read(model, **hints))
+        return replicas.PRIMARY
+
+
+@override_settings(DATABASE_ROUTERS=["siteui.tests.RecordingReplicaRouter"])
+class ReplicaRoutingTests(NetworkFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        RecordingReplicaRouter.choices = []
+
+    def test_siteui_pages_read_from_the_replica(self):
+        self.client.get(reverse("siteui:routes"))
+        self.client.get(reverse("siteui:api_routes"))
+
+        self.assertEqual(set(RecordingReplicaRouter.choices), {replicas.REPLICA})
+
+    def test_admin_reads_from_the_primary(self):
+        staff = User.objects.create_superuser("ops", password="pw")
+        self.client.force_login(staff)
+        RecordingReplicaRouter.choices = []
+
+        self.client.get(reverse("admin:siteui_route_changelist"))
+
+        self.assertTrue(RecordingReplicaRouter.choices)
+        self.assertEqual(set(RecordingReplicaRouter.choices), {replicas.PRIMARY})
+
+    def test_reads_use_the_primary_while_the_replica_may_lag(self):
+        # Another process changes a ticket: a replica may not have it yet
+        Ticket.objects.create(operator=self.first, name="Day", price="5.00", duration="1 day")
+        self.client.get(reverse("siteui:fares"))
+        self.assertEqual(set(RecordingReplicaRouter.choices), {replicas.PRIMARY})
+
+        # Once the lag has passed, reads go back to the replica
+        changed = cache.get(versions.CHANGED_KEY)
+        cache.set(versions.CHANGED_KEY, changed - settings.SITEUI_REPLICA_LAG)
+        RecordingReplicaRouter.choices = []
+        self.client.get(reverse("siteui:fares") + "?again")
+        self.assertEqual(set(RecordingReplicaRouter.choices), {replicas.REPLICA})
+
+    def test_reads_after_a_write_use_the_primary(self):
+        router = replicas.ReplicaRouter()
+
+        with replicas.reading():
+            self.assertEqual(router.db_for_read(Route), replicas.REPLICA)
+            self.assertEqual(router.db_for_write(Route), replicas.PRIMARY)
+            self.assertEqual(router.db_for_read(Route), replicas.PRIMARY)
+        self.assertEqual(router.db_for_read(Route), replicas.PRIMARY)
+
+
+def png(width, height, colour="#D40B8B"):
+    output = io.BytesIO()
+    Image.new("RGBA", (width, height), colour).save(output, "PNG")
+    return output.getvalue()
+
+
+class ImageDerivativeTests(NetworkFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media, SITEUI_IMAGE_WORKERS=0))
+
+    def upload(self, operator, data, name="logo.png"):
+        with self.captureOnCommitCallbacks(execute=True):
+            operator.logo_circular = SimpleUploadedFile(name, data, content_type="image/png")
+            operator.save()
+        operator.refresh_from_db()
+        return operator.logo_circular.name
+
+    def test_upload_makes_variants_at_breakpoints(self):
+        name = self.upload(self.first, png(200, 100))
+
+        derivatives = ImageDerivatives.objects.get(original=name)
+        # 256 is wider than the original, so skipped
+        self.assertEqual(
+            {(v["format"], v["width"]) for v in derivatives.variants},
+            {(f, w) for f in images.supported_formats() for w in (64, 128)},
+        )
+        for variant in derivatives.variants:
+            self.assertTrue(default_storage.exists(variant["name"]))
+
+    def test_identical_upload_reuses_the_stored_original(self):
+        first = self.upload(self.first, png(120, 120))
+        second = self.upload(self.stagecoach, png(120, 120), name="logo_again.png")
+
+        self.assertEqual(first, second)
+        self.assertEqual(ImageDerivatives.objects.count(), 1)
+
+    def test_identical_upload_before_rendering_reuses_the_original(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            self.first.logo_circular = SimpleUploadedFile("logo.png", png(120, 120))
+            self.first.save()
+            self.stagecoach.logo_circular = SimpleUploadedFile("logo_again.png", png(120, 120))
+            self.stagecoach.save()
+
+        self.first.refresh_from_db()
+        self.stagecoach.refresh_from_db()
+        self.assertEqual(self.first.logo_circular.name, self.stagecoach.logo_circular.name)
+        self.assertEqual(
+            default_storage.listdir(os.path.dirname(self.first.logo_circular.name))[1],
+            [os.path.basename(self.first.logo_circular.name)],
+        )
+        self.assertEqual(ImageDerivatives.objects.get().variants, [])
+
+    def test_image_shared_by_fields_gets_every_fields_widths(self):
+        data = png(1000, 400)
+        name = self.upload(self.first, data)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.logo_banner = SimpleUploadedFile("banner.png", data)
+            self.first.save()
+        self.first.refresh_from_db()
+
+        self.assertEqual(self.first.logo_banner.name, name)
+        self.assertEqual(
+            {v["width"] for v in ImageDerivatives.objects.get().variants},
+            {64, 128, 256, 480, 960},
+        )
+
+    def test_picture_tag_emits_srcset_per_format(self):
+        self.upload(self.first, png(300, 300))
+        template = Template(
+            '{% load images %}{% picture image sizes="32px" alt="First" %}'
+        )
+
+        html = template.render(Context({"image": self.first.logo_circular}))
+
+        self.assertIn('<source type="image/webp" srcset="', html)
+        self.assertIn(" 64w, ", html)
+        self.assertIn('sizes="32px"', html)
+        self.assertIn(f'src="{self.first.logo_circular.url}" decoding="async" alt="First"', html)
+
+    def test_backfill_repoints_duplicates(self):
+        original = default_storage.save("operators/logos/circular/first.png", io.BytesIO(png(96, 96)))
+        duplicate = default_storage.save("operators/logos/circular/first_x.png", io.BytesIO(png(96, 96)))
+        Operator.objects.filter(pk=self.first.pk).update(logo_circular=original)
+        Operator.objects.filter(pk=self.stagecoach.pk).update(logo_circular=duplicate)
+
+        call_command("generate_image_derivatives", stdout=StringIO())
+
+        self.stagecoach.refresh_from_db()
+        self.assertEqual(self.stagecoach.logo_circular.name, original)
+        self.assertEqual(ImageDerivatives.objects.get().original, original)
+
+
+class MapDocumentTests(NetworkFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media, SITEUI_IMAGE_WORKERS=0))
+
+    def add_map(self, name, data, render=True):
+        with self.captureOnCommitCallbacks(execute=render):
+            map_obj = Map.objects.create(
+                title="Network map",
+                path="https://example.com/network.pdf",
+                document=SimpleUploadedFile(name, data),
+                hex_colour="#0019A8",
+                slug="network",
+            )
+        map_obj.refresh_from_db()
+        return map_obj
+
+    def test_document_answers_range_requests(self):
+        data = bytes(range(256)) * 4
+        self.add_map("network.pdf", data, render=False)
+        url = reverse("siteui:map_document", args=["network"])
+
+        whole = self.client.get(url)
+        self.assertEqual(whole["Accept-Ranges"], "bytes")
+        self.assertEqual(b"".join(whole.streaming_content), data)
+
+        part = self.client.get(url, headers={"Range": "bytes=100-199"})
+        self.assertEqual(part.status_code, 206)
+        self.assertEqual(part["Content-Range"], "bytes 100-199/1024")
+        self.assertEqual(part["Content-Length"], "100")
+        self.assertEqual(b"".join(part.streaming_content), data[100:200])
+
+        tail = self.client.get(url, headers={"Range": "bytes=-24"})
+        self.assertEqual(b"".join(tail.streaming_content), data[-24:])
+
+        outside = self.client.get(url, headers={"Range": "bytes=2000-"})
+        self.assertEqual(outside.status_code, 416)
+        self.assertEqual(outside["Content-Range"], "bytes */1024")
+
+        stale = self.client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+        self.assertEqual(stale.status_code, 200)
+
+    def test_upload_renders_preview_and_tiles(self):
+        map_obj = self.add_map("network.png", png(600, 300))
+
+        self.assertEqual((map_obj.raster_width, map_obj.raster_height), (600, 300))
+        self.assertTrue(map_obj.preview_image.name.endswith("/preview.png"))
+        # Three levels: 600px, 300px and 150px wide
+        response = self.client.get(
+            reverse("siteui:map_tile", args=[map_obj.document_sha256, 2, 2, 1])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertEqual(response["Cache-Control"], assets.IMMUTABLE)
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as tile:
+            self.assertEqual(tile.size, (600 - 512, 300 - 256))
+        self.assertEqual(
+            self.client.get(
+                reverse("siteui:map_tile", args=[map_obj.document_sha256, 0, 1, 0])
+            ).status_code,
+            404,
+        )
+
+        page = self.client.get(reverse("siteui:map_detail", args=["network"]))
+        self.assertContains(page, 'data-map-levels="2"')
+        self.assertContains(page, f"/maps/tiles/{map_obj.document_sha256}/{{z}}/{{x}}/{{y}}.webp")
+
+    def test_replacing_the_document_renders_it_again(self):
+        map_obj = self.add_map("network.png", png(300, 300))
+        first = map_obj.document_sha256
+
+        with self.captureOnCommitCallbacks(execute=True):
+            map_obj.document = SimpleUploadedFile("network.png", png(300, 300, "#0019A8"))
+            map_obj.save()
+        map_obj.refresh_from_db()
+
+        self.assertNotEqual(map_obj.document_sha256, first)
+        self.assertEqual(map_obj.raster_width, 300)
+
+    @skipUnless(mapdocs.pypdfium2, "pypdfium2 is not installed")
+    def test_pdf_first_page_is_rasterised(self):
+        with open(settings.BASE_DIR / "media" / "maps" / "swr_routes.pdf", "rb") as file:
+            map_obj = self.add_map("swr_routes.pdf", file.read())
+
+        self.assertGreater(map_obj.raster_width, mapdocs.TILE_SIZE)
+
+
+class StaticAssetTests(NetworkFixtureMixin, TestCase):
+    def collectstatic(self):
+        root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(STATIC_ROOT=root))
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def test_sources_are_linked_until_built(self):
+        html = self.client.get(reverse("siteui:status")).content.decode()
+
+        self.assertIn('href="/static/css/main.css"', html)
+        self.assertIn('href="/static/css/status.css"', html)
+        self.assertNotIn("<style>", html)
+
+    def test_templates_have_no_inline_scripts_or_styles(self):
+        for path in (settings.BASE_DIR / "templates").rglob("*.html"):
+            with self.subTest(template=path.name):
+                source = path.read_text()
+                self.assertIsNone(re.search(r"<script(?![^>]*\bsrc=)", source))
+                self.assertNotIn("<style", source)
+
+    def test_built_bundle_is_served_hashed_compressed_and_immutable(self):
+        self.collectstatic()
+
+        html = self.client.get(reverse("siteui:home")).content.decode()
+        self.assertNotIn("/static/css/main.css", html)
+        url = re.search(r'href="(/static/css/site\.min\.\w+\.css)"', html).group(1)
+        self.assertIn("/static/css/home.min.", html)
+
+        response = self.client.get(url, headers={"accept-encoding": "gzip, deflate"})
+        body = gzip.decompress(b"".join(response.streaming_content)).decode()
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertEqual(response["Cache-Control"], assets.IMMUTABLE)
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertIn(".all-good-banner{", body)
+
+        unhashed = self.client.get("/static/css/main.css")
+        self.assertEqual(unhashed["Cache-Control"], assets.SHORT_LIVED)
+        unhashed.close()
+
+
+class ApiTests(NetworkFixtureMixin, TestCase):
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(name, args=args), params)
+
+    def test_routes_are_cursor_paginated(self):
+        for number in range(5):
+            Route.objects.create(
+                service=f"X{number}",
+                mode=self.bus,
+                operator=self.first,
+                origin="Fareham",
+                destination="Gosport",
+                bustimes_id=900 + number,
+                display_order=number,
+            )
+
+        seen = []
+        url = reverse("siteui:api_routes") + "?limit=3&fields=service,status"
+        while url:
+            data = self.client.get(url).json()
+            seen += [route["service"] for route in data["results"]]
+            url = data["next"]
+
+        self.assertEqual(seen, ["X0", "X1", "X2", "X3", "X4", "1", "700"])
+        self.assertEqual(set(data["results"][0]), {"service", "status"})
+
+    def test_field_selection_and_errors(self):
+        self.add_status(self.route_700, self.severe)
+
+        data = self.get("siteui:api_routes", fields="service,colour,status").json()
+        self.assertIn(
+            {"service": "700", "colour": "#FF6600", "status": "Severe Delays"},
+            data["results"],
+        )
+        self.assertIn(
+            {"service": "1", "colour": "#D40B8B", "status": None},
+            data["results"],
+        )
+
+        self.assertEqual(self.get("siteui:api_routes", fields="colour,nope").status_code, 400)
+        self.assertEqual(self.get("siteui:api_routes", cursor="!!").status_code, 400)
+        self.assertEqual(self.get("siteui:api_routes", limit="500").status_code, 400)
+
+    def test_route_and_operator_detail(self):
+        self.add_status(self.route_700, self.minor, summary="Roadworks in Havant")
+        Ticket.objects.create(
+            operator=self.stagecoach, name="Dayrider", price="5.50", duration="1 day"
+        )
+
+        route = self.get("siteui:api_route_detail", self.route_700.uuid).json()
+        self.assertEqual(route["operator"], "scso")
+        self.assertEqual(route["statuses"][0]["summary"], "Roadworks in Havant")
+
+        operator = self.get("siteui:api_operator_detail", "scso").json()
+        self.assertEqual(operator["name"], "Stagecoach")
+        self.assertEqual([r["service"] for r in operator["routes"]], ["700"])
+        self.assertEqual(operator["tickets"][0]["price"], "5.50")
+
+        response = self.get("siteui:api_operator_detail", "nope")
+        self.assertEqual(response.status_code, 404)
+
+    def test_status_grouped_by_mode_and_operator(self):
+        self.add_status(self.route_700, self.severe)
+        self.add_status(self.route_1, self.minor)
+
+        data = self.get("siteui:api_status", fields="service,status").json()
+
+        self.assertEqual(len(data["modes"]), 1)
+        self.assertEqual(data["modes"][0]["slug"], "bus")
+        self.assertEqual(
+            data["modes"][0]["operators"],
+            [
+                {
+                    "name": "First Bus",
+                    "slug": "fham",
+                    "routes": [{"service": "1", "status": "Minor Delays"}],
+                },
+                {
+                    "name": "Stagecoach",
+                    "slug": "scso",
+                    "routes": [{"service": "700", "status": "Severe Delays"}],
+                },
+            ],
+        )
+
+    def test_status_filtered_by_operator(self):
+        self.add_status(self.route_700, self.severe)
+        self.add_status(self.route_1, self.minor)
+
+        data = self.get("siteui:api_status", operator="scso").json()
+
+        self.assertEqual(
+            [operator["slug"] for mode in data["modes"] for operator in mode["operators"]],
+            ["scso"],
+        )
+        self.assertEqual(self.get("siteui:api_status", operator="none").json()["modes"], [])
+
+        # Renaming the operator's slug moves its snapshot rows with it
+        self.stagecoach.bustimes_slug = "stagecoach-south"
+        self.stagecoach.save()
+        data = self.get("siteui:api_status", operator="stagecoach-south").json()
+        self.assertEqual(data["modes"][0]["operators"][0]["routes"][0]["service"], "700")
+
+    def test_one_query_per_list_and_compression(self):
+        self.get("siteui:api_tickets")
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("siteui:api_routes"), HTTP_ACCEPT_ENCODING="gzip"
+            )
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data["results"]), 2)
+
+
+class LiveStatusTests(NetworkFixtureMixin, TestCase):
+    def listen(self, publisher):
+        subscription = live.Subscription()
+        publisher.subscribers.add(subscription)
+        return subscription
+
+    def drain(self, subscription):
+        messages = []
+        while not subscription.queue.empty():
+            messages.append(subscription.queue.get_nowait())
+        return messages
+
+    async def test_status_changes_are_diffed_and_fanned_out(self):
+        publisher = live.Publisher()
+        subscriptions = [self.listen(publisher) for _ in range(3)]
+        await publisher.check()  # baseline, nothing sent
+
+        status = await sync_to_async(self.add_status)(self.route_1, self.minor)
+        await publisher.check()
+        await publisher.check()  # unchanged versions: no reads, no events
+
+        messages = [self.drain(subscription) for subscription in subscriptions]
+        self.assertEqual(messages[0], messages[2])
+        self.assertEqual(len(messages[0]), 1)
+        self.assertIn(b"event: status", messages[0][0])
+        data = json.loads(messages[0][0].split(b"data: ")[1])
+        self.assertEqual(data["routes"][0]["route"], str(self.route_1.uuid))
+        self.assertEqual(data["routes"][0]["status"], "Minor Delays")
+
+        await sync_to_async(status.delete)()
+        await publisher.check()
+
+        data = json.loads(self.drain(subscriptions[0])[0].split(b"data: ")[1])
+        self.assertEqual(
+            data["routes"], [{"route": str(self.route_1.uuid), "status": None}]
+        )
+
+    def test_slow_subscriber_gets_resync_instead_of_backlog(self):
+        publisher = live.Publisher()
+        slow = self.listen(publisher)
+
+        for i in range(live.QUEUE_SIZE + 5):
+            publisher.broadcast("status", {"routes": [], "n": i})
+
+        self.assertEqual(self.drain(slow), [live.RESYNC])
+
+    async def test_reconnect_replays_missed_events(self):
+        publisher = live.Publisher()
+        for i in range(3):
+            publisher.broadcast("status", {"routes": [], "n": i})
+
+        subscription = publisher.subscribe(last_event_id=f"{publisher.epoch}-1")
+        publisher.task.cancel()
+
+        messages = self.drain(subscription)
+        self.assertEqual(len(messages), 2)
+        self.assertTrue(messages[0].startswith(f"id: {publisher.epoch}-2\n".encode()))
+
+        publisher.history.clear()
+        publisher.broadcast("status", {"routes": []})
+        stale = publisher.subscribe(last_event_id=f"{publisher.epoch}-1")
+        publisher.task.cancel()
+        self.assertEqual(self.drain(stale), [live.RESYNC])
+
+    async def test_ids_from_another_process_or_run_get_resync(self):
+        publisher = live.Publisher()
+        for i in range(3):
+            publisher.broadcast("status", {"routes": [], "n": i})
+
+        # Another worker's id, lower or higher than this one's last id
+        for last_event_id in ("0badcafe-1", "0badcafe-99", "7"):
+            subscription = publisher.subscribe(last_event_id=last_event_id)
+            publisher.task.cancel()
+            self.assertEqual(self.drain(subscription), [live.RESYNC])
+
+        # Up to date: nothing to send
+        current = publisher.subscribe(last_event_id=f"{publisher.epoch}-3")
+        publisher.task.cancel()
+        self.assertEqual(self.drain(current), [])
+
+    @override_settings(SITEUI_SHARED_VERSIONS=False)
+    async def test_changes_are_read_without_shared_counters(self):
+        publisher = live.Publisher()
+        subscription = self.listen(publisher)
+        await sync_to_async(self.add_status)(self.route_1, self.minor)
+        await publisher.check()
+
+        # Changed by another process, whose counter bump is not seen here
+        await NetworkStatusSnapshot.objects.filter(route=self.route_1).aupdate(
+            status_name="Severe Delays"
+        )
+        await publisher.check()
+
+        data = json.loads(self.drain(subscription)[0].split(b"data: ")[1])
+        self.assertEqual(data["routes"][0]["status"], "Severe Delays")
+
+    def test_status_page_marks_rows_for_live_updates(self):
+        self.add_status(self.route_700, self.severe)
+
+        response = self.client.get(reverse("siteui:status"))
+
+        self.assertContains(response, f'data-route="{self.route_700.uuid}"')
+        self.assertContains(response, reverse("siteui:status_stream"))
+
+    def test_stream_needs_asgi(self):
+        response = self.client.get(reverse("siteui:status_stream"))
+        self.assertEqual(response.status_code, 204)
@@ -0,0 +1,191 @@
+"""
+In-memory timetable index for next-departure lookups.
+
+All stop times are held in flat arrays sorted by (stop, departure time),
+with each stop owning a contiguous slice. "Next departures from stop X
+after T" is a bisect into that slice followed by a short forward scan
+that checks each trip's service calendar (weekday bitmask + date range)
+for the service day.
+
+The index is built lazily per process and rebuilt when the "timetables"
+version counter moves on, which import_timetables bumps after a load.
+"""
+
+from array import array
+from bisect import bisect_left
+from collections import Counter, namedtuple
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from . import versions
+from .models import ServiceCalendar, Stop, StopTime, Trip
+
+VERSION_NAME = "timetables"
+
+DAY = 24 * 60 * 60
+
+Departure = namedtuple("Departure", "when stop_id trip_id route_id headsign")
+
+_local = {"version": None, "index": None}
+
+
+class CalendarTable:
+    """
+    Service calendars as parallel arrays: weekday bitmask and ordinal
+    date range (0 = open-ended), addressed by position.
+    """
+
+    def __init__(self, calendars):
+        self.days = array("B")
+        self.start = array("l")
+        self.end = array("l")
+        self.positions = {}
+        for pk, days, start, end in calendars:
+            self.positions[pk] = len(self.days)
+            self.days.append(days)
+            self.start.append(start.toordinal() if start else 0)
+            self.end.append(end.toordinal() if end else 0)
+
+    def runs_on(self, position, day):
+        if not self.days[position] & (1 << day.weekday()):
+            return False
+        ordinal = day.toordinal()
+        start = self.start[position]
+        end = self.end[position]
+        return (not start or ordinal >= start) and (not end or ordinal <= end)
+
+
+class TimetableIndex:
+    def __init__(self, stop_times, trips, calendars, stops):
+        """
+        `stop_times`: (stop_id, departure_time, trip_id, sequence) rows
+        sorted by stop then departure time; `trips`: (pk, route_id,
+        calendar_id, headsign); `calendars`: (pk, days, start, end);
+        `stops`: (pk, name).
+        """
+        self.stop_names = dict(stops)
+
+        self.calendars = CalendarTable(calendars)
+        calendar_pos = self.calendars.positions
+
+        # Trips, addressed by position
+        self.trip_ids = array("q")
+        self.trip_routes = array("q")
+        self.trip_calendars = array("l")
+        self.trip_headsigns = []
+        trip_pos = {}
+        for pk, route_id, calendar_id, headsign in trips:
+            trip_pos[pk] = len(self.trip_ids)
+            self.trip_ids.append(pk)
+            self.trip_routes.append(route_id)
+            self.trip_calendars.append(calendar_pos[calendar_id])
+            self.trip_headsigns.append(headsign)
+
+        # Stop times: one contiguous, time-sorted slice per stop
+        self.departures = array("l")
+        self.departure_trips = array("l")
+        self.stop_slices = {}
+        origins = {}
+        current_stop = None
+        for stop_id, departure, trip_id, sequence in stop_times:
+            if stop_id != current_stop:
+                if current_stop is not None:
+                    self.stop_slices[current_stop] = (start_pos, len(self.departures))
+                current_stop = stop_id
+                start_pos = len(self.departures)
+            position = trip_pos[trip_id]
+            self.departures.append(departure)
+            self.departure_trips.append(position)
+
+            first = origins.get(position)
+            if first is None or sequence < first[0]:
+                origins[position] = (sequence, stop_id)
+        if current_stop is not None:
+            self.stop_slices[current_stop] = (start_pos, len(self.departures))
+
+        # Most common first stop of each route's trips
+        counts = {}
+        for position, (_, stop_id) in origins.items():
+            counts.setdefault(self.trip_routes[position], Counter())[stop_id] += 1
+        self.route_origins = {
+            route_id: counter.most_common(1)[0][0]
+            for route_id, counter in counts.items()
+        }
+
+    @classmethod
+    def from_db(cls):
+        return cls(
+            StopTime.objects
+            .order_by("stop_id", "departure_time")
+            .values_list("stop_id", "departure_time", "trip_id", "sequence")
+            .iterator(chunk_size=10000),
+            Trip.objects.values_list("pk", "route_id", "calendar_id", "headsign"),
+            ServiceCalendar.objects.values_list("pk", "days", "start_date", "end_date"),
+            Stop.objects.values_list("pk", "name"),
+        )
+
+    def __len__(self):
+        return len(self.departures)
+
+    def next_departures(self, stop_id, after=None, limit=5, route_id=None):
+        """
+        The next `limit` departures from `stop_id` at or after `after`
+        (default: now), optionally only for `route_id`.
+
+        Trips from the previous service day still running after midnight
+        (times of 24:00 or later) are included.
+        """
+        if stop_id not in self.stop_slices:
+            return []
+
+        after = timezone.localtime(after or timezone.now())
+        today = after.date()
+        seconds = after.hour * 3600 + after.minute * 60 + after.second
+        start, end = self.stop_slices[stop_id]
+
+        found = []
+        for day, offset in ((today - timedelta(days=1), DAY), (today, 0)):
+            midnight = timezone.make_aware(
+                datetime.combine(day, time()), after.tzinfo
+            )
+            position = bisect_left(self.departures, seconds + offset, start, end)
+            taken = 0
+            while position < end and taken < limit:
+                trip = self.departure_trips[position]
+                if (
+                    (route_id is None or self.trip_routes[trip] == route_id)
+                    and self.calendars.runs_on(self.trip_calendars[trip], day)
+                ):
+                    found.append(
+                        Departure(
+                            midnight + timedelta(seconds=self.departures[position]),
+                            stop_id,
+                            self.trip_ids[trip],
+                            self.trip_routes[trip],
+                            self.trip_headsigns[trip],
+                        )
+                    )
+                    taken += 1
+                position += 1
+
+        found.sort(key=lambda departure: departure.when)
+        return found[:limit]
+
+    def route_origin(self, route_id):
+        """
+        Stop most of the route's trips start from, or None.
+        """
+        return self.route_origins.get(route_id)
+
+
+def get_index():
+    version = versions.get(VERSION_NAME)
+    if _local["version"] != version:
+        _local["index"] = TimetableIndex.from_db()
+        _local["version"] = version
+    return _local["index"]
+
+
+def invalidate():
+    versions.bump(VERSION_NAME)
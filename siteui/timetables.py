@@ -0,0 +1,567 @@
+"""
+Streaming timetable ingestion from GTFS and TransXChange.
+
+Both parsers read their input incrementally (csv readers over the zip
+members, iterparse over the XML) and hand records to TimetableLoader,
+which writes them in fixed-size chunks. Memory therefore grows with the
+number of stops and trips in a feed, never with its stop times.
+
+GTFS shapes are collected per route for siteui.geometry, which the
+import_timetables command rebuilds for the routes a feed covered. They
+are read one shape at a time and kept only at the finest detail
+siteui.geometry stores, not point by point.
+"""
+
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from xml.etree.ElementTree import iterparse
+
+from . import geometry
+from .models import Route, ServiceCalendar, Stop, StopTime, Trip
+
+CHUNK_SIZE = 5000
+
+WEEKDAYS = (
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+)
+
+
+def parse_gtfs_time(value):
+    """
+    "HH:MM:SS" → seconds after midnight; hours may exceed 23. Blank
+    values (untimed stops) are for the caller to deal with.
+    """
+    hours, minutes, seconds = value.strip().split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+class LoadStats:
+    def __init__(self):
+        self.stops = 0
+        self.calendars = 0
+        self.trips = 0
+        self.stop_times = 0
+        self.skipped_trips = 0
+        self.skipped_stop_times = 0
+
+
+class TimetableLoader:
+    """
+    Chunked writer shared by the GTFS and TransXChange parsers.
+
+    Trips replace whatever was previously loaded for their routes. Stop
+    times are buffered and flushed every `chunk_size` rows.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.stats = LoadStats()
+        self.stop_ids = {}
+        self.calendar_ids = {}
+        # Route pk -> [[(lat, lon), ...], ...] from GTFS shapes
+        self.shapes = {}
+        self._stop_times = []
+        self._replaced_routes = set()
+
+    @property
+    def route_ids(self):
+        """
+        Routes whose trips this load replaced.
+        """
+        return set(self._replaced_routes)
+
+    # Stops and calendars are upserted by code, then mapped to primary keys
+
+    def load_stops(self, stops):
+        buffer = []
+        for stop in stops:
+            buffer.append(stop)
+            if len(buffer) >= self.chunk_size:
+                self._upsert_stops(buffer)
+                buffer = []
+        self._upsert_stops(buffer)
+
+    def _upsert_stops(self, stops):
+        if not stops:
+            return
+        Stop.objects.bulk_create(
+            stops,
+            update_conflicts=True,
+            unique_fields=["code"],
+            update_fields=["name", "latitude", "longitude"],
+        )
+        self.stop_ids.update(
+            Stop.objects
+            .filter(code__in=[stop.code for stop in stops])
+            .values_list("code", "pk")
+        )
+        self.stats.stops += len(stops)
+
+    def load_calendars(self, calendars):
+        calendars = list(calendars)
+        if not calendars:
+            return
+        ServiceCalendar.objects.bulk_create(
+            calendars,
+            update_conflicts=True,
+            unique_fields=["code"],
+            update_fields=["days", "start_date", "end_date"],
+        )
+        self.calendar_ids.update(
+            ServiceCalendar.objects
+            .filter(code__in=[calendar.code for calendar in calendars])
+            .values_list("code", "pk")
+        )
+        self.stats.calendars += len(calendars)
+
+    def calendar_id(self, calendar):
+        """
+        Primary key for `calendar`, creating it on first use.
+        """
+        if calendar.code not in self.calendar_ids:
+            self.load_calendars([calendar])
+        return self.calendar_ids[calendar.code]
+
+    def replace_routes(self, route_ids):
+        """
+        Drop previously loaded trips for routes this feed covers.
+        """
+        route_ids = set(route_ids) - self._replaced_routes
+        if route_ids:
+            Trip.objects.filter(route_id__in=route_ids).delete()
+            self._replaced_routes |= route_ids
+
+    def load_trips(self, trips):
+        """
+        Create trips, returning {code: pk}.
+        """
+        trips = list(trips)
+        self.replace_routes(trip.route_id for trip in trips)
+        Trip.objects.bulk_create(trips, batch_size=self.chunk_size)
+        self.stats.trips += len(trips)
+        return dict(
+            Trip.objects
+            .filter(code__in=[trip.code for trip in trips])
+            .values_list("code", "pk")
+        )
+
+    def add_stop_time(self, trip_id, stop_id, sequence, arrival, departure):
+        self._stop_times.append(
+            StopTime(
+                trip_id=trip_id,
+                stop_id=stop_id,
+                sequence=sequence,
+                arrival_time=arrival,
+                departure_time=departure,
+            )
+        )
+        if len(self._stop_times) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._stop_times:
+            StopTime.objects.bulk_create(self._stop_times)
+            self.stats.stop_times += len(self._stop_times)
+            self._stop_times = []
+
+
+# --------------------
+# GTFS
+# --------------------
+
+def _read_csv(archive, name):
+    if name not in archive.namelist():
+        return
+    with archive.open(name) as raw:
+        yield from csv.DictReader(io.TextIOWrapper(raw, encoding="utf-8-sig"))
+
+
+def _gtfs_date(value):
+    return datetime.strptime(value, "%Y%m%d").date() if value else None
+
+
+def load_gtfs(path, loader):
+    """
+    Load a GTFS zip. GTFS route_ids are matched against Route.bustimes_id;
+    trips on unknown routes are skipped.
+    """
+    with zipfile.ZipFile(path) as archive:
+        loader.load_stops(
+            Stop(
+                code=row["stop_id"],
+                name=row.get("stop_name", "")[:200],
+                latitude=float(row["stop_lat"]) if row.get("stop_lat") else None,
+                longitude=float(row["stop_lon"]) if row.get("stop_lon") else None,
+            )
+            for row in _read_csv(archive, "stops.txt")
+        )
+
+        loader.load_calendars(
+            ServiceCalendar(
+                code=row["service_id"],
+                days=sum(
+                    1 << index
+                    for index, day in enumerate(WEEKDAYS)
+                    if row.get(day) == "1"
+                ),
+                start_date=_gtfs_date(row.get("start_date")),
+                end_date=_gtfs_date(row.get("end_date")),
+            )
+            for row in _read_csv(archive, "calendar.txt")
+        )
+
+        bustimes_ids = {}
+        for row in _read_csv(archive, "routes.txt"):
+            if row["route_id"].isdigit():
+                bustimes_ids[row["route_id"]] = int(row["route_id"])
+        route_ids = dict(
+            Route.objects
+            .filter(bustimes_id__in=bustimes_ids.values())
+            .values_list("bustimes_id", "pk")
+        )
+
+        trips = []
+        trip_ids = {}
+        shape_routes = {}
+        for row in _read_csv(archive, "trips.txt"):
+            route_id = route_ids.get(bustimes_ids.get(row["route_id"]))
+            calendar_id = loader.calendar_ids.get(row["service_id"])
+            if route_id is None or calendar_id is None:
+                loader.stats.skipped_trips += 1
+                continue
+            if row.get("shape_id"):
+                shape_routes.setdefault(row["shape_id"], set()).add(route_id)
+
+            trips.append(
+                Trip(
+                    code=row["trip_id"],
+                    route_id=route_id,
+                    calendar_id=calendar_id,
+                    headsign=row.get("trip_headsign", "")[:100],
+                )
+            )
+            if len(trips) >= loader.chunk_size:
+                trip_ids.update(loader.load_trips(trips))
+                trips = []
+        trip_ids.update(loader.load_trips(trips))
+
+        stop_times = _gtfs_stop_times(_read_csv(archive, "stop_times.txt"), loader.stats)
+        for trip, stop, sequence, arrival, departure in stop_times:
+            trip_id = trip_ids.get(trip)
+            stop_id = loader.stop_ids.get(stop)
+            if trip_id is None or stop_id is None:
+                continue
+            loader.add_stop_time(trip_id, stop_id, sequence, arrival, departure)
+        loader.flush()
+
+        _load_shapes(_read_csv(archive, "shapes.txt"), shape_routes, loader)
+
+
+def _gtfs_stop_times(rows, stats):
+    """
+    (trip, stop, sequence, arrival, departure) for the rows of
+    stop_times.txt, in seconds after midnight.
+
+    GTFS allows blank times at untimed intermediate stops; they are
+    spaced evenly between the timed stops either side. That expects each
+    trip's rows together and in stop_sequence order, as feeds write them.
+    Untimed stops without a timed stop on both sides are skipped.
+    """
+    trip = previous = None
+    pending = []
+    for row in rows:
+        if row["trip_id"] != trip:
+            stats.skipped_stop_times += len(pending)
+            trip, previous, pending = row["trip_id"], None, []
+
+        sequence = int(row["stop_sequence"])
+        arrival = row.get("arrival_time", "").strip()
+        departure = row.get("departure_time", "").strip()
+        if not arrival and not departure:
+            if previous is None:
+                stats.skipped_stop_times += 1
+            else:
+                pending.append((row["stop_id"], sequence))
+            continue
+
+        arrival = parse_gtfs_time(arrival or departure)
+        departure = parse_gtfs_time(departure) if departure else arrival
+        for index, (stop, stop_sequence) in enumerate(pending, 1):
+            time = previous + (arrival - previous) * index // (len(pending) + 1)
+            yield trip, stop, stop_sequence, time, time
+        pending = []
+
+        yield trip, row["stop_id"], sequence, arrival, departure
+        previous = departure
+    stats.skipped_stop_times += len(pending)
+
+
+def _load_shapes(rows, shape_routes, loader):
+    """
+    Add the shapes used by loaded trips to loader.shapes, one shape_id
+    at a time: only the current shape's points are held, and each line
+    is kept simplified to the finest geometry level. Feeds write a
+    shape's points together; a shape_id split across the file becomes
+    one line per run of points.
+    """
+    tolerance = geometry.LEVELS[-1][1]
+
+    def add(shape_id, points):
+        points.sort()
+        line = geometry.simplify([(lat, lon) for _, lat, lon in points], tolerance)
+        for route_id in shape_routes[shape_id]:
+            loader.shapes.setdefault(route_id, []).append(line)
+
+    shape_id, points = None, []
+    for row in rows:
+        if row["shape_id"] != shape_id:
+            if points:
+                add(shape_id, points)
+            shape_id, points = row["shape_id"], []
+        if shape_id in shape_routes:
+            points.append((
+                int(row["shape_pt_sequence"]),
+                float(row["shape_pt_lat"]),
+                float(row["shape_pt_lon"]),
+            ))
+    if points:
+        add(shape_id, points)
+
+
+# --------------------
+# TransXChange
+# --------------------
+
+TXC_DAYS = {
+    "Monday": 1,
+    "Tuesday": 2,
+    "Wednesday": 4,
+    "Thursday": 8,
+    "Friday": 16,
+    "Saturday": 32,
+    "Sunday": 64,
+    "MondayToFriday": 31,
+    "MondayToSaturday": 63,
+    "MondayToSunday": 127,
+    "Weekend": 96,
+}
+
+_DURATION = re.compile(r"^PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?$")
+
+
+def parse_txc_duration(value):
+    """
+    ISO 8601 duration such as "PT1M30S" → seconds.
+    """
+    match = _DURATION.match(value.strip()) if value else None
+    if not match:
+        return 0
+    hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child(element, *path):
+    for name in path:
+        if element is None:
+            return None
+        element = next(
+            (child for child in element if _local(child.tag) == name),
+            None,
+        )
+    return element
+
+
+def _text(element, *path):
+    found = _child(element, *path)
+    return found.text.strip() if found is not None and found.text else ""
+
+
+def _days(profile):
+    """
+    Weekday bitmask from an OperatingProfile element, or None if absent.
+    """
+    days_of_week = _child(profile, "RegularDayType", "DaysOfWeek")
+    if days_of_week is None:
+        return None
+    return sum(TXC_DAYS.get(_local(day.tag), 0) for day in days_of_week)
+
+
+def _txc_calendar(days, start, end):
+    return ServiceCalendar(
+        code=f"txc:{days}:{start or ''}:{end or ''}",
+        days=days,
+        start_date=start,
+        end_date=end,
+    )
+
+
+def _iterparse(path):
+    """
+    Yield the elements of the XML file at `path` as they end, like
+    iterparse. Sections (children of the root) and their children are
+    dropped from the tree once the caller has handled them, so memory
+    stays flat however long the file is.
+    """
+    parents = []
+    for event, element in iterparse(path, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+
+        parents.pop()
+        yield element
+        if 0 < len(parents) <= 2:
+            parents[-1].remove(element)
+
+
+def load_transxchange(path, loader, bustimes_id):
+    """
+    Load a TransXChange file for the route with `bustimes_id`.
+
+    Journey pattern sections are kept (they describe the stopping pattern,
+    not individual journeys); vehicle journeys are streamed, expanded into
+    stop times and written in batches.
+    """
+    route = Route.objects.get(bustimes_id=bustimes_id)
+    loader.replace_routes([route.pk])
+
+    sections = {}   # section id → [(from, to, run seconds, wait seconds)]
+    patterns = {}   # journey pattern id → [section id, ...]
+    service_days = 127
+    service_start = service_end = None
+    stops = []
+    journeys = []
+    journey_count = 0
+
+    for element in _iterparse(path):
+        tag = _local(element.tag)
+
+        if tag in ("AnnotatedStopPointRef", "StopPoint"):
+            code = _text(element, "StopPointRef") or _text(element, "AtcoCode")
+            name = _text(element, "CommonName") or _text(element, "Descriptors", "CommonName")
+            latitude = _text(element, "Location", "Latitude") or _text(
+                element, "Place", "Location", "Translation", "Latitude"
+            )
+            longitude = _text(element, "Location", "Longitude") or _text(
+                element, "Place", "Location", "Translation", "Longitude"
+            )
+            if code:
+                stops.append(
+                    Stop(
+                        code=code,
+                        name=name[:200] or code,
+                        latitude=float(latitude) if latitude else None,
+                        longitude=float(longitude) if longitude else None,
+                    )
+                )
+
+        elif tag == "StopPoints":
+            loader.load_stops(stops)
+            stops = []
+
+        elif tag == "JourneyPatternSection":
+            sections[element.get("id")] = [
+                (
+                    _text(link, "From", "StopPointRef"),
+                    _text(link, "To", "StopPointRef"),
+                    parse_txc_duration(_text(link, "RunTime")),
+                    parse_txc_duration(_text(link, "From", "WaitTime")),
+                )
+                for link in element
+                if _local(link.tag) == "JourneyPatternTimingLink"
+            ]
+
+        elif tag == "JourneyPattern":
+            patterns[element.get("id")] = [
+                ref.text.strip()
+                for ref in element
+                if _local(ref.tag) == "JourneyPatternSectionRefs" and ref.text
+            ]
+
+        elif tag == "Service":
+            start = _text(element, "OperatingPeriod", "StartDate")
+            end = _text(element, "OperatingPeriod", "EndDate")
+            service_start = date.fromisoformat(start) if start else None
+            service_end = date.fromisoformat(end) if end else None
+            days = _days(_child(element, "OperatingProfile"))
+            if days is not None:
+                service_days = days
+
+        elif tag == "VehicleJourney":
+            journey_count += 1
+            pattern = patterns.get(_text(element, "JourneyPatternRef"))
+            departure = _text(element, "DepartureTime")
+            if pattern is None or not departure:
+                loader.stats.skipped_trips += 1
+                continue
+
+            days = _days(_child(element, "OperatingProfile"))
+            calendar_id = loader.calendar_id(
+                _txc_calendar(
+                    service_days if days is None else days,
+                    service_start,
+                    service_end,
+                )
+            )
+
+            code = _text(element, "VehicleJourneyCode") or str(journey_count)
+            journeys.append((
+                Trip(
+                    code=f"{bustimes_id}:{code}",
+                    route_id=route.pk,
+                    calendar_id=calendar_id,
+                ),
+                _calls(pattern, sections, parse_gtfs_time(departure)),
+            ))
+            if len(journeys) >= loader.chunk_size // 10:
+                _load_journeys(loader, journeys)
+                journeys = []
+
+    _load_journeys(loader, journeys)
+    loader.flush()
+
+
+def _calls(pattern, sections, departure):
+    """
+    Expand a journey pattern into [stop code, arrival, departure] calls
+    for a journey leaving its first stop at `departure`.
+    """
+    calls = []
+    clock = departure
+    for section_id in pattern:
+        for from_stop, to_stop, run, wait in sections.get(section_id, ()):
+            if not calls:
+                calls.append([from_stop, clock, clock])
+            if wait:
+                clock += wait
+                calls[-1][2] = clock
+            clock += run
+            calls.append([to_stop, clock, clock])
+    return calls
+
+
+def _load_journeys(loader, journeys):
+    if not journeys:
+        return
+
+    trip_ids = loader.load_trips(trip for trip, _ in journeys)
+    for trip, calls in journeys:
+        for sequence, (stop_code, arrival, departure) in enumerate(calls):
+            stop_id = loader.stop_ids.get(stop_code)
+            if stop_id is not None:
+                loader.add_stop_time(
+                    trip_ids[trip.code], stop_id, sequence, arrival, departure
+                )
@@ -1,7 +1,7 @@
 from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
-from . import views
+from . import api, views
 
 app_name = "siteui"
 
@@ -9,6 +9,7 @@ urlpatterns = [
     path("", views.home, name="home"),
 
     path("status/", views.status_overview, name="status"),
+    path("status/stream/", views.status_stream, name="status_stream"),
     path("maps/", views.maps, name="maps"),
     path("fares/", views.fares, name="fares"),
 
@@ -20,9 +21,31 @@ urlpatterns = [
     path("operators/<slug:slug>/", views.operator_detail, name="operator_detail"),
 
     path("routes/", views.routes, name="routes"),
+    path("routes/search/", views.route_search, name="route_search"),
     path("routes/<uuid:uuid>/", views.route_detail, name="route_detail"),
 
     path("maps/<slug:slug>/", views.map_detail, name="map_detail"),
+    path("maps/<slug:slug>/document", views.map_document, name="map_document"),
+    path("maps/tiles/<str:sha256>/<int:z>/<int:x>/<int:y>.webp", views.map_tile, name="map_tile"),
+
+    path("journey/", views.journey_planner, name="journey"),
+    path("journey/api/", views.journey_api, name="journey_api"),
+    path("journey/stops/", views.journey_stops, name="journey_stops"),
+
+    path("metrics", views.metrics_export, name="metrics"),
+
+    path("api/v1/status/", api.status, name="api_status"),
+    path("api/v1/routes/", api.routes, name="api_routes"),
+    path("api/v1/routes/<uuid:uuid>/", api.route_detail, name="api_route_detail"),
+    path("api/v1/operators/", api.operators, name="api_operators"),
+    path("api/v1/operators/<slug:slug>/", api.operator_detail, name="api_operator_detail"),
+    path("api/v1/tickets/", api.tickets, name="api_tickets"),
+    path("api/v1/geometry/", api.route_geometry, name="api_route_geometry"),
+    path(
+        "api/v1/geometry/tiles/<int:z>/<int:x>/<int:y>.json",
+        api.route_geometry_tile,
+        name="api_route_geometry_tile",
+    ),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,71 @@
+"""
+Named version counters in the shared cache.
+
+Anything cached per process (the incident banner, the timetable index)
+records the version it was built at and rebuilds when the shared counter
+moves on. bump() is called wherever the underlying data changes.
+
+The counters are only shared if the default cache is (TFP_CACHE_URL in
+settings.py); see siteui.checks. The time of the latest bump is kept
+too, so siteui.replicas can keep reads off a replica that may not have
+caught up with the change yet.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEY = "siteui:version:{name}"
+CHANGED_KEY = "siteui:version:changed"
+
+
+def _initial():
+    # Start from the clock so a counter lost from the cache never comes
+    # back with a value some process still holds locally
+    return time.time_ns()
+
+
+def shared():
+    """
+    Whether other processes see these counters (SITEUI_SHARED_VERSIONS).
+    """
+    return getattr(settings, "SITEUI_SHARED_VERSIONS", True)
+
+
+def get(name):
+    key = KEY.format(name=name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump(name):
+    key = KEY.format(name=name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial(), timeout=None)
+    cache.set(CHANGED_KEY, time.time(), timeout=None)
+
+
+def changed_within(seconds):
+    """
+    Whether any counter was bumped in the last `seconds`.
+    """
+    changed = cache.get(CHANGED_KEY)
+    return changed is not None and time.time() - changed < seconds
+
+
+def get_many(names):
+    """
+    Versions for several counters with one cache round trip.
+    """
+    keys = [KEY.format(name=name) for name in names]
+    found = cache.get_many(keys)
+    return [
+        found[key] if key in found else get(name)
+        for key, name in zip(keys, names)
+    ]
@@ -1,77 +1,114 @@
-from django.db.models import Prefetch, Q
-from django.shortcuts import get_object_or_404, redirect, render
-
+import asyncio
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_safe
+
+from . import assets, conditional, images, incidents, journey, live, mapdocs, metrics, pagecache, rows, search, status_engine, timetable_index
 from .models import (
+    ImageDerivatives,
     Map,
     Mode,
     NetworkIncident,
+    NetworkStatusSnapshot,
     Operator,
     Route,
     RouteStatus,
+    ServiceStatusType,
     Ticket,
+    VehicleType,
 )
 
 FEATURED_OPERATORS = ["Stagecoach", "First Bus"]
 
+NO_JOURNEY = "No journey found for that day."
+
+
+async def _fetch(queryset):
+    """
+    Evaluate `queryset` with the async ORM, for async views: templates
+    render inside the event loop and must not trigger queries.
+    """
+    return [obj async for obj in queryset]
+
+
+async def _nothing():
+    """
+    Stands in for a _fetch() that isn't needed, in an asyncio.gather().
+    """
+    return None
+
 
 def home(request):
     return render(request, "siteui/home.html")
 
 
-def status_overview(request):
+@conditional.conditional(
+    depends_on=[NetworkStatusSnapshot],
+    before=status_engine.refresh_if_due,
+)
+async def status_overview(request):
     """
     Single TfL-style status page:
     Mode → Operator → Route
-    """
 
-    # Only ACTIVE statuses that are NOT "Good service"
-    active_statuses = (
-        RouteStatus.objects
-        .filter(is_active=True)
-        .exclude(status_type__name__iexact="Good service")
-        .select_related("status_type")
-        .order_by("-valid_from")
-    )
-
-    routes = (
-        Route.objects
-        .select_related("mode", "operator")
-        .prefetch_related(
-            Prefetch(
-                "statuses",
-                queryset=active_statuses,
-                to_attr="active_statuses",
-            )
-        )
-        # Keep only routes that actually HAVE a non-good active status
-        .filter(statuses__in=active_statuses)
-        .distinct()
-        .order_by(
-            "mode__name",
-            "operator__operator_name",
-            "display_order",
-            "service",
-        )
-    )
-
-    modes = (
-        Mode.objects
-        .prefetch_related(
-            Prefetch("routes", queryset=routes)
-        )
-        .order_by("name")
+    Reads the precomputed snapshot (see siteui.snapshot), which only
+    holds routes with a non-good status in effect. Kiosks polling it get
+    a 304 until a disruption or incident changes.
+    """
+    snapshot, request.network_banner = await asyncio.gather(
+        _fetch(NetworkStatusSnapshot.objects.all()),
+        incidents.aget_banner(),
     )
 
     return render(
         request,
         "siteui/status.html",
         {
-            "modes": modes,
-            "routes": routes,
+            "groups": rows.status_groups(snapshot),
         },
     )
 
 
+async def status_stream(request):
+    """
+    Server-Sent Events feed of status and incident changes (see
+    siteui.live), followed by the status page to patch itself in place.
+
+    Needs an ASGI server; under WSGI it answers 204, which tells
+    EventSource not to reconnect, and the page stays as rendered.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    subscription = live.publisher.subscribe(request.headers.get("Last-Event-ID") or None)
+
+    async def events():
+        try:
+            yield f"retry: {live.RETRY_MS}\n\n".encode()
+            while True:
+                message = await subscription.next_message()
+                yield message
+                if message is live.RESYNC:
+                    break
+        finally:
+            live.publisher.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@conditional.cached_page("maps", depends_on=[Map, ImageDerivatives])
 def maps(request):
     return render(
         request,
@@ -84,14 +121,41 @@ def maps(request):
 
 def map_detail(request, slug):
     map_obj = get_object_or_404(Map, slug=slug)
-    return redirect(map_obj.path)
+    if not map_obj.document:
+        return redirect(map_obj.path)
+    return render(
+        request,
+        "siteui/map_detail.html",
+        {
+            "map": map_obj,
+            "tiles": mapdocs.tiles(map_obj),
+        },
+    )
+
+
+@require_safe
+def map_document(request, slug):
+    map_obj = get_object_or_404(Map.objects.exclude(document=""), slug=slug)
+    return mapdocs.serve_file(request, map_obj.document.name, mapdocs.DOCUMENT_CACHE_CONTROL)
 
 
+@require_safe
+def map_tile(request, sha256, z, x, y):
+    # Tiles are named by content hash, so never change
+    if not mapdocs.SHA256_RE.match(sha256):
+        raise Http404
+    return mapdocs.serve_file(
+        request, mapdocs.tile_name(sha256, z, x, y), assets.IMMUTABLE, "image/webp"
+    )
+
+
+@conditional.cached_page("fares", depends_on=[Operator, Ticket])
 def fares(request):
     operators = Operator.objects.prefetch_related("tickets").order_by("operator_name")
     return render(request, "siteui/fares.html", {"operators": operators})
 
 
+@conditional.cached_page("operators", depends_on=[Operator, ImageDerivatives])
 def operators(request):
     return render(
         request,
@@ -105,21 +169,36 @@ def stagecoach(request):
 
 
 def first(request):
-    return render(request, "siteui/operators/first.html")
+    return render(request, "siteui/operators/firstbus.html")
 
 
-def operator_detail(request, slug):
-    operator = get_object_or_404(Operator, bustimes_slug=slug)
-
-    routes = (
-        Route.objects
-        .filter(operator=operator)
-        .select_related("mode")
-        .order_by("mode__name", "display_order", "service")
+@conditional.cached_page(
+    "operator_detail",
+    depends_on=[Operator, Route, Mode, Ticket, RouteStatus, ServiceStatusType, ImageDerivatives],
+    before=status_engine.refresh_if_due,
+)
+async def operator_detail(request, slug):
+    # The image index is loaded up front so {% picture %} does not query
+    # while the template renders in the event loop
+    operator, routes, tickets, request.network_banner, _ = await asyncio.gather(
+        aget_object_or_404(Operator, bustimes_slug=slug),
+        _fetch(
+            Route.objects
+            .in_service()
+            .filter(operator__bustimes_slug=slug)
+            .select_related("mode")
+            .annotate_worst_status()
+            .order_by("mode__name", "display_order", "service")
+        ),
+        _fetch(
+            Ticket.objects
+            .filter(operator__bustimes_slug=slug)
+            .order_by("price")
+        ),
+        incidents.aget_banner(),
+        sync_to_async(images.get_index)(),
     )
 
-    tickets = Ticket.objects.filter(operator=operator).order_by("price")
-
     template = (
         operator.custom_template
         if operator.has_custom_page and operator.custom_template
@@ -137,44 +216,234 @@ def operator_detail(request, slug):
     )
 
 
+@conditional.cached_page("routes", depends_on=[Route, Operator, Mode, VehicleType])
 def routes(request):
-    routes = (
-        Route.objects
-        .select_related("mode", "operator")
-        .prefetch_related("vehicles_used")
-        .order_by("mode__name", "display_order", "service")
-    )
+    """
+    All in-service routes, or search results for the `q` / `operator`
+    parameters the home page search form sends, ranked by relevance.
+    """
+    q = request.GET.get("q", "").strip()
+    operator = request.GET.get("operator", "").strip()
 
+    routes = Route.objects.in_service().select_related("mode", "operator")
     modes = Mode.objects.all().order_by("name")
 
+    if q or operator:
+        results = search.get_index().search(q, operator, limit=None)
+        found = routes.in_bulk([result.route_id for result in results])
+        routes = [found[result.route_id] for result in results if result.route_id in found]
+        modes = modes.filter(pk__in={route.mode_id for route in routes})
+    else:
+        routes = list(routes.order_by("mode__name", "display_order", "service"))
+
     return render(
         request,
         "siteui/routes.html",
         {
             "routes": routes,
-            "modes": modes,
+            "groups": rows.route_groups(routes, modes),
+            "q": q,
+            "operator": operator,
         },
     )
 
 
-def route_detail(request, uuid):
-    route = get_object_or_404(Route, uuid=uuid)
+def route_search(request):
+    """
+    Autocomplete suggestions for the route search box, as JSON.
+    """
+    limit = request.GET.get("limit", "")
+    results = search.get_index().search(
+        request.GET.get("q", ""),
+        request.GET.get("operator", ""),
+        limit=min(int(limit), 50) if limit.isdigit() else 10,
+    )
 
-    status = (
-        RouteStatus.objects
-        .filter(route=route, is_active=True)
-        .select_related("status_type")
-        .order_by("-valid_from")
-        .first()
+    return JsonResponse({
+        "results": [
+            {
+                "uuid": str(result.uuid),
+                "service": result.service,
+                "origin": result.origin,
+                "destination": result.destination,
+                "operator": result.operator,
+                "mode": result.mode,
+                "url": reverse("siteui:route_detail", args=[result.uuid]),
+            }
+            for result in results
+        ],
+    })
+
+
+async def route_detail(request, uuid):
+    route, index, request.network_banner = await asyncio.gather(
+        aget_object_or_404(
+            Route.objects
+            .select_related("operator")
+            .annotate_worst_status(),
+            uuid=uuid,
+        ),
+        sync_to_async(timetable_index.get_index)(),
+        incidents.aget_banner(),
     )
 
+    # Maps and tickets are only queried for fragments that aren't cached
+    fragments = await sync_to_async(pagecache.lookup_fragments)({
+        "route-maps": (),
+        "route-tickets": (route.operator_id,),
+    })
+    maps, tickets = await asyncio.gather(
+        _nothing() if fragments["route-maps"][1] is not None
+        else _fetch(Map.objects.all()),
+        _nothing() if fragments["route-tickets"][1] is not None
+        else _fetch(Ticket.objects.filter(operator_id=route.operator_id).order_by("price")),
+    )
+
+    origin = index.route_origin(route.pk)
+
     return render(
         request,
         "siteui/route_detail.html",
         {
             "route": route,
-            "status": status,
-            "maps": Map.objects.all(),
-            "tickets": Ticket.objects.filter(operator=route.operator).order_by("price"),
+            "departure_stop": index.stop_names.get(origin),
+            "departures": (
+                index.next_departures(origin, route_id=route.pk)
+                if origin else []
+            ),
+            "maps": maps,
+            "tickets": tickets,
+            "fragments": fragments,
+        },
+    )
+
+
+def _plan(params):
+    """
+    Run the journey planner for `from`, `to` and optional `date`
+    (YYYY-MM-DD) / `depart` (HH:MM) query parameters.
+
+    Returns (legs, error); legs are dicts ready for a template or JSON.
+    """
+    origin = params.get("from", "").strip()
+    destination = params.get("to", "").strip()
+    if not origin or not destination:
+        return None, "Choose where you are travelling from and to."
+
+    now = timezone.localtime()
+    try:
+        day = datetime.strptime(params["date"], "%Y-%m-%d").date() if params.get("date") else now.date()
+        clock = datetime.strptime(params["depart"], "%H:%M").time() if params.get("depart") else now.time()
+    except ValueError:
+        return None, "Dates are YYYY-MM-DD and times HH:MM."
+
+    planner = journey.get_planner()
+    legs = planner.plan(
+        planner.stop_code(origin),
+        planner.stop_code(destination),
+        timezone.make_aware(datetime.combine(day, clock)),
+    )
+    if legs is None:
+        return None, NO_JOURNEY
+
+    routes = Route.objects.select_related("mode", "operator").in_bulk(
+        {leg.route_id for leg in legs if leg.route_id}
+    )
+    return [
+        {
+            "kind": leg.kind,
+            "from_stop": leg.from_stop,
+            "from_name": planner.stop_name(leg.from_stop),
+            "to_stop": leg.to_stop,
+            "to_name": planner.stop_name(leg.to_stop),
+            "depart": leg.depart,
+            "arrive": leg.arrive,
+            "route": routes.get(leg.route_id),
+        }
+        for leg in legs
+    ], None
+
+
+def journey_planner(request):
+    legs, error = _plan(request.GET) if request.GET else (None, None)
+
+    return render(
+        request,
+        "siteui/journey.html",
+        {
+            "legs": legs,
+            "error": error,
+            "query": request.GET,
+        },
+    )
+
+
+def journey_stops(request):
+    """
+    Stop suggestions for the journey planner's from and to boxes, as JSON.
+    """
+    limit = request.GET.get("limit", "")
+    stops = journey.get_planner().find_stops(
+        request.GET.get("q", ""),
+        limit=min(int(limit), 50) if limit.isdigit() else 10,
+    )
+
+    return JsonResponse({
+        "results": [{"code": code, "name": name} for code, name in stops],
+    })
+
+
+def journey_api(request):
+    legs, error = _plan(request.GET)
+    if error:
+        return JsonResponse(
+            {"error": error}, status=404 if error == NO_JOURNEY else 400
+        )
+
+    return JsonResponse({
+        "legs": [
+            {
+                "kind": leg["kind"],
+                "from": leg["from_stop"],
+                "to": leg["to_stop"],
+                "depart": leg["depart"].isoformat(),
+                "arrive": leg["arrive"].isoformat(),
+                "route": {
+                    "uuid": str(leg["route"].uuid),
+                    "service": leg["route"].service,
+                    "mode": leg["route"].mode.name,
+                    "operator": leg["route"].operator.operator_name,
+                    "colour": leg["route"].route_hex or leg["route"].operator.primary_hex,
+                } if leg["route"] else None,
+            }
+            for leg in legs
+        ],
+    })
+
+
+def metrics_export(request):
+    """
+    Per-view request metrics in the Prometheus text format (see
+    siteui.metrics); 404 unless SITEUI_METRICS_ENABLED.
+    """
+    if not metrics.is_enabled():
+        raise Http404("Metrics are disabled")
+
+    return HttpResponse(
+        metrics.registry.prometheus(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@staff_member_required
+def metrics_dashboard(request):
+    return render(
+        request,
+        "admin/siteui/metrics.html",
+        {
+            **admin.site.each_context(request),
+            "title": "Request metrics",
+            "enabled": metrics.is_enabled(),
+            "rows": metrics.registry.summary(),
         },
     )
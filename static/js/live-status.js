@@ -0,0 +1,68 @@
+// Live status: pages with a [data-live-status] element follow the
+// stream it points at and patch rows and the banner in place
+(function () {
+  const root = document.querySelector("[data-live-status]");
+  if (!root || !window.EventSource) return;
+
+  const source = new EventSource(root.dataset.liveStatus);
+
+  source.addEventListener("status", function (e) {
+    JSON.parse(e.data).routes.forEach(function (route) {
+      let row = root.querySelector('[data-route="' + route.route + '"]');
+
+      if (!route.status) {
+        if (!row) return;
+        const section = row.closest("[data-mode]");
+        row.remove();
+        if (!section.querySelector("[data-route]")) section.remove();
+        return;
+      }
+
+      if (!row) {
+        const section = root.querySelector('[data-mode="' + route.mode_slug + '"]');
+        if (!section) {
+          window.location.reload();
+          return;
+        }
+        row = document.createElement("li");
+        row.className = "status-route";
+        row.dataset.route = route.route;
+        row.innerHTML =
+          '<span class="status-bar" aria-hidden="true"></span>' +
+          '<span class="route-name"></span>' +
+          '<span class="route-status"></span>';
+        section.querySelector(".status-route-list").appendChild(row);
+      }
+
+      row.querySelector(".status-bar").style.backgroundColor = route.colour;
+      row.querySelector(".route-name").textContent = route.service;
+      row.querySelector(".route-status").textContent = route.status;
+    });
+  });
+
+  source.addEventListener("incident", function (e) {
+    const latest = JSON.parse(e.data).latest;
+    const holder = document.querySelector("[data-live-banner]");
+    if (!holder) return;
+
+    holder.textContent = "";
+    if (!latest) return;
+
+    const banner = document.createElement("div");
+    banner.className = "network-banner";
+    banner.style.borderLeftColor = latest.colour;
+
+    const title = document.createElement("strong");
+    title.textContent = latest.status + " across the network";
+    const description = document.createElement("div");
+    description.className = "network-banner-description";
+    description.textContent = latest.description;
+
+    banner.append(title, description);
+    holder.appendChild(banner);
+  });
+
+  source.addEventListener("resync", function () {
+    window.location.reload();
+  });
+})();
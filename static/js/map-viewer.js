@@ -0,0 +1,123 @@
+// Map viewer: pans and zooms the tile pyramid made by siteui.mapdocs,
+// loading only the tiles in view at the current level
+(function () {
+  const viewer = document.querySelector("[data-map-tiles]");
+  if (!viewer) return;
+
+  const url = viewer.dataset.mapTiles;
+  const width = Number(viewer.dataset.mapWidth);
+  const height = Number(viewer.dataset.mapHeight);
+  const levels = Number(viewer.dataset.mapLevels);
+  const size = Number(viewer.dataset.mapTileSize);
+
+  const layer = document.createElement("div");
+  layer.className = "map-viewer-layer";
+  viewer.appendChild(layer);
+
+  const preview = viewer.querySelector("picture, .map-viewer-preview");
+  if (preview) preview.remove();
+  viewer.querySelector(".map-viewer-controls").hidden = false;
+
+  // Loaded tiles by "z/x/y", so panning keeps the ones still in view
+  let tiles = new Map();
+  let z = 0;
+  let x = 0;
+  let y = 0;
+
+  function levelSize(level) {
+    const scale = Math.pow(2, level - levels);
+    return [Math.ceil(width * scale), Math.ceil(height * scale)];
+  }
+
+  function visible(offset, extent, length) {
+    const first = Math.max(0, Math.floor(-offset / size));
+    const last = Math.min(Math.ceil(length / size) - 1, Math.floor((extent - offset) / size));
+    return [first, last];
+  }
+
+  function draw() {
+    const [w, h] = levelSize(z);
+    layer.style.transform = "translate(" + x + "px, " + y + "px)";
+
+    const [left, right] = visible(x, viewer.clientWidth, w);
+    const [top, bottom] = visible(y, viewer.clientHeight, h);
+
+    const wanted = new Map();
+    for (let col = left; col <= right; col++) {
+      for (let row = top; row <= bottom; row++) {
+        const key = z + "/" + col + "/" + row;
+        let img = tiles.get(key);
+        if (!img) {
+          img = document.createElement("img");
+          img.alt = "";
+          img.src = url.replace("{z}", z).replace("{x}", col).replace("{y}", row);
+          img.style.left = col * size + "px";
+          img.style.top = row * size + "px";
+          layer.appendChild(img);
+        }
+        wanted.set(key, img);
+      }
+    }
+
+    tiles.forEach(function (img, key) {
+      if (!wanted.has(key)) img.remove();
+    });
+    tiles = wanted;
+  }
+
+  // Zoom one level in or out, keeping the point (cx, cy) still
+  function zoom(step, cx, cy) {
+    const level = Math.min(levels, Math.max(0, z + step));
+    if (level === z) return;
+    const factor = Math.pow(2, level - z);
+    x = cx - (cx - x) * factor;
+    y = cy - (cy - y) * factor;
+    z = level;
+    draw();
+  }
+
+  // Start at the first level at least as wide as the viewer, centred
+  while (z < levels && levelSize(z)[0] < viewer.clientWidth) z++;
+  const [w, h] = levelSize(z);
+  x = (viewer.clientWidth - w) / 2;
+  y = Math.min(0, (viewer.clientHeight - h) / 2);
+  draw();
+
+  let drag = null;
+
+  viewer.addEventListener("pointerdown", function (e) {
+    if (e.target.closest("button")) return;
+    drag = { id: e.pointerId, x: e.clientX - x, y: e.clientY - y };
+    viewer.setPointerCapture(e.pointerId);
+  });
+
+  viewer.addEventListener("pointermove", function (e) {
+    if (!drag || drag.id !== e.pointerId) return;
+    x = e.clientX - drag.x;
+    y = e.clientY - drag.y;
+    draw();
+  });
+
+  viewer.addEventListener("pointerup", function () {
+    drag = null;
+  });
+
+  viewer.addEventListener("wheel", function (e) {
+    e.preventDefault();
+    const rect = viewer.getBoundingClientRect();
+    zoom(e.deltaY < 0 ? 1 : -1, e.clientX - rect.left, e.clientY - rect.top);
+  }, { passive: false });
+
+  viewer.addEventListener("dblclick", function (e) {
+    const rect = viewer.getBoundingClientRect();
+    zoom(1, e.clientX - rect.left, e.clientY - rect.top);
+  });
+
+  viewer.addEventListener("click", function (e) {
+    const button = e.target.closest("[data-map-zoom]");
+    if (!button) return;
+    zoom(Number(button.dataset.mapZoom), viewer.clientWidth / 2, viewer.clientHeight / 2);
+  });
+
+  window.addEventListener("resize", draw);
+})();
@@ -0,0 +1,26 @@
+// Home page: suggest routes from the search index as the user types
+document.querySelectorAll("[data-suggest-url]").forEach(function (input) {
+  const list = input.list;
+  if (!list) return;
+
+  let timer;
+  input.addEventListener("input", function () {
+    clearTimeout(timer);
+    const q = input.value.trim();
+    if (!q) return;
+
+    timer = setTimeout(function () {
+      fetch(input.dataset.suggestUrl + "?q=" + encodeURIComponent(q))
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+          list.replaceChildren(...data.results.map(function (route) {
+            const option = document.createElement("option");
+            option.value = route.service;
+            option.label = route.service + " – " + route.origin + " to " + route.destination + " (" + route.operator + ")";
+            return option;
+          }));
+        })
+        .catch(function () {});
+    }, 150);
+  });
+});
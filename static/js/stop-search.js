@@ -0,0 +1,26 @@
+// Journey planner: suggest stops by name as the user types in from / to
+document.querySelectorAll("[data-stop-search-url]").forEach(function (input) {
+  const list = input.list;
+  if (!list) return;
+
+  let timer;
+  input.addEventListener("input", function () {
+    clearTimeout(timer);
+    const q = input.value.trim();
+    if (!q) return;
+
+    timer = setTimeout(function () {
+      fetch(input.dataset.stopSearchUrl + "?q=" + encodeURIComponent(q))
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+          const names = new Set(data.results.map(function (stop) { return stop.name; }));
+          list.replaceChildren(...Array.from(names, function (name) {
+            const option = document.createElement("option");
+            option.value = name;
+            return option;
+          }));
+        })
+        .catch(function () {});
+    }, 150);
+  });
+});
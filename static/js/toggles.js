@@ -0,0 +1,20 @@
+// Route and fare dropdowns: the toggle shows or hides the element after it
+document.addEventListener("click", function (e) {
+  const toggle = e.target.closest(".route-toggle, .fare-toggle");
+  if (!toggle) return;
+
+  const dropdown = toggle.nextElementSibling;
+  if (!dropdown) return;
+
+  const expanded = toggle.getAttribute("aria-expanded") === "true";
+
+  toggle.setAttribute("aria-expanded", String(!expanded));
+  dropdown.hidden = expanded;
+
+  const chevron = toggle.querySelector(".route-chevron, .fare-chevron");
+  if (chevron) {
+    chevron.style.transform = expanded
+      ? "rotate(0deg)"
+      : "rotate(180deg)";
+  }
+});
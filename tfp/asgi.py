@@ -2,6 +2,8 @@
 ASGI config for tfp project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. uvicorn) for the live status stream at
+/status/stream/, which holds a connection open per client.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
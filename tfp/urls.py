@@ -14,10 +14,21 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from siteui import assets
+from siteui import views as siteui_views
 
 urlpatterns = [
+    path('admin/metrics/', siteui_views.metrics_dashboard, name="metrics_dashboard"),
     path('admin/', admin.site.urls),
     path("", include("siteui.urls")),
 ]
+
+if not settings.DEBUG:
+    # With DEBUG on, runserver serves static files from the sources
+    urlpatterns.append(
+        re_path(rf"^{settings.STATIC_URL.strip('/')}/(?P<path>.+)$", assets.serve)
+    )